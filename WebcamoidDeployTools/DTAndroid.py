@@ -28,6 +28,7 @@ import sys
 import xml.etree.ElementTree as ET
 
 from . import DTBinary
+from . import DTFileIndex
 from . import DTGit
 from . import DTSystemPackages
 from . import DTUtils
@@ -272,9 +273,9 @@ def writeBuildInfo(globs,
         packages = set()
 
         if 'dependencies' in globs:
-            for dep in globs['dependencies']:
-                packageInfo = DTSystemPackages.searchPackageFor(dep)
+            depsPackages = DTSystemPackages.searchPackagesFor(globs['dependencies'])
 
+            for packageInfo in depsPackages.values():
                 if len(packageInfo) > 0:
                     packages.add(packageInfo)
 
@@ -287,13 +288,14 @@ def writeBuildInfo(globs,
 def removeUnneededFiles(path):
     afiles = set()
 
-    for root, _, files in os.walk(path):
+    for root, _, files in DTFileIndex.walk(path):
         for f in files:
             if f.endswith('.jar'):
                 afiles.add(os.path.join(root, f))
 
     for afile in afiles:
         os.remove(afile)
+        DTFileIndex.remove(afile)
 
 def preRun(globs, configs, dataDir):
     targetPlatform = configs.get('Package', 'targetPlatform', fallback='').strip()
@@ -381,6 +383,9 @@ def preRun(globs, configs, dataDir):
     except:
         pass
 
+    DTFileIndex.update(os.path.join(dataDir, '.gradle'))
+    DTFileIndex.update(os.path.join(dataDir, 'build'))
+
     print('Removing unnecessary files')
     removeUnneededFiles(libDir)
     print()
@@ -402,3 +407,4 @@ def postRun(globs, configs, dataDir):
                     sourcesDir,
                     minSdkVersion,
                     targetSdkVersion)
+        DTFileIndex.update(buildInfoFile)
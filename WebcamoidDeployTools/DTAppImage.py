@@ -22,8 +22,8 @@
 import configparser
 import os
 import subprocess
-import tempfile
 
+from . import DTProfile
 from . import DTUtils
 
 
@@ -53,7 +53,7 @@ def createAppImage(globs,
                    desktopIcon,
                    dirIcon,
                    verbose):
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with DTUtils.stagingDirectory(dataDir) as tmpdir:
         appDirName = os.path.splitext(os.path.basename(outPackage))[0]
         appDir = \
             os.path.join(tmpdir,
@@ -62,7 +62,7 @@ def createAppImage(globs,
         if not os.path.exists(appDir):
             os.makedirs(appDir)
 
-        DTUtils.copy(dataDir, appDir)
+        DTUtils.stage(dataDir, appDir)
         launcherSrc = os.path.join(appDir, os.path.relpath(launcher, dataDir))
         launcherDst = os.path.join(appDir, 'AppRun')
         DTUtils.move(launcherSrc, launcherDst)
@@ -87,16 +87,17 @@ def createAppImage(globs,
         penv = os.environ.copy()
         penv['ARCH'] = targetArch
 
-        if verbose:
-            process = subprocess.Popen(params, # nosec
-                                       env=penv)
-        else:
-            process = subprocess.Popen(params, # nosec
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE,
-                                       env=penv)
-
-        process.communicate()
+        with DTProfile.tool(params):
+            if verbose:
+                process = subprocess.Popen(params, # nosec
+                                           env=penv)
+            else:
+                process = subprocess.Popen(params, # nosec
+                                           stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE,
+                                           env=penv)
+
+            process.communicate()
 
         if not os.path.exists(outPackage):
             return
@@ -22,13 +22,208 @@
 import importlib
 import os
 import re
+import struct
 import subprocess # nosec
 import threading
-import time
 
+from . import DTBinaryCache
+from . import DTBinaryMach
+from . import DTFileIndex
+from . import DTManifest
+from . import DTProfile
+from . import DTStore
 from . import DTUtils
 
 
+# Files with these extensions are never binaries, so they are not opened
+# when searching for binaries.
+NON_BINARY_EXTENSIONS = {'.a',
+                         '.bmp',
+                         '.cmake',
+                         '.conf',
+                         '.class',
+                         '.css',
+                         '.desktop',
+                         '.gif',
+                         '.h',
+                         '.hpp',
+                         '.html',
+                         '.ico',
+                         '.icns',
+                         '.ini',
+                         '.jpeg',
+                         '.jpg',
+                         '.js',
+                         '.json',
+                         '.la',
+                         '.md',
+                         '.mjs',
+                         '.mo',
+                         '.otf',
+                         '.pc',
+                         '.png',
+                         '.prl',
+                         '.py',
+                         '.pyc',
+                         '.qm',
+                         '.qml',
+                         '.qmlc',
+                         '.qmltypes',
+                         '.qrc',
+                         '.svg',
+                         '.svgz',
+                         '.ts',
+                         '.ttf',
+                         '.txt',
+                         '.wav',
+                         '.xml'}
+
+# Smallest possible headers of each format.
+MIN_BINARY_SIZE = {'elf': 52, 'mach': 28, 'pecoff': 64}
+
+MACH_MAGICS = {b'\xfe\xed\xfa\xce',
+               b'\xce\xfa\xed\xfe',
+               b'\xfe\xed\xfa\xcf',
+               b'\xcf\xfa\xed\xfe'}
+
+# Bytes read from the start of the file to detect the format.
+SNIFF_SIZE = 64
+
+# Format of each file seen in this run, indexed by path. Each entry stores the
+# signature of the file, so modified files are detected again.
+FILE_FORMATS = {}
+FILE_FORMATS_MUTEX = threading.Lock()
+
+def sniffFormat(path, size):
+    # Detect the binary format reading the magic bytes of the file.
+    if os.path.splitext(path)[1].lower() in NON_BINARY_EXTENSIONS \
+        or size < min(MIN_BINARY_SIZE.values()):
+        return ''
+
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except:
+        return ''
+
+    try:
+        header = os.read(fd, SNIFF_SIZE)
+
+        if header[: 4] == b'\x7fELF':
+            return 'elf' if size >= MIN_BINARY_SIZE['elf'] else ''
+
+        if header[: 4] in MACH_MAGICS:
+            return 'mach' if size >= MIN_BINARY_SIZE['mach'] else ''
+
+        # Universal binaries share the magic number with the Java classes.
+        if DTBinaryMach.isFatHeader(header, size):
+            return 'mach'
+
+        if header[: 2] == b'MZ' and len(header) >= MIN_BINARY_SIZE['pecoff']:
+            peHeaderOffset = struct.unpack_from('<I', header, 0x3c)[0]
+
+            if peHeaderOffset + 4 <= len(header):
+                peSignature = header[peHeaderOffset: peHeaderOffset + 4]
+            else:
+                peSignature = os.pread(fd, 4, peHeaderOffset)
+
+            if peSignature == b'PE\x00\x00':
+                return 'pecoff'
+    except:
+        pass
+    finally:
+        os.close(fd)
+
+    return ''
+
+def fileFormat(path, st=None):
+    # Returns the binary format of the file ('elf', 'mach', 'pecoff'), or an
+    # empty string if it's not a binary.
+    if st is None:
+        try:
+            st = os.stat(path)
+        except:
+            return ''
+
+    signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    with FILE_FORMATS_MUTEX:
+        entry = FILE_FORMATS.get(path)
+
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+
+    fmt = sniffFormat(path, st.st_size)
+
+    with FILE_FORMATS_MUTEX:
+        FILE_FORMATS[path] = (signature, fmt)
+
+    return fmt
+
+
+class DependencyGraph:
+    def __init__(self):
+        super().__init__()
+        self.forward = {}
+        self.reverse = {}
+        self.mutex = threading.Lock()
+
+    def addNode(self, node, deps):
+        with self.mutex:
+            self.forward[node] = list(deps)
+            self.reverse.setdefault(node, set())
+
+            for dep in deps:
+                self.reverse.setdefault(dep, set()).add(node)
+
+    def hasNode(self, node):
+        with self.mutex:
+            return node in self.forward
+
+    def nodes(self):
+        with self.mutex:
+            return sorted(self.forward)
+
+    def edges(self):
+        with self.mutex:
+            return [(node, dep)
+                    for node in sorted(self.forward)
+                    for dep in self.forward[node]]
+
+    def reverseEdges(self):
+        with self.mutex:
+            return [(dep, node)
+                    for dep in sorted(self.reverse)
+                    for node in sorted(self.reverse[dep])]
+
+    def dependencies(self, node):
+        with self.mutex:
+            return list(self.forward.get(node, []))
+
+    def dependants(self, node):
+        with self.mutex:
+            return sorted(self.reverse.get(node, set()))
+
+    def allDependencies(self, *nodes):
+        # Transitive closure of the dependencies of the given nodes.
+        with self.mutex:
+            deps = [dep for node in nodes for dep in self.forward.get(node, [])]
+            solved = set()
+
+            while len(deps) > 0:
+                dep = deps.pop()
+
+                if dep in solved:
+                    continue
+
+                solved.add(dep)
+
+                for binDep in self.forward.get(dep, []):
+                    if binDep != dep and not binDep in solved:
+                        deps.append(binDep)
+
+            return solved
+
+
 class BinaryTools:
     def __init__(self,
                  configs,
@@ -46,33 +241,41 @@ class BinaryTools:
         self.stripBin = DTUtils.whereBin(stripCmd)
         self.stripExcludes = stripExcludes
         self.solver = None
+        self.graph = DependencyGraph()
+        DTBinaryCache.init(configs)
+        DTUtils.invalidateDirIndex()
 
         if targetPlatform == 'mac':
             self.solver = importlib.import_module('WebcamoidDeployTools.DTBinaryMach')
+            self.format = 'mach'
         elif targetPlatform == 'windows':
             self.solver = importlib.import_module('WebcamoidDeployTools.DTBinaryPecoff')
+            self.format = 'pecoff'
         else:
             self.solver = importlib.import_module('WebcamoidDeployTools.DTBinaryElf')
+            self.format = 'elf'
 
         self.solver.init(configs, targetPlatform, targetArch, sysLibDir)
         self.excludes = []
+        self.excludesRegex = None
+        self.excludedPaths = {}
         self.readExcludes()
 
     def name(self, binary, configs=None):
         return self.solver.name(binary, configs)
 
     def isValid(self, binary):
-        return self.solver.isValid(binary)
+        return fileFormat(binary) == self.format
 
     def find(self, path):
+        # The size and the type of the files come from the file index, and
+        # only the files that can be a binary are opened.
         binaries = []
 
-        for root, _, files in os.walk(path):
-            for f in files:
-                binaryPath = os.path.join(root, f)
-
-                if not os.path.islink(binaryPath) and self.solver.isValid(binaryPath):
-                    binaries.append(binaryPath)
+        for filePath, info in DTFileIndex.files(path):
+            if info['type'] == 'file' \
+                and fileFormat(filePath, info['stat']) == self.format:
+                binaries.append(filePath)
 
         return binaries
 
@@ -90,41 +293,71 @@ class BinaryTools:
     def dependencies(self, binary):
         return self.solver.dependencies(binary)
 
-    def allDependencies(self, binary):
-        deps = self.filterDependencies(self.solver.dependencies(binary))
-        solved = set()
+    def resolveDependencies(self, binaries):
+        # Resolve the dependencies graph level by level, every node is solved
+        # exactly once and the direct dependencies of each level are
+        # resolved in parallel.
+        pending = sorted({binary for binary in binaries
+                          if not self.graph.hasNode(binary)})
 
-        while len(deps) > 0:
-            dep = deps.pop()
+        if len(pending) < 1:
+            return
+
+        while len(pending) > 0:
+            solved = DTUtils.mapJobs(self.directDependencies, pending)
+            nextLevel = set()
+
+            for binary, deps in zip(pending, solved):
+                self.graph.addNode(binary, deps)
+                nextLevel.update(deps)
+
+            pending = sorted({dep for dep in nextLevel
+                              if not self.graph.hasNode(dep)})
+
+    def directDependencies(self, binary):
+        return self.filterDependencies(self.solver.dependencies(binary))
 
-            for binDep in self.filterDependencies(self.solver.dependencies(dep)):
-                if binDep != dep and not binDep in solved:
-                    deps.append(binDep)
+    def dependencyGraph(self, path):
+        self.resolveDependencies(self.find(path))
 
-            if self.hostPlatform == 'mac':
-                i = dep.rfind('.framework/')
+        return self.graph
 
-                if i >= 0:
-                    dep = dep[: i] + '.framework'
+    def collapseDependency(self, dep):
+        if self.hostPlatform == 'mac':
+            i = dep.rfind('.framework/')
 
-            solved.add(dep)
+            if i >= 0:
+                dep = dep[: i] + '.framework'
 
-        return solved
+        return dep
+
+    def allDependencies(self, binary):
+        self.resolveDependencies([binary])
+
+        return {self.collapseDependency(dep)
+                for dep in self.graph.allDependencies(binary)}
 
     def scanDependencies(self, path):
-        deps = set()
+        with DTProfile.span('Scan dependencies', path=path):
+            binaries = self.find(path)
+            self.resolveDependencies(binaries)
+            deps = set()
 
-        for binPath in self.find(path):
-            for dep in self.allDependencies(binPath):
-                deps.add(dep)
+            for dep in self.graph.allDependencies(*binaries):
+                deps.add(self.collapseDependency(dep))
 
-        return sorted(deps)
+            return sorted(deps)
 
     def guess(self, mainExecutable, dependency):
         return self.solver.guess(mainExecutable, dependency)
 
     def strip(self, binary):
-        if self.debug or self.stripBin == '':
+        if self.debug:
+            return
+
+        if self.stripBin == '':
+            DTStore.discard(binary)
+
             return
 
         if os.path.basename(binary) in self.stripExcludes:
@@ -134,25 +367,24 @@ class BinaryTools:
                   '-g',
                   '--strip-unneeded',
                   binary]
-        process = subprocess.Popen(params, # nosec
-                                   stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE)
-        process.communicate()
-
-    def stripSymbols(self, path):
-        threads = []
+        with DTProfile.tool(params):
+            process = subprocess.Popen(params, # nosec
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+            process.communicate()
 
-        for binary in self.find(path):
-            thread = threading.Thread(target=self.strip, args=(binary,))
-            threads.append(thread)
+        DTFileIndex.update(binary)
 
-            while threading.active_count() >= DTUtils.numThreads():
-                time.sleep(0.25)
+        if process.returncode != 0:
+            DTStore.discard(binary)
 
-            thread.start()
+    def pendingBinaries(self, path):
+        # Binaries that must be processed in this run.
+        return DTStore.unprocessedFiles(DTManifest.changedFiles(self.find(path)))
 
-        for thread in threads:
-            thread.join()
+    def stripSymbols(self, path):
+        with DTProfile.span('Strip symbols', path=path):
+            DTUtils.mapJobs(self.strip, self.pendingBinaries(path))
 
     def readExcludes(self):
         curDir = os.path.dirname(DTUtils.realPath(__file__))
@@ -177,16 +409,61 @@ class BinaryTools:
                         if len(line) > 0:
                             self.excludes.append(line)
 
+        self.compileExcludes()
+
+    def compileExcludes(self):
+        # Combine all the patterns in a single regex, so each path is
+        # matched once.
+        excludes = self.excludes
+
+        if self.targetPlatform == 'windows':
+            excludes = [exclude.lower() for exclude in excludes]
+
+        self.excludedPaths = {}
+
+        # Most patterns match a file in any directory with a '(.*/)*' prefix,
+        # which backtracks exponentially with the depth of the path. Since
+        # '.*' also matches '/', it's the same as an optional '(?:.*/)?'
+        # prefix, and it's factored out of these patterns.
+        anyDirPrefix = '(.*/)*'
+        anyDirPatterns = [exclude[len(anyDirPrefix):]
+                          for exclude in excludes
+                          if exclude.startswith(anyDirPrefix)]
+        patterns = ['(?:{})'.format(exclude)
+                    for exclude in excludes
+                    if not exclude.startswith(anyDirPrefix)]
+
+        if len(anyDirPatterns) > 0:
+            patterns.insert(0, '(?:.*/)?(?:{})'.format('|'.join(anyDirPatterns)))
+
+        try:
+            self.excludesRegex = re.compile('|'.join(patterns))
+        except re.error:
+            # Some pattern can't be combined, match them one by one.
+            self.excludesRegex = [re.compile(exclude) for exclude in excludes]
+
     def isExcluded(self, path):
-        for exclude in self.excludes:
-            if self.targetPlatform == 'windows':
-                path = path.lower().replace('\\', '/')
-                exclude = exclude.lower()
+        excluded = self.excludedPaths.get(path)
 
-            if re.fullmatch(exclude, path):
-                return True
+        if excluded is not None:
+            return excluded
 
-        return False
+        if self.excludesRegex is None or len(self.excludes) < 1:
+            return False
+
+        matchPath = path
+
+        if self.targetPlatform == 'windows':
+            matchPath = path.lower().replace('\\', '/')
+
+        if isinstance(self.excludesRegex, list):
+            excluded = any(regex.fullmatch(matchPath) for regex in self.excludesRegex)
+        else:
+            excluded = self.excludesRegex.fullmatch(matchPath) is not None
+
+        self.excludedPaths[path] = excluded
+
+        return excluded
 
     def filterDependencies(self, deps):
         outDeps = []
@@ -198,7 +475,7 @@ class BinaryTools:
         return outDeps
 
     def resetFilePermissions(self, rootPath):
-        for root, dirs, files in os.walk(rootPath):
+        for root, dirs, files in DTFileIndex.walk(rootPath):
             for d in dirs:
                 permissions = 0o755
                 path = os.path.join(root, d)
@@ -208,17 +485,21 @@ class BinaryTools:
                 else:
                     os.chmod(path, permissions)
 
+                DTFileIndex.setMode(path, permissions)
+
             for f in files:
                 permissions = 0o644
                 path = os.path.join(root, f)
 
-                if not os.path.exists(path):
+                if not os.path.exists(path) or not DTManifest.isChanged(path):
                     continue
 
-                if self.isExecutable(path):
+                if fileFormat(path) == self.format and self.isExecutable(path):
                     permissions = 0o755
 
                 if self.hostPlatform == 'mac':
                     os.chmod(path, permissions, follow_symlinks=False)
                 else:
                     os.chmod(path, permissions)
+
+                DTFileIndex.setMode(path, permissions)
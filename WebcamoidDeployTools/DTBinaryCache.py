@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import atexit
+import json
+import os
+import threading
+
+
+# Bump this when the layout of the dumped information changes, so old
+# persistent caches get discarded.
+CACHE_VERSION = 4
+
+# The cache maps (format, path) to the stat signature of the file and the
+# information returned by the solver's dump function.
+CACHE = {}
+CACHE_FILE = ''
+CACHE_MODIFIED = False
+CACHE_MUTEX = threading.Lock()
+CACHE_SAVE_REGISTERED = False
+
+def signature(path):
+    try:
+        st = os.stat(path)
+    except:
+        return None
+
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+def copyInfo(info):
+    # Return a copy of the containers so the callers can't modify the cached
+    # values.
+    if isinstance(info, dict):
+        return {key: value.copy() if isinstance(value, (set, list, dict)) else value
+                for key, value in info.items()}
+
+    if isinstance(info, list):
+        return info.copy()
+
+    return info
+
+def encodeInfo(info):
+    if not isinstance(info, dict):
+        return {'value': info, 'sets': []}
+
+    value = {}
+    sets = []
+
+    for key, val in info.items():
+        if isinstance(val, set):
+            value[key] = sorted(val)
+            sets.append(key)
+        else:
+            value[key] = val
+
+    return {'value': value, 'sets': sets}
+
+def decodeInfo(data):
+    value = data['value']
+
+    if not isinstance(value, dict):
+        return value
+
+    for key in data['sets']:
+        value[key] = set(value[key])
+
+    return value
+
+def readCacheFile(cacheFile):
+    global CACHE
+
+    if not os.path.exists(cacheFile):
+        return
+
+    try:
+        with open(cacheFile) as f:
+            cache = json.load(f)
+    except:
+        return
+
+    if cache.get('version', 0) != CACHE_VERSION:
+        return
+
+    for entry in cache.get('entries', []):
+        try:
+            key = (entry['format'], entry['path'])
+            CACHE[key] = (tuple(entry['signature']), decodeInfo(entry['info']))
+        except:
+            pass
+
+def save():
+    global CACHE_MODIFIED
+
+    with CACHE_MUTEX:
+        if CACHE_FILE == '' or not CACHE_MODIFIED:
+            return
+
+        entries = []
+
+        for (fmt, path), (sig, info) in CACHE.items():
+            entries.append({'format': fmt,
+                            'path': path,
+                            'signature': list(sig),
+                            'info': encodeInfo(info)})
+
+        cacheDir = os.path.dirname(CACHE_FILE)
+
+        try:
+            if cacheDir != '' and not os.path.exists(cacheDir):
+                os.makedirs(cacheDir)
+
+            tmpFile = CACHE_FILE + '.tmp'
+
+            with open(tmpFile, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'entries': entries}, f)
+
+            os.replace(tmpFile, CACHE_FILE)
+            CACHE_MODIFIED = False
+        except:
+            pass
+
+def init(configs):
+    global CACHE_FILE
+    global CACHE_SAVE_REGISTERED
+
+    cacheFile = configs.get('System', 'binaryCache', fallback='').strip()
+
+    if cacheFile == '':
+        return
+
+    cacheFile = os.path.abspath(os.path.expanduser(cacheFile))
+
+    with CACHE_MUTEX:
+        if cacheFile == CACHE_FILE:
+            return
+
+        CACHE_FILE = cacheFile
+        readCacheFile(cacheFile)
+
+        if not CACHE_SAVE_REGISTERED:
+            atexit.register(save)
+            CACHE_SAVE_REGISTERED = True
+
+def load(fmt, path):
+    sig = signature(path)
+
+    if sig is None:
+        return None
+
+    with CACHE_MUTEX:
+        entry = CACHE.get((fmt, path))
+
+    if entry is None or entry[0] != sig:
+        return None
+
+    return copyInfo(entry[1])
+
+def store(fmt, path, info):
+    global CACHE_MODIFIED
+
+    sig = signature(path)
+
+    if sig is None:
+        return
+
+    with CACHE_MUTEX:
+        CACHE[(fmt, path)] = (sig, copyInfo(info))
+        CACHE_MODIFIED = True
+
+def invalidate(path):
+    global CACHE_MODIFIED
+
+    with CACHE_MUTEX:
+        for key in [key for key in CACHE if key[1] == path]:
+            del CACHE[key]
+            CACHE_MODIFIED = True
@@ -20,6 +20,7 @@
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
 import fnmatch
+import mmap
 import os
 import re
 import struct
@@ -27,6 +28,8 @@ import sys
 
 from . import DTAndroid
 from . import DTBinary
+from . import DTBinaryCache
+from . import DTUtils
 
 
 LD_LIBRARY_PATH = []
@@ -37,6 +40,41 @@ ANDROID_ARCH_MAP = [('arm64-v8a'  , 'aarch64', 'aarch64-linux-android', 'aarch64
                     ('x86_64'     , 'x86_64' , 'x86_64-linux-android' , 'x86_64' ),
                     ('riscv64'    , 'riscv64', 'riscv64-linux-android', 'riscv64')]
 
+# ELF file magic
+ELFMAGIC = b'\x7fELF'
+
+# File types.
+ET_EXEC = 2
+
+# Segments
+PT_LOAD = 1
+PT_DYNAMIC = 2
+
+# Sections
+SHT_STRTAB = 0x3
+SHT_DYNAMIC = 0x6
+SHT_DYNSYM = 0xb
+SHT_GNU_VERDEF = 0x6ffffffd
+SHT_GNU_VERNEED = 0x6ffffffe
+
+# Dynamic section entries
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 0x1d
+DT_AUXILIARY = 0x7ffffffd
+DT_FILTER = 0x7fffffff
+
+# Dynamic entries pointing to a string in '.dynstr'
+DT_STRING_TAGS = [DT_NEEDED,
+                  DT_SONAME,
+                  DT_RPATH,
+                  DT_RUNPATH,
+                  DT_AUXILIARY,
+                  DT_FILTER]
+
 def isValid(path):
     try:
         with open(path, 'rb') as f:
@@ -157,10 +195,17 @@ def libPath(lib, machine, rpaths, runpaths):
                 + runpaths \
                 + LIBS_SEARCH_PATHS
 
+    # Libraries referenced by a relative path can't be looked up in the
+    # directories index.
+    indexed = not '/' in lib
+
     for libdir in searchPaths:
+        if indexed and not lib in DTUtils.dirIndex(libdir):
+            continue
+
         path = os.path.join(libdir, lib)
 
-        if os.path.exists(path):
+        if indexed or os.path.exists(path):
             depElfInfo = dump(path)
 
             if depElfInfo:
@@ -171,31 +216,6 @@ def libPath(lib, machine, rpaths, runpaths):
 
     return ''
 
-def readString(f):
-    s = b''
-
-    while True:
-        c = f.read(1)
-
-        if c == b'\x00':
-            break
-
-        s += c
-
-    return s
-
-def readNumber(f, arch):
-    if arch == '32bits':
-        return struct.unpack('I', f.read(4))[0]
-
-    return struct.unpack('Q', f.read(8))[0]
-
-def readDynamicEntry(f, arch):
-    if arch == '32bits':
-        return struct.unpack('iI', f.read(8))
-
-    return struct.unpack('qQ', f.read(16))
-
 def readRpaths(elfInfo, binDir):
     rpaths = []
     runpaths = []
@@ -218,169 +238,314 @@ def readRpaths(elfInfo, binDir):
 
     return rpaths, runpaths
 
+def readString(data, offset):
+    end = data.find(b'\x00', offset)
+
+    if end < 0:
+        end = len(data)
+
+    return data[offset: end].decode(sys.getdefaultencoding())
+
+def mapAddress(segments, address):
+    # Convert a virtual address to a file offset using the PT_LOAD segments.
+    for vaddr, offset, filesz in segments:
+        if address >= vaddr and address < vaddr + filesz:
+            return address - vaddr + offset
+
+    return -1
+
 # https://refspecs.linuxfoundation.org/lsb.shtml (See Core, Generic)
 # https://en.wikipedia.org/wiki/Executable_and_Linkable_Format
-def dump(binary):
+def readLayout(data):
+    # Read magic signature.
+    if len(data) < 0x34 or data[: 4] != ELFMAGIC:
+        return None
+
+    # Read the data structure and the byte order of the file.
+    is32bits = data[4] == 1
+    endian = '>' if data[5] == 2 else '<'
+
+    # Read file type and machine code.
+    fileType, machine = struct.unpack_from(endian + 'HH', data, 0x10)
+
+    # Read the pointers to the program headers and sections tables.
+    if is32bits:
+        phoff, shoff = struct.unpack_from(endian + 'II', data, 0x1c)
+        phentsize, phnum, shentsize, shnum, shstrndx = \
+            struct.unpack_from(endian + 'HHHHH', data, 0x2a)
+        phdrFormat = endian + 'IIIIIIII'
+        shdrFormat = endian + 'IIIIIIIIII'
+        dynFormat = endian + 'iI'
+    else:
+        phoff, shoff = struct.unpack_from(endian + 'QQ', data, 0x20)
+        phentsize, phnum, shentsize, shnum, shstrndx = \
+            struct.unpack_from(endian + 'HHHHH', data, 0x36)
+        phdrFormat = endian + 'IIQQQQQQ'
+        shdrFormat = endian + 'IIQQQQIIQQ'
+        dynFormat = endian + 'qQ'
+
+    layout = {'is32bits': is32bits,
+              'endian': endian,
+              'type': fileType,
+              'machine': machine,
+              'dynFormat': dynFormat,
+              'dynamic': None,
+              'strtab': -1,
+              'strtabIndex': -1,
+              'sections': []}
+
+    # Read the sections table in a single pass, the dynamic section links to
+    # the '.dynstr' table.
+    if shnum > 0 and shentsize == struct.calcsize(shdrFormat) \
+        and shoff + shnum * shentsize <= len(data):
+        sections = list(struct.iter_unpack(shdrFormat,
+                                           data[shoff: shoff + shnum * shentsize]))
+        layout['sections'] = sections
+
+        for section in sections:
+            # name, type, flags, addr, offset, size, link, info, ...
+            if section[1] == SHT_DYNAMIC:
+                layout['dynamic'] = (section[4], section[5])
+                link = section[6]
+
+                if link < shnum and sections[link][1] == SHT_STRTAB:
+                    layout['strtab'] = sections[link][4]
+                    layout['strtabIndex'] = link
+                elif shstrndx < shnum:
+                    # Search the '.dynstr' table by name.
+                    shstrtab = sections[shstrndx][4]
+
+                    for i, sec in enumerate(sections):
+                        if sec[1] == SHT_STRTAB \
+                            and readString(data, shstrtab + sec[0]) == '.dynstr':
+                            layout['strtab'] = sec[4]
+                            layout['strtabIndex'] = i
+
+                            break
+
+                break
+
+    # If the sections table was stripped, read the dynamic segment from the
+    # program headers.
+    if layout['dynamic'] is None \
+        and phnum > 0 \
+        and phentsize == struct.calcsize(phdrFormat) \
+        and phoff + phnum * phentsize <= len(data):
+        segments = []
+
+        for phdr in struct.iter_unpack(phdrFormat,
+                                       data[phoff: phoff + phnum * phentsize]):
+            if is32bits:
+                ptype, poffset, pvaddr, _, pfilesz = phdr[: 5]
+            else:
+                ptype, _, poffset, pvaddr, _, pfilesz = phdr[: 6]
+
+            if ptype == PT_LOAD:
+                segments.append((pvaddr, poffset, pfilesz))
+            elif ptype == PT_DYNAMIC:
+                layout['dynamic'] = (poffset, pfilesz)
+
+        if layout['dynamic'] is not None:
+            for dTag, dVal in readDynamicEntries(data, layout):
+                if dTag == DT_STRTAB:
+                    layout['strtab'] = mapAddress(segments, dVal)
+
+                    break
+
+    return layout
+
+def readDynamicEntries(data, layout):
+    # Returns the list of dynamic entries until DT_NULL.
+    dynamic = layout['dynamic']
+
+    if dynamic is None:
+        return []
+
+    dynEntrySize = struct.calcsize(layout['dynFormat'])
+    dynEnd = min(dynamic[0] + dynamic[1], len(data))
+    dynEnd -= (dynEnd - dynamic[0]) % dynEntrySize
+    entries = []
+
+    for dTag, dVal in struct.iter_unpack(layout['dynFormat'],
+                                         data[dynamic[0]: dynEnd]):
+        if dTag == DT_NULL:
+            # End of dynamic sections.
+            break
+
+        entries.append((dTag, dVal))
+
+    return entries
+
+def parseData(data):
+    layout = readLayout(data)
+
+    if layout is None:
+        return {}
+
+    fileType = 'executable' if layout['type'] == ET_EXEC else 'library'
+    elfInfo = {'machine': layout['machine'],
+               'imports': set(),
+               'rpath': set(),
+               'runpath': set(),
+               'soname': '',
+               'type': fileType}
+    strtabOffset = layout['strtab']
+
+    if strtabOffset < 0:
+        return elfInfo
+
+    # Read dynamic entries.
+    for dTag, dVal in readDynamicEntries(data, layout):
+        if dTag == DT_NEEDED:
+            # Dynamically imported libraries.
+            elfInfo['imports'].add(readString(data, strtabOffset + dVal))
+        elif dTag == DT_RPATH:
+            # RPATHs.
+            elfInfo['rpath'].add(readString(data, strtabOffset + dVal))
+        elif dTag == DT_RUNPATH:
+            # RUNPATHs.
+            elfInfo['runpath'].add(readString(data, strtabOffset + dVal))
+        elif dTag == DT_SONAME:
+            # Library name.
+            elfInfo['soname'] = readString(data, strtabOffset + dVal)
+
+    return elfInfo
+
+def readStringReferences(data, layout):
+    # Returns all the offsets in '.dynstr' referenced by the dynamic entries,
+    # the dynamic symbols and the symbol versioning tables.
+    endian = layout['endian']
+    references = set()
+
+    for dTag, dVal in readDynamicEntries(data, layout):
+        if dTag in DT_STRING_TAGS:
+            references.add(dVal)
+
+    for section in layout['sections']:
+        if section[6] != layout['strtabIndex']:
+            continue
+
+        offset, size, info, entsize = section[4], section[5], section[7], section[9]
+
+        if section[1] == SHT_DYNSYM and entsize >= 4:
+            # The name of the symbol is the first field of Elf32_Sym and
+            # Elf64_Sym.
+            count = min(size, len(data) - offset) // entsize
+            nameFormat = endian + 'I{}x'.format(entsize - 4)
+            end = offset + count * entsize
+
+            for name, in struct.iter_unpack(nameFormat, data[offset: end]):
+                references.add(name)
+        elif section[1] == SHT_GNU_VERNEED:
+            for _ in range(info):
+                _, cnt, vnFile, vnAux, vnNext = \
+                    struct.unpack_from(endian + 'HHIII', data, offset)
+                references.add(vnFile)
+                aux = offset + vnAux
+
+                for _ in range(cnt):
+                    _, _, _, vnaName, vnaNext = \
+                        struct.unpack_from(endian + 'IHHII', data, aux)
+                    references.add(vnaName)
+                    aux += vnaNext
+
+                offset += vnNext
+        elif section[1] == SHT_GNU_VERDEF:
+            for _ in range(info):
+                _, _, _, cnt, _, vdAux, vdNext = \
+                    struct.unpack_from(endian + 'HHHHIII', data, offset)
+                aux = offset + vdAux
+
+                for _ in range(cnt):
+                    vdaName, vdaNext = struct.unpack_from(endian + 'II', data, aux)
+                    references.add(vdaName)
+                    aux += vdaNext
+
+                offset += vdNext
+
+    return references
+
+def setRpath(binary, rpath):
+    # Rewrite the DT_RPATH/DT_RUNPATH entry of the binary in place, this only
+    # works if the new value fits in the space used by the old string. As
+    # patchelf does, the entry is always converted to DT_RUNPATH.
+    # Returns True if the binary was modified.
+    newRpath = rpath.encode(sys.getdefaultencoding())
+
+    try:
+        with open(binary, 'r+b') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as data:
+                layout = readLayout(data)
+
+                if layout is None \
+                    or layout['strtab'] < 0 \
+                    or layout['strtabIndex'] < 0:
+                    return False
+
+                entries = readDynamicEntries(data, layout)
+                rpathEntries = [i for i, entry in enumerate(entries)
+                                if entry[0] in [DT_RPATH, DT_RUNPATH]]
+
+                # Only a single rpath entry can be rewritten.
+                if len(rpathEntries) != 1:
+                    return False
+
+                index = rpathEntries[0]
+                dTag, dVal = entries[index]
+                strOffset = layout['strtab'] + dVal
+                strEnd = data.find(b'\x00', strOffset)
+
+                if strEnd < 0 or len(newRpath) > strEnd - strOffset:
+                    return False
+
+                # Strings can be shared by tail merging, don't touch the old
+                # string if something else points inside it.
+                for ref in readStringReferences(data, layout):
+                    if ref > dVal and ref <= dVal + strEnd - strOffset:
+                        return False
+
+                data[strOffset: strEnd] = newRpath.ljust(strEnd - strOffset, b'\x00')
+
+                if dTag == DT_RPATH:
+                    dynEntrySize = struct.calcsize(layout['dynFormat'])
+                    struct.pack_into(layout['dynFormat'],
+                                     data,
+                                     layout['dynamic'][0] + index * dynEntrySize,
+                                     DT_RUNPATH,
+                                     dVal)
+
+                data.flush()
+    except:
+        return False
+
+    DTBinaryCache.invalidate(binary)
+
+    return True
+
+def parse(binary):
     if not os.path.exists(binary):
         return {}
 
-    # ELF file magic
-    ELFMAGIC = b'\x7fELF'
-
-    # File types.
-    ET_EXEC = 2
-
-    # Sections
-    SHT_STRTAB = 0x3
-    SHT_DYNAMIC = 0x6
-
-    # Dynamic section entries
-    DT_NULL = 0
-    DT_NEEDED = 1
-    DT_RPATH = 15
-    DT_RUNPATH = 0x1d
-
-    with open(binary, 'rb') as f:
-        # Read magic signature.
-        magic = f.read(4)
-
-        if magic != ELFMAGIC:
-            return {}
-
-        # Read the data structure of the file.
-        eiClass = '32bits' if struct.unpack('B', f.read(1))[0] == 1 else '64bits'
-
-        # Read file type.
-        f.seek(0x10, os.SEEK_SET)
-        fileType = struct.unpack('H', f.read(2))[0]
-        fileType = 'executable' if fileType == ET_EXEC else 'library'
-
-        # Read machine code.
-        f.seek(0x12, os.SEEK_SET)
-        machine = struct.unpack('H', f.read(2))[0]
-
-        # Get a pointer to the sections table.
-        sectionHeaderTable = 0
-
-        if eiClass == '32bits':
-            f.seek(0x20, os.SEEK_SET)
-            sectionHeaderTable = readNumber(f, eiClass)
-            f.seek(0x30, os.SEEK_SET)
-        else:
-            f.seek(0x28, os.SEEK_SET)
-            sectionHeaderTable = readNumber(f, eiClass)
-            f.seek(0x3c, os.SEEK_SET)
-
-        # Read the number of sections.
-        nSections = struct.unpack('H', f.read(2))[0]
-
-        # Read the index of the string table that stores sections names.
-        shstrtabIndex = struct.unpack('H', f.read(2))[0]
-
-        # Read sections.
-        f.seek(sectionHeaderTable, os.SEEK_SET)
-        neededPtr = []
-        rpathsPtr = []
-        runpathsPtr = []
-        strtabs = []
-        shstrtab = []
-
-        for section in range(nSections):
-            sectionStart = f.tell()
-
-            # Read the a pointer to the virtual address in the string table
-            # that contains the name of this section.
-
-            try:
-                sectionName = struct.unpack('I', f.read(4))[0]
-            except:
-                # The file is damaged
-
-                return {'machine': machine,
-                        'imports': set(),
-                        'rpath': set(),
-                        'runpath': set(),
-                        'type': fileType}
-
-            # Read the type of this section.
-            sectionType = struct.unpack('I', f.read(4))[0]
-
-            # Read the virtual address of this section.
-            f.seek(sectionStart + (0x0c if eiClass == '32bits' else 0x10), os.SEEK_SET)
-            shAddr = readNumber(f, eiClass)
-
-            # Read the offset in file to this section.
-            shOffset = readNumber(f, eiClass)
-            f.seek(shOffset, os.SEEK_SET)
-
-            if sectionType == SHT_DYNAMIC:
-                # Read dynamic sections.
-                while True:
-                    # Read dynamic entries.
-                    dTag, dVal = readDynamicEntry(f, eiClass)
-
-                    if dTag == DT_NULL:
-                        # End of dynamic sections.
-                        break
-                    elif dTag == DT_NEEDED:
-                        # Dynamically imported libraries.
-                        neededPtr.append(dVal)
-                    elif dTag == DT_RPATH:
-                        # RPATHs.
-                        rpathsPtr.append(dVal)
-                    elif dTag == DT_RUNPATH:
-                        # RUNPATHs.
-                        runpathsPtr.append(dVal)
-            elif sectionType == SHT_STRTAB:
-                # Read string tables.
-                if section == shstrtabIndex:
-                    # We found the string table that stores sections names.
-                    shstrtab = [shAddr, shOffset]
-                else:
-                    # Save string tables for later usage.
-                    strtabs += [[sectionName, shAddr, shOffset]]
-
-            # Move to next section.
-            f.seek(sectionStart + (0x28 if eiClass == '32bits' else 0x40), os.SEEK_SET)
-
-        # Libraries names and RUNPATHs are located in '.dynstr' table.
-        strtab = []
-
-        for tab in strtabs:
-            f.seek(tab[0] - shstrtab[0] + shstrtab[1], os.SEEK_SET)
-
-            if readString(f) == b'.dynstr':
-                strtab = tab
-
-        # Read dynamically imported libraries.
-        needed = set()
-
-        for lib in neededPtr:
-            f.seek(lib + strtab[2], os.SEEK_SET)
-            needed.add(readString(f).decode(sys.getdefaultencoding()))
-
-        # Read RPATHs
-        rpaths = set()
-
-        for path in rpathsPtr:
-            f.seek(path + strtab[2], os.SEEK_SET)
-            rpaths.add(readString(f).decode(sys.getdefaultencoding()))
-
-        # Read RUNPATHs
-        runpaths = set()
-
-        for path in runpathsPtr:
-            f.seek(path + strtab[2], os.SEEK_SET)
-            runpaths.add(readString(f).decode(sys.getdefaultencoding()))
-
-        return {'machine': machine,
-                'imports': needed,
-                'rpath': rpaths,
-                'runpath': runpaths,
-                'type': fileType}
+    try:
+        with open(binary, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return parseData(data)
+    except:
+        pass
 
     return {}
 
+def dump(binary):
+    info = DTBinaryCache.load('elf', binary)
+
+    if info is not None:
+        return info
+
+    info = parse(binary)
+    DTBinaryCache.store('elf', binary, info)
+
+    return info
+
 def dependencies(binary):
     elfInfo = dump(binary)
 
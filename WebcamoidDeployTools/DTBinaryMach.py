@@ -19,10 +19,14 @@
 #
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
+import mmap
 import os
 import struct
 import sys
 
+from . import DTBinaryCache
+from . import DTUtils
+
 
 # 32 bits magic number.
 MH_MAGIC = 0xfeedface # Native endian
@@ -32,20 +36,113 @@ MH_CIGAM = 0xcefaedfe # Reverse endian
 MH_MAGIC_64 = 0xfeedfacf # Native endian
 MH_CIGAM_64 = 0xcffaedfe # Reverse endian
 
+# Universal binaries, the header is always big endian.
+FAT_MAGIC = 0xcafebabe
+FAT_MAGIC_64 = 0xcafebabf
+
+# Java class files use the same magic number as the universal binaries, but
+# the field after it is the version of the class file, which is bigger than
+# the number of architectures of any universal binary.
+FAT_MAX_ARCHS = 20
+
+FAT_HEADER_SIZE = 8
+FAT_ARCH_SIZE = 20
+FAT_ARCH_64_SIZE = 32
+
+MACH_HEADER_SIZE = 28
+MACH_HEADER_64_SIZE = 32
+
 # File types.
 MH_EXECUTE = 0x2 # Executable file
 
+# CPU types.
+CPU_ARCH_ABI64 = 0x01000000
+CPU_TYPE_X86 = 7
+CPU_TYPE_X86_64 = CPU_TYPE_X86 | CPU_ARCH_ABI64
+CPU_TYPE_ARM = 12
+CPU_TYPE_ARM64 = CPU_TYPE_ARM | CPU_ARCH_ABI64
+CPU_TYPE_POWERPC = 18
+CPU_TYPE_POWERPC64 = CPU_TYPE_POWERPC | CPU_ARCH_ABI64
+
+CPU_TYPES = {'i386': CPU_TYPE_X86,
+             'i686': CPU_TYPE_X86,
+             'x86': CPU_TYPE_X86,
+             'x86_64': CPU_TYPE_X86_64,
+             'amd64': CPU_TYPE_X86_64,
+             'x64': CPU_TYPE_X86_64,
+             'arm': CPU_TYPE_ARM,
+             'armv7': CPU_TYPE_ARM,
+             'arm64': CPU_TYPE_ARM64,
+             'aarch64': CPU_TYPE_ARM64,
+             'ppc': CPU_TYPE_POWERPC,
+             'ppc64': CPU_TYPE_POWERPC64}
+
+# Load commands.
+LC_REQ_DYLD = 0x80000000
+LC_LOAD_DYLIB = 0xc
+LC_ID_DYLIB = 0xd
+LC_LOAD_WEAK_DYLIB = 0x18 | LC_REQ_DYLD
+LC_RPATH = 0x1c | LC_REQ_DYLD
+LC_REEXPORT_DYLIB = 0x1f | LC_REQ_DYLD
+LC_LAZY_LOAD_DYLIB = 0x20
+LC_LOAD_UPWARD_DYLIB = 0x23 | LC_REQ_DYLD
+
+# Commands that link a library.
+LC_DYLIBS = {LC_LOAD_DYLIB,
+             LC_LOAD_WEAK_DYLIB,
+             LC_REEXPORT_DYLIB,
+             LC_LAZY_LOAD_DYLIB,
+             LC_LOAD_UPWARD_DYLIB}
+
+# Architecture of the slice read from the universal binaries.
+TARGET_CPU_TYPE = None
+
+def isFatHeader(data, size):
+    # Returns True if data starts with the header of a universal binary of
+    # 'size' bytes, and not with a Java class.
+    if len(data) < FAT_HEADER_SIZE + FAT_ARCH_SIZE:
+        return False
+
+    magic, nArchs = struct.unpack_from('>II', data, 0)
+
+    if magic == FAT_MAGIC:
+        archSize = FAT_ARCH_SIZE
+    elif magic == FAT_MAGIC_64:
+        archSize = FAT_ARCH_64_SIZE
+    else:
+        return False
+
+    if nArchs < 1 or nArchs >= FAT_MAX_ARCHS:
+        return False
+
+    if FAT_HEADER_SIZE + nArchs * archSize > size:
+        return False
+
+    # The first slice must be inside the file.
+    if magic == FAT_MAGIC:
+        _, _, offset, sliceSize, _ = struct.unpack_from('>iiIII', data, FAT_HEADER_SIZE)
+    else:
+        if len(data) < FAT_HEADER_SIZE + FAT_ARCH_64_SIZE:
+            return True
+
+        _, _, offset, sliceSize, _, _ = struct.unpack_from('>iiQQII', data, FAT_HEADER_SIZE)
+
+    return offset >= FAT_HEADER_SIZE and offset + sliceSize <= size
+
 def isValid(path):
     try:
         with open(path, 'rb') as f:
             # Read magic number.
-            magic = struct.unpack('I', f.read(4))[0]
+            header = f.read(FAT_HEADER_SIZE + FAT_ARCH_64_SIZE)
+            magic = struct.unpack_from('<I', header, 0)[0]
 
             if magic == MH_MAGIC \
                 or magic == MH_CIGAM \
                 or magic == MH_MAGIC_64 \
                 or magic == MH_CIGAM_64:
                 return True
+
+            return isFatHeader(header, os.fstat(f.fileno()).st_size)
     except:
         pass
 
@@ -74,7 +171,9 @@ def name(binary, configs=None):
     return dep
 
 def init(configs, targetPlatform, targetArch, sysLibDir):
-    pass
+    global TARGET_CPU_TYPE
+
+    TARGET_CPU_TYPE = CPU_TYPES.get(targetArch.lower())
 
 def solveRefpath(path):
     if not path.startswith('@'):
@@ -104,87 +203,180 @@ def solveRefpath(path):
 
     return ''
 
-# https://github.com/aidansteele/osx-abi-macho-file-format-reference
-def dump(binary):
-    if not os.path.exists(binary):
-        return {}
+def fatSlices(data):
+    # Returns the CPU type, the offset and the size of each slice.
+    magic, nArchs = struct.unpack_from('>II', data, 0)
+    slices = []
 
-    # Commands definitions
-    LC_REQ_DYLD = 0x80000000
-    LC_LOAD_DYLIB = 0xc
-    LC_RPATH = 0x1c | LC_REQ_DYLD
-    LC_ID_DYLIB = 0xd
+    for i in range(nArchs):
+        if magic == FAT_MAGIC:
+            cpuType, _, offset, size, _ = \
+                struct.unpack_from('>iiIII', data, FAT_HEADER_SIZE + i * FAT_ARCH_SIZE)
+        else:
+            cpuType, _, offset, size, _, _ = \
+                struct.unpack_from('>iiQQII', data, FAT_HEADER_SIZE + i * FAT_ARCH_64_SIZE)
 
-    dylibImports = []
-    rpaths = []
-    dylibId = ''
+        if offset + size <= len(data):
+            slices.append((cpuType, offset, size))
 
-    with open(binary, 'rb') as f:
-        # Read magic number.
-        magic = 0
+    return slices
 
-        try:
-            magic = struct.unpack('I', f.read(4))[0]
-        except:
+def selectSlice(slices):
+    # Use the slice of the target architecture, or the first one if the
+    # target is not in the binary.
+    for cpuType, offset, size in slices:
+        if cpuType == TARGET_CPU_TYPE:
+            return cpuType, offset, size
+
+    return slices[0] if len(slices) > 0 else None
+
+def readString(data, offset, end):
+    # Strings in the load commands are padded with null characters up to the
+    # end of the command.
+    stringEnd = data.find(b'\x00', offset, end)
+
+    if stringEnd < 0:
+        stringEnd = end
+
+    return data[offset: stringEnd].decode(sys.getdefaultencoding())
+
+# https://github.com/aidansteele/osx-abi-macho-file-format-reference
+def parseData(data, offset=0, size=None):
+    if size is None:
+        size = len(data) - offset
+
+    if size < 4:
+        return {}
+
+    if data[offset: offset + 4] in [b'\xca\xfe\xba\xbe', b'\xca\xfe\xba\xbf']:
+        if offset != 0 or not isFatHeader(data, len(data)):
             return {}
 
-        if magic == MH_MAGIC or magic == MH_CIGAM:
-            is32bits = True
-        elif magic == MH_MAGIC_64 or magic == MH_CIGAM_64:
-            is32bits = False
-        else:
+        selected = selectSlice(fatSlices(data))
+
+        if selected is None:
             return {}
 
-        # Read file type.
-        f.seek(8, os.SEEK_CUR)
-        fileType = struct.unpack('I', f.read(4))[0]
-        fileType = 'executable' if fileType == MH_EXECUTE else 'library'
+        _, sliceOffset, sliceSize = selected
+        info = parseData(data, sliceOffset, sliceSize)
+
+        if info:
+            info['fat'] = True
+
+        return info
+
+    # The byte order of the fields is given by the magic number.
+    magic = struct.unpack_from('<I', data, offset)[0]
+
+    if magic == MH_MAGIC or magic == MH_MAGIC_64:
+        byteOrder = '<'
+    elif magic == MH_CIGAM or magic == MH_CIGAM_64:
+        byteOrder = '>'
+    else:
+        return {}
+
+    is64bits = magic == MH_MAGIC_64 or magic == MH_CIGAM_64
+    headerSize = MACH_HEADER_64_SIZE if is64bits else MACH_HEADER_SIZE
+
+    if size < headerSize:
+        return {}
 
-        # Read number of commands.
-        ncmds = struct.unpack('I', f.read(4))[0]
+    _, cpuType, _, fileType, ncmds, sizeOfCmds, _ = \
+        struct.unpack_from(byteOrder + 'IiiIIII', data, offset)
+    fileType = 'executable' if fileType == MH_EXECUTE else 'library'
 
-        # Move to load commands
-        f.seek(8 if is32bits else 12, os.SEEK_CUR)
+    # All the load commands are right after the header, decode them from the
+    # mapped file without copying the region.
+    commandsStart = offset + headerSize
+    commandsEnd = min(commandsStart + sizeOfCmds, offset + size)
+    commandFormat = byteOrder + 'II'
+    offsetFormat = byteOrder + 'I'
 
-        for _ in range(ncmds):
-            # Read a load command and store it's position in the file.
-            loadCommandStart = f.tell()
-            loadCommand = struct.unpack('II', f.read(8))
+    dylibImports = []
+    weakImports = []
+    reexports = []
+    rpaths = []
+    dylibId = ''
+    command = commandsStart
 
-            # If the command list a library
-            if loadCommand[0] in [LC_LOAD_DYLIB, LC_RPATH, LC_ID_DYLIB]:
-                # Save the position of the next command.
-                nextCommand = f.tell() + loadCommand[1] - 8
+    for _ in range(ncmds):
+        if command + 8 > commandsEnd:
+            break
 
-                # Move to the string
-                f.seek(loadCommandStart + struct.unpack('I', f.read(4))[0], os.SEEK_SET)
-                dylib = b''
+        cmd, cmdSize = struct.unpack_from(commandFormat, data, command)
 
-                # Read string until null character.
-                while True:
-                    c = f.read(1)
+        if cmdSize < 8 or command + cmdSize > commandsEnd:
+            break
 
-                    if c == b'\x00':
-                        break
+        if cmd in LC_DYLIBS or cmd == LC_ID_DYLIB or cmd == LC_RPATH:
+            # The command starts with the offset of the string, relative to
+            # the start of the command.
+            stringOffset = struct.unpack_from(offsetFormat, data, command + 8)[0]
 
-                    dylib += c
-                s = dylib.decode(sys.getdefaultencoding())
+            if 12 <= stringOffset < cmdSize:
+                s = readString(data, command + stringOffset, command + cmdSize)
 
-                if loadCommand[0] == LC_LOAD_DYLIB:
+                if cmd in LC_DYLIBS:
                     dylibImports.append(s)
-                elif loadCommand[0] == LC_RPATH:
+
+                    if cmd == LC_LOAD_WEAK_DYLIB:
+                        weakImports.append(s)
+                    elif cmd == LC_REEXPORT_DYLIB:
+                        reexports.append(s)
+                elif cmd == LC_RPATH:
                     rpaths.append(s)
-                elif loadCommand[0] == LC_ID_DYLIB:
+                elif cmd == LC_ID_DYLIB:
                     dylibId = s
 
-                f.seek(nextCommand, os.SEEK_SET)
-            else:
-                f.seek(loadCommand[1] - 8, os.SEEK_CUR)
+        command += cmdSize
 
     return {'imports': dylibImports,
+            'weakImports': weakImports,
+            'reexports': reexports,
             'rpaths': rpaths,
             'id': dylibId,
-            'type': fileType}
+            'type': fileType,
+            'cpuType': cpuType,
+            'fat': False}
+
+def parse(binary):
+    if not os.path.exists(binary) or not os.path.isfile(binary):
+        return {}
+
+    try:
+        with open(binary, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return parseData(data)
+    except:
+        pass
+
+    return {}
+
+def cacheFormat():
+    # The info of the universal binaries depends on the target
+    # architecture.
+    if TARGET_CPU_TYPE is None:
+        return 'mach'
+
+    return 'mach:{}'.format(TARGET_CPU_TYPE)
+
+def dump(binary):
+    info = DTBinaryCache.load(cacheFormat(), binary)
+
+    if info is not None:
+        return info
+
+    info = parse(binary)
+    DTBinaryCache.store(cacheFormat(), binary, info)
+
+    return info
+
+def dumpMany(binaries):
+    # Parses many binaries at once, returns a dictionary with the info of
+    # each binary.
+    binaries = list(binaries)
+
+    return dict(zip(binaries, DTUtils.mapJobs(dump, binaries)))
 
 def dependencies(binary):
     machInfo = dump(binary)
@@ -19,16 +19,35 @@
 #
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
+import bisect
 import mimetypes
+import mmap
 import os
 import struct
 import sys
 
+from . import DTBinaryCache
 from . import DTUtils
 
 
 EXTRA_LIBRARY_PATH = []
 
+# Characteristics flags
+IMAGE_FILE_EXECUTABLE_IMAGE = 0x2
+
+PE32_MAGIC = 0x10b
+
+# Data directories
+IMAGE_DIRECTORY_ENTRY_IMPORT = 1
+IMAGE_DIRECTORY_ENTRY_DELAY_IMPORT = 13
+
+IMAGE_SECTION_HEADER_SIZE = 40
+IMAGE_IMPORT_DESCRIPTOR_SIZE = 20
+IMAGE_DELAYLOAD_DESCRIPTOR_SIZE = 32
+
+# The delay load descriptor uses RVAs instead of virtual addresses.
+DELAYLOAD_RVA_BASED = 0x1
+
 def isValid(path):
     mimetype, _ = mimetypes.guess_type(path)
 
@@ -65,119 +84,197 @@ def init(configs, targetPlatform, targetArch, sysLibDir):
 
     EXTRA_LIBRARY_PATH = sysLibDir
 
-# https://msdn.microsoft.com/en-us/library/windows/desktop/ms680547(v=vs.85).aspx
-# https://upload.wikimedia.org/wikipedia/commons/1/1b/Portable_Executable_32_bit_Structure_in_SVG_fixed.svg
-def dump(binary):
-    # Characteristics flags
-    IMAGE_FILE_EXECUTABLE_IMAGE = 0x2
+def libSearchPaths():
+    pathSep = ';' if DTUtils.hostPlatform() == 'windows' else ':'
+    sysPath = os.environ['PATH'].split(pathSep) if 'PATH' in os.environ else []
 
-    dllImports = set()
+    return EXTRA_LIBRARY_PATH + sysPath
 
-    if not os.path.exists(binary) or not os.path.isfile(binary):
-        return {}
+# https://learn.microsoft.com/en-us/windows/win32/debug/pe-format
+# https://upload.wikimedia.org/wikipedia/commons/1/1b/Portable_Executable_32_bit_Structure_in_SVG_fixed.svg
+def readString(data, offset):
+    end = data.find(b'\x00', offset)
 
-    with open(binary, 'rb') as f:
-        # Check DOS header signature.
-        if f.read(2) != b'MZ':
-            return []
+    if end < 0:
+        end = len(data)
 
-        # Move to COFF header.
-        f.seek(0x3c, os.SEEK_SET)
-        peHeaderOffset = struct.unpack('I', f.read(4))
-        f.seek(peHeaderOffset[0], os.SEEK_SET)
-        peSignatue = f.read(4)
+    return data[offset: end].decode(sys.getdefaultencoding())
 
-        # Check COFF header signature.
-        if peSignatue != b'PE\x00\x00':
-            return []
+def readSections(data, offset, nSections):
+    # Returns the sections sorted by virtual address as a list of
+    # (virtual address, end address, file offset) and the list of the
+    # starting addresses, for translating RVAs by bisection.
+    sections = []
+    end = offset + IMAGE_SECTION_HEADER_SIZE * nSections
 
-        # Read COFF header.
-        coffHeader = struct.unpack('HHIIIHH', f.read(20))
-        nSections = coffHeader[1]
-        sectionTablePos = coffHeader[5] + f.tell()
-        fileType = 'executable' if coffHeader[6] & IMAGE_FILE_EXECUTABLE_IMAGE != 0 else 'library'
+    if end > len(data):
+        return [], []
 
-        # Read magic signature in standard COFF fields.
-        peType = 'PE32' if f.read(2) == b'\x0b\x01' else 'PE32+'
+    for _, virtualSize, virtualAddress, rawSize, rawPointer, *_ in \
+        struct.iter_unpack('<8sIIIIIIHHI', data[offset: end]):
+        size = max(virtualSize, rawSize)
 
-        # Move to data directories.
-        f.seek(102 if peType == 'PE32' else 118, os.SEEK_CUR)
+        if size > 0:
+            sections.append((virtualAddress, virtualAddress + size, rawPointer))
 
-        # Read the import table.
-        importTablePos, importTableSize = struct.unpack('II', f.read(8))
+    sections.sort()
 
-        # Move to Sections table.
-        f.seek(sectionTablePos, os.SEEK_SET)
-        sections = []
-        idataTablePhysical = -1
+    return sections, [section[0] for section in sections]
 
-        # Search for 'idata' section.
-        for _ in range(nSections):
-            # Read section.
-            section = struct.unpack('8pIIIIIIHHI', f.read(40))
-            sectionName = section[0].replace(b'\x00', b'')
+def rvaToOffset(sections, starts, rva):
+    i = bisect.bisect_right(starts, rva) - 1
 
-            # Save a reference to the sections.
-            sections += [section]
+    if i < 0:
+        return -1
 
-            if sectionName == b'idata' or sectionName == b'rdata':
-                idataTablePhysical = section[4]
+    virtualAddress, endAddress, rawPointer = sections[i]
 
-                # If import table was defined calculate it's position in
-                # the file in relation to the address given by 'idata'.
-                if importTableSize > 0:
-                    idataTablePhysical += importTablePos - section[2]
+    if rva >= endAddress:
+        return -1
 
-        if idataTablePhysical < 0:
-            return []
+    return rva - virtualAddress + rawPointer
 
-        # Move to 'idata' section.
-        f.seek(idataTablePhysical, os.SEEK_SET)
-        dllList = set()
+def readImports(data, sections, starts, directory, entrySize, nameField, imageBase=0, attributesField=-1):
+    # Reads the DLL names of an import directory table, the table ends with
+    # a null entry.
+    imports = set()
+    rva, size = directory
 
-        # Read 'idata' directory table.
-        while True:
-            # Read DLL entries.
-            try:
-                dllImport = struct.unpack('IIIII', f.read(20))
-            except:
-                break
+    if rva == 0:
+        return imports
+
+    offset = rvaToOffset(sections, starts, rva)
 
-            # Null directory entry.
-            if dllImport[0] | dllImport[1] | dllImport[2] | dllImport[3] | dllImport[4] == 0:
-                break
+    if offset < 0:
+        return imports
 
-            # Locate where is located the DLL name in relation to the
-            # sections.
-            for section in sections:
-                if dllImport[3] >= section[2] \
-                    and dllImport[3] < section[1] + section[2]:
-                    dllList.add(dllImport[3] - section[2] + section[4])
+    entryFormat = '<{}I'.format(entrySize // 4)
 
-                    break
+    while offset + entrySize <= len(data):
+        entry = struct.unpack_from(entryFormat, data, offset)
 
-        for dll in dllList:
-            # Move to DLL name.
-            f.seek(dll, os.SEEK_SET)
-            dllName = b''
+        if not any(entry):
+            break
 
-            # Read string until null character.
-            while True:
-                c = f.read(1)
+        nameRva = entry[nameField]
 
-                if c == b'\x00':
-                    break
+        # Old delay load tables use virtual addresses instead of RVAs.
+        if attributesField >= 0 \
+            and entry[attributesField] & DELAYLOAD_RVA_BASED == 0 \
+            and nameRva >= imageBase:
+            nameRva -= imageBase
 
-                dllName += c
+        nameOffset = rvaToOffset(sections, starts, nameRva)
 
+        if nameOffset >= 0 and nameOffset < len(data):
             try:
-                dllImports.add(dllName.decode(sys.getdefaultencoding()))
+                imports.add(readString(data, nameOffset))
             except:
                 pass
 
-    return {'imports': dllImports,
+        offset += entrySize
+
+    return imports
+
+def parseData(data):
+    if len(data) < 0x40 or data[: 2] != b'MZ':
+        return {}
+
+    # Move to COFF header.
+    peHeaderOffset = struct.unpack_from('<I', data, 0x3c)[0]
+
+    if peHeaderOffset + 24 > len(data) \
+        or data[peHeaderOffset: peHeaderOffset + 4] != b'PE\x00\x00':
+        return {}
+
+    # Read COFF header.
+    _, nSections, _, _, _, optionalHeaderSize, characteristics = \
+        struct.unpack_from('<HHIIIHH', data, peHeaderOffset + 4)
+    fileType = 'executable' if characteristics & IMAGE_FILE_EXECUTABLE_IMAGE != 0 else 'library'
+    optionalHeader = peHeaderOffset + 24
+
+    if optionalHeader + 2 > len(data):
+        return {}
+
+    # Read magic signature in standard COFF fields, and locate the data
+    # directories.
+    magic = struct.unpack_from('<H', data, optionalHeader)[0]
+
+    if magic == PE32_MAGIC:
+        imageBase = struct.unpack_from('<I', data, optionalHeader + 28)[0]
+        nDirectoriesOffset = optionalHeader + 92
+    else:
+        imageBase = struct.unpack_from('<Q', data, optionalHeader + 24)[0]
+        nDirectoriesOffset = optionalHeader + 108
+
+    if nDirectoriesOffset + 4 > len(data):
+        return {}
+
+    nDirectories = struct.unpack_from('<I', data, nDirectoriesOffset)[0]
+    directories = []
+
+    for i in range(min(nDirectories, 16)):
+        offset = nDirectoriesOffset + 4 + 8 * i
+
+        if offset + 8 > len(data):
+            break
+
+        directories.append(struct.unpack_from('<II', data, offset))
+
+    directories += [(0, 0)] * (16 - len(directories))
+    sections, starts = readSections(data,
+                                    optionalHeader + optionalHeaderSize,
+                                    nSections)
+    dllImports = readImports(data,
+                             sections,
+                             starts,
+                             directories[IMAGE_DIRECTORY_ENTRY_IMPORT],
+                             IMAGE_IMPORT_DESCRIPTOR_SIZE,
+                             3)
+    delayImports = readImports(data,
+                               sections,
+                               starts,
+                               directories[IMAGE_DIRECTORY_ENTRY_DELAY_IMPORT],
+                               IMAGE_DELAYLOAD_DESCRIPTOR_SIZE,
+                               1,
+                               imageBase,
+                               0)
+
+    return {'imports': dllImports | delayImports,
+            'delayImports': delayImports,
             'type': fileType}
 
+def parse(binary):
+    if not os.path.exists(binary) or not os.path.isfile(binary):
+        return {}
+
+    try:
+        with open(binary, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return parseData(data)
+    except:
+        pass
+
+    return {}
+
+def dump(binary):
+    info = DTBinaryCache.load('pecoff', binary)
+
+    if info is not None:
+        return info
+
+    info = parse(binary)
+    DTBinaryCache.store('pecoff', binary, info)
+
+    return info
+
+def dumpMany(binaries):
+    # Parses many binaries at once, returns a dictionary with the info of
+    # each binary.
+    binaries = list(binaries)
+
+    return dict(zip(binaries, DTUtils.mapJobs(dump, binaries)))
+
 def dependencies(binary):
     info = dump(binary)
 
@@ -185,9 +282,10 @@ def dependencies(binary):
         return []
 
     deps = []
+    searchPaths = libSearchPaths()
 
     for dep in info['imports']:
-        depPath = DTUtils.whereBin(dep, EXTRA_LIBRARY_PATH)
+        depPath = DTUtils.findInPaths(dep, searchPaths)
 
         if len(depPath) > 0:
             deps.append(depPath)
@@ -195,4 +293,4 @@ def dependencies(binary):
     return deps
 
 def guess(mainExecutable, dependency):
-    return DTUtils.whereBin(dependency, EXTRA_LIBRARY_PATH)
+    return DTUtils.findInPaths(dependency, libSearchPaths())
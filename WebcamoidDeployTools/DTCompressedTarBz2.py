@@ -20,8 +20,8 @@
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
 import os
-import tarfile
 
+from . import DTCompression
 from . import DTUtils
 
 
@@ -31,7 +31,14 @@ def platforms():
 def isAvailable(configs):
     return True
 
-def run(globs, configs, dataDir, outputDir, mutex):
+def cpuBound():
+    return True
+
+def packagingCost():
+    return 3
+
+def archive(configs, outputDir):
+    # Returns the description of the archive created by this format.
     sourcesDir = configs.get('Package', 'sourcesDir', fallback='.').strip()
     name = configs.get('Package', 'name', fallback='app').strip()
     version = DTUtils.programVersion(configs, sourcesDir)
@@ -57,14 +64,22 @@ def run(globs, configs, dataDir, outputDir, mutex):
 
     outPackage += '.tar.bz2'
 
-    # Remove old file
-    if os.path.exists(outPackage):
-        os.remove(outPackage)
+    threads, preset, program = DTCompression.readOptions(configs,
+                                                         'CompressedTarBz2',
+                                                         'bz2')
+
+    return {'path': outPackage,
+            'name': name,
+            'codec': 'bz2',
+            'level': preset,
+            'threads': threads,
+            'program': program,
+            'epoch': DTCompression.sourceDateEpoch(configs, 'CompressedTarBz2')}
 
-    with tarfile.open(outPackage, 'w:bz2') as tar:
-        tar.add(dataDir, name)
+def run(globs, configs, dataDir, outputDir, mutex):
+    created = DTCompression.writeArchives(dataDir, [archive(configs, outputDir)])
 
-    if not os.path.exists(outPackage):
+    if len(created) < 1:
         return
 
     mutex.acquire()
@@ -72,5 +87,5 @@ def run(globs, configs, dataDir, outputDir, mutex):
     if not 'outputPackages' in globs:
         globs['outputPackages'] = []
 
-    globs['outputPackages'].append(outPackage)
+    globs['outputPackages'] += created
     mutex.release()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import os
+
+from . import DTCompression
+from . import DTUtils
+
+
+def platforms():
+    return ['mac', 'posix', 'windows']
+
+def isAvailable(configs):
+    program = configs.get('CompressedTarZst', 'compressor', fallback='').strip()
+
+    return DTCompression.isAvailable('zst', program)
+
+def cpuBound():
+    return True
+
+def packagingCost():
+    return 2
+
+def archive(configs, outputDir):
+    # Returns the description of the archive created by this format.
+    sourcesDir = configs.get('Package', 'sourcesDir', fallback='.').strip()
+    name = configs.get('Package', 'name', fallback='app').strip()
+    version = DTUtils.programVersion(configs, sourcesDir)
+    packageName = configs.get('CompressedTarZst', 'name', fallback=name).strip()
+    defaultPkgTargetPlatform = configs.get('Package', 'targetPlatform', fallback='').strip()
+    pkgTargetPlatform = configs.get('CompressedTarZst', 'pkgTargetPlatform', fallback=defaultPkgTargetPlatform).strip()
+    targetArch = configs.get('Package', 'targetArch', fallback='').strip()
+    defaultHideArch = configs.get('Package', 'hideArch', fallback='false').strip()
+    hideArch = configs.get('CompressedTarZst', 'hideArch', fallback=defaultHideArch).strip()
+    hideArch = DTUtils.toBool(hideArch)
+    defaultShowTargetPlatform = configs.get('Package', 'showTargetPlatform', fallback='true').strip()
+    showTargetPlatform = configs.get('CompressedTarZst', 'showTargetPlatform', fallback=defaultShowTargetPlatform).strip()
+    showTargetPlatform = DTUtils.toBool(showTargetPlatform)
+    outPackage = os.path.join(outputDir, packageName)
+
+    if showTargetPlatform:
+        outPackage += '-' + pkgTargetPlatform
+
+    outPackage += '-' + version
+
+    if not hideArch:
+        outPackage += '-' + targetArch
+
+    outPackage += '.tar.zst'
+
+    threads, preset, program = DTCompression.readOptions(configs,
+                                                         'CompressedTarZst',
+                                                         'zst')
+
+    return {'path': outPackage,
+            'name': name,
+            'codec': 'zst',
+            'level': preset,
+            'threads': threads,
+            'program': program,
+            'epoch': DTCompression.sourceDateEpoch(configs, 'CompressedTarZst')}
+
+def run(globs, configs, dataDir, outputDir, mutex):
+    created = DTCompression.writeArchives(dataDir, [archive(configs, outputDir)])
+
+    if len(created) < 1:
+        return
+
+    mutex.acquire()
+
+    if not 'outputPackages' in globs:
+        globs['outputPackages'] = []
+
+    globs['outputPackages'] += created
+    mutex.release()
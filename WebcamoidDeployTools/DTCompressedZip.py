@@ -20,8 +20,8 @@
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
 import os
-import zipfile
 
+from . import DTCompression
 from . import DTUtils
 
 
@@ -31,7 +31,14 @@ def platforms():
 def isAvailable(configs):
     return True
 
-def run(globs, configs, dataDir, outputDir, mutex):
+def cpuBound():
+    return True
+
+def packagingCost():
+    return 1
+
+def archive(configs, outputDir):
+    # Returns the description of the archive created by this format.
     sourcesDir = configs.get('Package', 'sourcesDir', fallback='.').strip()
     name = configs.get('Package', 'name', fallback='app').strip()
     version = DTUtils.programVersion(configs, sourcesDir)
@@ -57,19 +64,22 @@ def run(globs, configs, dataDir, outputDir, mutex):
 
     outPackage += '.zip'
 
-    # Remove old file
-    if os.path.exists(outPackage):
-        os.remove(outPackage)
+    threads, preset, program = DTCompression.readOptions(configs,
+                                                         'CompressedZip',
+                                                         'zip')
+
+    return {'path': outPackage,
+            'name': name,
+            'codec': 'zip',
+            'level': preset,
+            'threads': threads,
+            'program': program,
+            'epoch': DTCompression.sourceDateEpoch(configs, 'CompressedZip')}
 
-    with zipfile.ZipFile(outPackage, 'w', zipfile.ZIP_DEFLATED, False) as zipFile:
-        for root, dirs, files in os.walk(dataDir):
-            for f in dirs + files:
-                filePath = os.path.join(root, f)
-                dstPath = os.path.join(name,
-                                       filePath.replace(dataDir + os.sep, ''))
-                zipFile.write(filePath, dstPath)
+def run(globs, configs, dataDir, outputDir, mutex):
+    created = DTCompression.writeArchives(dataDir, [archive(configs, outputDir)])
 
-    if not os.path.exists(outPackage):
+    if len(created) < 1:
         return
 
     mutex.acquire()
@@ -77,5 +87,5 @@ def run(globs, configs, dataDir, outputDir, mutex):
     if not 'outputPackages' in globs:
         globs['outputPackages'] = []
 
-    globs['outputPackages'].append(outPackage)
+    globs['outputPackages'] += created
     mutex.release()
@@ -0,0 +1,765 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import bz2
+import collections
+import concurrent.futures
+import contextlib
+import gzip
+import os
+import queue
+import stat
+import subprocess # nosec
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+import zlib
+
+from . import DTFileIndex
+from . import DTGit
+from . import DTUtils
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+
+# Dictionary sizes used by each xz preset, xz splits the stream in blocks of
+# 3 times the dictionary size when compressing with multiple threads.
+XZ_DICT_SIZES = [256 << 10,
+                 1 << 20,
+                 2 << 20,
+                 4 << 20,
+                 4 << 20,
+                 8 << 20,
+                 8 << 20,
+                 16 << 20,
+                 32 << 20,
+                 64 << 20]
+
+# Memory used by the xz encoder of each preset, as documented by xz.
+XZ_ENCODER_MEMORY = [3 << 20,
+                     9 << 20,
+                     17 << 20,
+                     32 << 20,
+                     48 << 20,
+                     94 << 20,
+                     94 << 20,
+                     186 << 20,
+                     370 << 20,
+                     674 << 20]
+
+# Size of the blocks compressed by each zstd job.
+ZSTD_BLOCK_SIZE = 16 << 20
+
+# Memory used by the parallel compressors when the size of the physical
+# memory can't be read.
+DEFAULT_MEMORY_LIMIT = 1 << 30
+
+# Files that are already compressed, these are stored as is in zip files.
+STORED_EXTENSIONS = ['.7z',
+                     '.bz2',
+                     '.gz',
+                     '.jpeg',
+                     '.jpg',
+                     '.png',
+                     '.qmlc',
+                     '.webp',
+                     '.xz',
+                     '.zip',
+                     '.zst']
+
+# Size of the blocks compressed by each gzip and bzip2 job.
+BLOCK_SIZE = 4 << 20
+
+# Size of the chunks read from the files and of the chunks of the tar stream
+# sent to the compressors.
+CHUNK_SIZE = 1 << 20
+
+# Maximum number of chunks or files waiting to be processed by each archive.
+QUEUE_SIZE = 16
+
+# Files up to this size are compressed in parallel and kept in memory until
+# written to the zip file, bigger files are compressed while writing them.
+ZIP_BUFFERED_SIZE = 4 * CHUNK_SIZE
+
+# Timestamp used by reproducible archives when SOURCE_DATE_EPOCH is not set
+# and the commit time is not available, 1980-01-01 is the oldest date that
+# can be stored in a zip file.
+DEFAULT_EPOCH = 315532800
+
+def xzCompressBlock(data, level):
+    # Each block is written as an independent xz stream, the concatenation
+    # of xz streams is a valid xz file.
+    return lzma.compress(data,
+                         format=lzma.FORMAT_XZ,
+                         check=lzma.CHECK_CRC64,
+                         preset=level)
+
+def gzipCompressBlock(data, level):
+    # The concatenation of gzip members is a valid gzip file.
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def bzip2CompressBlock(data, level):
+    # The concatenation of bzip2 streams is a valid bzip2 file.
+    return bz2.compress(data, compresslevel=level)
+
+def zstdCompressBlock(data, level):
+    # The concatenation of zstd frames is a valid zstd file. The one-shot
+    # compress function of both modules writes a complete frame.
+    return zstd.compress(data, level)
+
+def zstdIsUsable():
+    # Check that a compressed block can be decoded, otherwise use the
+    # external program.
+    if zstd is None:
+        return False
+
+    data = b'Webcamoid Deploy Tools' * 64
+
+    try:
+        return zstd.decompress(zstdCompressBlock(data, 3)) == data
+    except:
+        return False
+
+# Supported codecs, the built-in compressor is used if available, otherwise
+# the stream is piped to one of the external programs.
+CODECS = {
+    'gz': {
+        'builtin': gzipCompressBlock,
+        'programs': [],
+        'defaultLevel': 9,
+        'levels': range(1, 10),
+        'blockSize': lambda level: BLOCK_SIZE,
+        'encoderMemory': lambda level: 1 << 20
+    },
+    'bz2': {
+        'builtin': bzip2CompressBlock,
+        'programs': [],
+        'defaultLevel': 9,
+        'levels': range(1, 10),
+        'blockSize': lambda level: BLOCK_SIZE,
+        'encoderMemory': lambda level: 8 << 20
+    },
+    'xz': {
+        'builtin': xzCompressBlock if lzma is not None else None,
+        'programs': ['xz', 'pxz'],
+        'defaultLevel': 6,
+        'levels': range(0, 10),
+        'blockSize': lambda level: 3 * XZ_DICT_SIZES[level],
+        'encoderMemory': lambda level: XZ_ENCODER_MEMORY[level]
+    },
+    # Zip entries are compressed by ZipSink, this is only used for reading
+    # the options of the format.
+    'zip': {
+        'builtin': None,
+        'programs': [],
+        'defaultLevel': 6,
+        'levels': range(0, 10),
+        'blockSize': lambda level: 0,
+        'encoderMemory': lambda level: 0
+    },
+    'zst': {
+        'builtin': zstdCompressBlock if zstdIsUsable() else None,
+        'programs': ['zstd'],
+        'defaultLevel': 3,
+        'levels': range(1, 20),
+        'blockSize': lambda level: ZSTD_BLOCK_SIZE,
+        # The window of the high levels covers the whole block.
+        'encoderMemory': lambda level: (32 << 20) if level < 10 else (8 * ZSTD_BLOCK_SIZE)
+    }
+}
+
+def memoryLimit():
+    # Like xz, use up to a quarter of the physical memory for compressing in
+    # parallel.
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 4
+    except:
+        pass
+
+    return DEFAULT_MEMORY_LIMIT
+
+class BlockCompressor:
+    # Write-only file object that splits the stream in blocks and compresses
+    # them in parallel, the compressed blocks are written in order.
+
+    def __init__(self, fileobj, compressBlock, level, blockSize, threads, jobMemory=0):
+        self.fileobj = fileobj
+        self.compressBlock = compressBlock
+        self.level = level
+        self.blockSize = blockSize
+
+        # Up to 2 blocks are kept in memory for each thread, reduce the number
+        # of threads if the blocks and the encoders don't fit in the memory
+        # limit.
+        threads = min(threads, memoryLimit() // (2 * blockSize + jobMemory))
+        self.threads = max(threads, 1)
+        self.buffer = bytearray()
+        self.pending = collections.deque()
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.threads,
+                                                          thread_name_prefix='DTCompressor')
+
+    def submit(self, block):
+        # Keep a bounded number of blocks in memory.
+        while len(self.pending) >= 2 * self.threads:
+            self.fileobj.write(self.pending.popleft().result())
+
+        self.pending.append(self.pool.submit(self.compressBlock,
+                                             block,
+                                             self.level))
+
+    def write(self, data):
+        self.buffer += data
+
+        while len(self.buffer) >= self.blockSize:
+            self.submit(bytes(self.buffer[: self.blockSize]))
+            del self.buffer[: self.blockSize]
+
+        return len(data)
+
+    def close(self):
+        try:
+            if len(self.buffer) > 0 or len(self.pending) < 1:
+                self.submit(bytes(self.buffer))
+                self.buffer.clear()
+
+            while len(self.pending) > 0:
+                self.fileobj.write(self.pending.popleft().result())
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+
+class ProgramCompressor:
+    # Write-only file object that pipes the stream to an external compressor.
+
+    def __init__(self, fileobj, program, level, threads):
+        params = [program, '-T{}'.format(threads), '-{}'.format(level), '-c']
+        self.process = subprocess.Popen(params, # nosec
+                                        stdin=subprocess.PIPE,
+                                        stdout=fileobj)
+
+    def write(self, data):
+        self.process.stdin.write(data)
+
+        return len(data)
+
+    def close(self):
+        self.process.stdin.close()
+
+        if self.process.wait() != 0:
+            raise IOError('{} exited with code {}'.format(self.process.args[0],
+                                                         self.process.returncode))
+
+def findProgram(codec, program=''):
+    if program != '':
+        return DTUtils.whereBin(program)
+
+    for program in CODECS[codec]['programs']:
+        path = DTUtils.whereBin(program)
+
+        if path != '':
+            return path
+
+    return ''
+
+def isAvailable(codec, program=''):
+    if program == '' and CODECS[codec]['builtin'] is not None:
+        return True
+
+    return findProgram(codec, program) != ''
+
+def readOptions(configs, section, codec):
+    # Reads the 'threads', 'preset' and 'compressor' options of the format.
+    threads = configs.get(section, 'threads', fallback='0').strip()
+
+    try:
+        threads = int(threads)
+    except:
+        threads = 0
+
+    if threads < 1:
+        threads = DTUtils.numThreads()
+
+    level = configs.get(section, 'preset', fallback='').strip()
+
+    try:
+        level = int(level)
+    except:
+        level = CODECS[codec]['defaultLevel']
+
+    levels = CODECS[codec]['levels']
+    level = min(max(level, levels[0]), levels[-1])
+    program = configs.get(section, 'compressor', fallback='').strip()
+
+    return threads, level, program
+
+def sourceDateEpoch(configs, section):
+    # Returns the timestamp used for clamping the modification time of the
+    # files in reproducible archives, or -1 if the archive is not
+    # reproducible.
+    defaultReproducible = configs.get('Package', 'reproducible', fallback='false').strip()
+    reproducible = configs.get(section, 'reproducible', fallback=defaultReproducible).strip()
+
+    if not DTUtils.toBool(reproducible):
+        return -1
+
+    try:
+        return max(int(os.environ['SOURCE_DATE_EPOCH']), 0)
+    except:
+        pass
+
+    sourcesDir = configs.get('Package', 'sourcesDir', fallback='.').strip()
+    commitTime = DTGit.commitTime(sourcesDir)
+
+    return commitTime if commitTime >= 0 else DEFAULT_EPOCH
+
+def normalizedMode(mode):
+    # Directories and executables get 0755, other files 0644.
+    if stat.S_ISDIR(mode) or mode & 0o111:
+        return 0o755
+
+    return 0o644
+
+def normalizeTarInfo(tarinfo, epoch):
+    tarinfo.mtime = min(int(tarinfo.mtime), epoch)
+
+    if tarinfo.issym():
+        tarinfo.mode = 0o777
+    else:
+        tarinfo.mode = normalizedMode(tarinfo.mode | (stat.S_IFDIR if tarinfo.isdir() else 0))
+
+    tarinfo.uid = 0
+    tarinfo.gid = 0
+    tarinfo.uname = ''
+    tarinfo.gname = ''
+
+def normalizeZipInfo(zinfo, path, epoch):
+    st = os.stat(path)
+    zinfo.date_time = time.gmtime(max(min(int(st.st_mtime), epoch), DEFAULT_EPOCH))[: 6]
+    zinfo.create_system = 3
+    zinfo.external_attr = (stat.S_IFMT(st.st_mode) | normalizedMode(st.st_mode)) << 16
+
+    if zinfo.is_dir():
+        zinfo.external_attr |= 0x10
+
+def compressor(fileobj, codec, level, threads, program=''):
+    info = CODECS[codec]
+
+    if program == '' and info['builtin'] is not None:
+        return BlockCompressor(fileobj,
+                               info['builtin'],
+                               level,
+                               info['blockSize'](level),
+                               threads,
+                               info['encoderMemory'](level))
+
+    path = findProgram(codec, program)
+
+    if path == '':
+        return None
+
+    return ProgramCompressor(fileobj, path, level, threads)
+
+def walkTree(path, arcname):
+    # Returns the files in the same order as tarfile.add.
+    yield path, arcname
+
+    info = DTFileIndex.entry(path)
+
+    if info is not None and info['type'] == 'dir':
+        for f, _ in DTFileIndex.listDir(path):
+            yield from walkTree(os.path.join(path, f), os.path.join(arcname, f))
+
+def readChunks(filePath):
+    with open(filePath, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+
+            if not chunk:
+                break
+
+            yield chunk
+
+def deflateChunks(chunks, level, stored):
+    # Compress the data as a raw deflate stream, returns the compressed data,
+    # the CRC and the size of the data.
+    compressor = None if stored else zlib.compressobj(level, zlib.DEFLATED, -15)
+    data = []
+    crc = 0
+    size = 0
+
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        data.append(chunk if stored else compressor.compress(chunk))
+
+    if not stored:
+        data.append(compressor.flush())
+
+    return b''.join(data), crc, size
+
+def writeZipEntry(zipFile, zinfo, future):
+    data, zinfo.CRC, zinfo.file_size = future.result()
+    zinfo.compress_size = len(data)
+
+    if zinfo.file_size > zipfile.ZIP64_LIMIT \
+        or zinfo.compress_size > zipfile.ZIP64_LIMIT:
+        raise zipfile.LargeZipFile('{} is too large'.format(zinfo.filename))
+
+    # The data is already compressed, so write the entry directly, the
+    # central directory is written by the ZipFile when closing it.
+    zinfo.header_offset = zipFile.fp.tell()
+    zipFile.fp.write(zinfo.FileHeader(False))
+    zipFile.fp.write(data)
+    zipFile.filelist.append(zinfo)
+    zipFile.NameToInfo[zinfo.filename] = zinfo
+    zipFile.start_dir = zipFile.fp.tell()
+
+def writeZipStream(zipFile, zinfo, chunks, level, stored):
+    # Compress the file chunk by chunk while writing it, the header is written
+    # again once the CRC and the sizes are known.
+    compressor = None if stored else zlib.compressobj(level, zlib.DEFLATED, -15)
+    zinfo.CRC = 0
+    zinfo.compress_size = 0
+    zinfo.file_size = 0
+    zinfo.header_offset = zipFile.fp.tell()
+    zipFile.fp.write(zinfo.FileHeader(False))
+
+    for chunk in chunks:
+        zinfo.CRC = zlib.crc32(chunk, zinfo.CRC)
+        zinfo.file_size += len(chunk)
+        data = chunk if stored else compressor.compress(chunk)
+        zinfo.compress_size += len(data)
+        zipFile.fp.write(data)
+
+    if not stored:
+        data = compressor.flush()
+        zinfo.compress_size += len(data)
+        zipFile.fp.write(data)
+
+    if zinfo.file_size > zipfile.ZIP64_LIMIT \
+        or zinfo.compress_size > zipfile.ZIP64_LIMIT:
+        raise zipfile.LargeZipFile('{} is too large'.format(zinfo.filename))
+
+    end = zipFile.fp.tell()
+    zipFile.fp.seek(zinfo.header_offset)
+    zipFile.fp.write(zinfo.FileHeader(False))
+    zipFile.fp.seek(end)
+    zipFile.filelist.append(zinfo)
+    zipFile.NameToInfo[zinfo.filename] = zinfo
+    zipFile.start_dir = end
+
+class ArchiveSink:
+    # Writes an archive in its own thread from the items sent by the reader,
+    # None marks the end of the stream.
+
+    def __init__(self, output):
+        self.output = output
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.error = None
+        self.finished = False
+        self.thread = threading.Thread(target=self.run)
+
+    def start(self):
+        self.thread.start()
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def items(self):
+        while True:
+            item = self.queue.get()
+
+            if item is None:
+                self.finished = True
+
+                break
+
+            yield item
+
+    def run(self):
+        try:
+            self.write()
+        except Exception as e:
+            self.error = e
+
+            # Keep consuming the items, so the reader doesn't get blocked.
+            if not self.finished:
+                for _ in self.items():
+                    pass
+
+    def wait(self):
+        self.thread.join()
+
+        return self.error
+
+class TarSink(ArchiveSink):
+    # Compresses the tar stream.
+
+    def write(self):
+        with open(self.output['path'], 'wb') as f:
+            writer = compressor(f,
+                                self.output['codec'],
+                                self.output['level'],
+                                self.output['threads'],
+                                self.output['program'])
+
+            if writer is None:
+                raise IOError('No compressor found for {}'.format(self.output['codec']))
+
+            try:
+                for chunk in self.items():
+                    writer.write(chunk)
+            finally:
+                writer.close()
+
+class ZipSink(ArchiveSink):
+    # Receives each file as a (path, arcname) tuple followed by the chunks of
+    # its contents, an empty chunk marks the end of the file. The small files
+    # are compressed in parallel, and all of them are written in the same
+    # order they were received.
+
+    def fileChunks(self, items):
+        for chunk in items:
+            if len(chunk) < 1:
+                break
+
+            yield chunk
+
+    def write(self):
+        threads = self.output['threads']
+        level = self.output['level']
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=threads,
+                                                     thread_name_prefix='DTCompressor')
+        pending = collections.deque()
+        items = self.items()
+
+        try:
+            with zipfile.ZipFile(self.output['path'], 'w', zipfile.ZIP_DEFLATED, False) as zipFile:
+                for path, arcname in items:
+                    zinfo = zipfile.ZipInfo.from_file(path, arcname)
+
+                    if self.output['epoch'] >= 0:
+                        normalizeZipInfo(zinfo, path, self.output['epoch'])
+
+                    # Keep a bounded number of files in memory.
+                    while len(pending) >= 2 * threads:
+                        writeZipEntry(zipFile, *pending.popleft())
+
+                    if zinfo.is_dir():
+                        for _ in self.fileChunks(items):
+                            pass
+
+                        while len(pending) > 0:
+                            writeZipEntry(zipFile, *pending.popleft())
+
+                        zipFile.writestr(zinfo, b'')
+
+                        continue
+
+                    stored = os.path.splitext(path)[1].lower() in STORED_EXTENSIONS
+                    zinfo.compress_type = \
+                        zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+
+                    if zinfo.file_size > ZIP_BUFFERED_SIZE:
+                        while len(pending) > 0:
+                            writeZipEntry(zipFile, *pending.popleft())
+
+                        writeZipStream(zipFile,
+                                       zinfo,
+                                       self.fileChunks(items),
+                                       level,
+                                       stored)
+
+                        continue
+
+                    pending.append((zinfo, pool.submit(deflateChunks,
+                                                       list(self.fileChunks(items)),
+                                                       level,
+                                                       stored)))
+
+                while len(pending) > 0:
+                    writeZipEntry(zipFile, *pending.popleft())
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+class TeeWriter:
+    # Sends the tar stream in chunks to all the sinks.
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.flush()
+
+        return len(data)
+
+    def flush(self):
+        if len(self.buffer) < 1:
+            return
+
+        chunk = bytes(self.buffer)
+        self.buffer.clear()
+
+        for sink in self.sinks:
+            sink.put(chunk)
+
+class SinkReader:
+    # Reads a file for the tar stream, sending each chunk read to the sinks
+    # too.
+
+    def __init__(self, fileobj, sinks):
+        self.fileobj = fileobj
+        self.sinks = sinks
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+
+        if data:
+            for sink in self.sinks:
+                sink.put(data)
+
+        return data
+
+def writeArchivesPass(dataDir, name, epoch, outputs):
+    for output in outputs:
+        if os.path.exists(output['path']):
+            os.remove(output['path'])
+
+    tarSinks = [TarSink(output) for output in outputs if output['codec'] != 'zip']
+    zipSinks = [ZipSink(output) for output in outputs if output['codec'] == 'zip']
+    sinks = tarSinks + zipSinks
+    error = None
+
+    for sink in sinks:
+        sink.start()
+
+    try:
+        stream = TeeWriter(tarSinks)
+
+        # Each file is read once, and the same chunks are sent to the tar
+        # stream and to the zip archives. The tar stream is only built if
+        # there is some tar archive.
+        if len(tarSinks) > 0:
+            tarStream = tarfile.open(fileobj=stream, mode='w|', copybufsize=CHUNK_SIZE)
+        else:
+            tarStream = contextlib.nullcontext()
+
+        with tarStream as tar:
+            for path, arcname in walkTree(dataDir, name):
+                # The root directory is not stored in zip files.
+                fileSinks = zipSinks if path != dataDir else []
+                dataSent = False
+
+                for sink in fileSinks:
+                    sink.put((path, arcname))
+
+                if tar is not None:
+                    tarinfo = tar.gettarinfo(path, arcname)
+
+                    if tarinfo is not None:
+                        if epoch >= 0:
+                            normalizeTarInfo(tarinfo, epoch)
+
+                        if tarinfo.isreg():
+                            with open(path, 'rb') as f:
+                                tar.addfile(tarinfo, SinkReader(f, fileSinks))
+
+                            dataSent = True
+                        else:
+                            tar.addfile(tarinfo)
+
+                # The links are stored as links in the tar archives, but the
+                # zip archives store the contents of the target.
+                if not dataSent and len(fileSinks) > 0 and os.path.isfile(path):
+                    for chunk in readChunks(path):
+                        for sink in fileSinks:
+                            sink.put(chunk)
+
+                for sink in fileSinks:
+                    sink.put(b'')
+
+        stream.flush()
+    except Exception as e:
+        error = e
+    finally:
+        for sink in sinks:
+            sink.put(None)
+
+    created = []
+
+    for sink in sinks:
+        sinkError = sink.wait() or error
+
+        if sinkError is None:
+            created.append(sink.output['path'])
+        else:
+            print('Failed to create {}: {}'.format(sink.output['path'], sinkError),
+                  file=sys.stderr)
+
+            if os.path.exists(sink.output['path']):
+                os.remove(sink.output['path'])
+
+    return created
+
+def writeArchives(dataDir, outputs):
+    # Creates the archives described in outputs walking the data directory
+    # and reading each file once, the tar stream is sent to all the tar
+    # archives at the same time, and the zip archives get the same chunks
+    # read for the tar stream.
+    # Returns the list of created archives.
+    #
+    # The files are always added sorted by name, reproducible archives also
+    # get clamped modification times and normalized owners and permissions,
+    # so the same data always produces the same archive.
+    passes = []
+
+    for output in outputs:
+        key = (output['name'], output['epoch'])
+
+        if key not in passes:
+            passes.append(key)
+
+    created = []
+
+    for name, epoch in passes:
+        created += writeArchivesPass(dataDir,
+                                     name,
+                                     epoch,
+                                     [output for output in outputs
+                                      if (output['name'], output['epoch']) == (name, epoch)])
+
+    return created
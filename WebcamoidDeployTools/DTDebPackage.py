@@ -23,8 +23,8 @@ import gzip
 import os
 import re
 import subprocess
-import tempfile
 
+from . import DTProfile
 from . import DTUtils
 
 
@@ -56,7 +56,7 @@ def createDebFile(globs,
                   installPrefix,
                   links,
                   verbose):
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with DTUtils.stagingDirectory(dataDir) as tmpdir:
         debDataDirName = os.path.splitext(os.path.basename(outPackage))[0]
         debDataDir = os.path.join(tmpdir, debDataDirName)
         prefixDir = os.path.join(debDataDir, installPrefix) if len(installPrefix) > 0 else debDataDir
@@ -64,7 +64,7 @@ def createDebFile(globs,
         if not os.path.exists(prefixDir):
             os.makedirs(prefixDir)
 
-        DTUtils.copy(dataDir, prefixDir)
+        DTUtils.stage(dataDir, prefixDir)
 
         # Create DEBIAN folder
 
@@ -113,6 +113,10 @@ def createDebFile(globs,
                                         'changelog.gz')
 
         if os.path.exists(changeLogFile):
+            # The staged file can be a hard link to the data directory.
+            if os.path.exists(outChangeLogFile):
+                os.remove(outChangeLogFile)
+
             with open(changeLogFile) as clf:
                 with gzip.open(outChangeLogFile, 'wb') as gz:
                     for line in clf:
@@ -170,14 +174,15 @@ def createDebFile(globs,
                   debDataDir,
                   outPackage]
 
-        if verbose:
-            process = subprocess.Popen(params) # nosec
-        else:
-            process = subprocess.Popen(params, # nosec
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE)
+        with DTProfile.tool(params):
+            if verbose:
+                process = subprocess.Popen(params) # nosec
+            else:
+                process = subprocess.Popen(params, # nosec
+                                           stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE)
 
-        process.communicate()
+            process.communicate()
 
         # Check with the linter
 
@@ -186,14 +191,15 @@ def createDebFile(globs,
         if len(lint) > 0:
             params = [lint, outPackage]
 
-            if verbose:
-                process = subprocess.Popen(params) # nosec
-            else:
-                process = subprocess.Popen(params, # nosec
-                                        stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE)
+            with DTProfile.tool(params):
+                if verbose:
+                    process = subprocess.Popen(params) # nosec
+                else:
+                    process = subprocess.Popen(params, # nosec
+                                            stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE)
 
-            process.communicate()
+                process.communicate()
 
         if not os.path.exists(outPackage):
             return
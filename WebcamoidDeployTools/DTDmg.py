@@ -23,7 +23,6 @@ import math
 import os
 import subprocess
 import sys
-import tempfile
 import time
 
 from . import DTUtils
@@ -50,13 +49,13 @@ def createDmg(globs,
               version,
               appIcon,
               verbose):
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with DTUtils.stagingDirectory(dataDir) as tmpdir:
         staggingDir = os.path.join(tmpdir, 'stagging')
 
         if not os.path.exists(staggingDir):
             os.makedirs(staggingDir)
 
-        DTUtils.copy(dataDir, staggingDir)
+        DTUtils.stage(dataDir, staggingDir)
         imageSize = dirSize(staggingDir)
         tmpDmg = os.path.join(tmpdir, name + '_tmp.dmg')
         volumeName = "{}-{}".format(name, version)
@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import os
+import stat
+import threading
+
+
+# Indexed trees, maps the absolute path of the root of the tree to its index.
+INDEXES = {}
+INDEXES_MUTEX = threading.Lock()
+
+def readEntry(path, st=None, followSymlinks=False):
+    if st is None:
+        st = os.stat(path, follow_symlinks=followSymlinks)
+
+    entry = {'type': 'other',
+             'size': st.st_size,
+             'mode': stat.S_IMODE(st.st_mode),
+             'target': '',
+             'stat': st}
+
+    if stat.S_ISLNK(st.st_mode):
+        entry['type'] = 'link'
+
+        try:
+            entry['target'] = os.readlink(path)
+        except:
+            pass
+    elif stat.S_ISDIR(st.st_mode):
+        entry['type'] = 'dir'
+    elif stat.S_ISREG(st.st_mode):
+        entry['type'] = 'file'
+
+    return entry
+
+def isSubPath(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+class FileIndex:
+    def __init__(self, root):
+        super().__init__()
+        self.root = os.path.abspath(root)
+        self.entries = {}
+        self.children = {}
+        self.scanned = False
+        self.dirty = set()
+        self.mutex = threading.RLock()
+
+    # The packaging formats run in other processes, only the root is sent and
+    # the tree is indexed again there if needed.
+    def __getstate__(self):
+        return {'root': self.root}
+
+    def __setstate__(self, state):
+        self.__init__(state['root'])
+
+    def contains(self, path):
+        return isSubPath(path, self.root)
+
+    def scan(self, path):
+        # Walk the tree with a single scandir per directory, the type and the
+        # stat of the files come with the directory entries. Like os.walk, the
+        # root is followed if it's a link.
+        try:
+            self.entries[path] = readEntry(path, followSymlinks=path == self.root)
+        except:
+            return
+
+        dirs = [path] if self.entries[path]['type'] == 'dir' else []
+
+        while len(dirs) > 0:
+            dirPath = dirs.pop()
+            names = set()
+
+            try:
+                with os.scandir(dirPath) as dirEntries:
+                    for dirEntry in dirEntries:
+                        try:
+                            entry = readEntry(dirEntry.path,
+                                              dirEntry.stat(follow_symlinks=False))
+                        except:
+                            continue
+
+                        names.add(dirEntry.name)
+                        self.entries[dirEntry.path] = entry
+
+                        if entry['type'] == 'dir':
+                            dirs.append(dirEntry.path)
+            except:
+                pass
+
+            self.children[dirPath] = names
+
+    def drop(self, path):
+        entry = self.entries.pop(path, None)
+
+        if entry is not None and entry['type'] == 'dir':
+            for name in self.children.pop(path, set()):
+                self.drop(os.path.join(path, name))
+
+        parent = self.children.get(os.path.dirname(path))
+
+        if parent is not None:
+            parent.discard(os.path.basename(path))
+
+    def refresh(self, path):
+        # Start from the first ancestor not in the index, the copy and move
+        # functions create the missing directories.
+        while path != self.root and not os.path.dirname(path) in self.entries:
+            path = os.path.dirname(path)
+
+        self.drop(path)
+
+        if not os.path.lexists(path):
+            return path
+
+        self.scan(path)
+
+        if path != self.root and path in self.entries:
+            parent = self.children.get(os.path.dirname(path))
+
+            if parent is not None:
+                parent.add(os.path.basename(path))
+
+        return path
+
+    def sync(self):
+        with self.mutex:
+            if not self.scanned:
+                self.entries = {}
+                self.children = {}
+                self.dirty = set()
+                self.scan(self.root)
+                self.scanned = True
+
+                return
+
+            if len(self.dirty) < 1:
+                return
+
+            refreshed = []
+
+            # Refresh the parents first, so their children are skipped.
+            for path in sorted(self.dirty, key=len):
+                if not any(isSubPath(path, p) for p in refreshed):
+                    refreshed.append(self.refresh(path))
+
+            self.dirty = set()
+
+    def update(self, path):
+        # Marks the path as modified, it's read again in the next query.
+        with self.mutex:
+            if self.scanned:
+                self.dirty.add(path)
+
+    def remove(self, path):
+        with self.mutex:
+            self.dirty.discard(path)
+            self.drop(path)
+
+    def setMode(self, path, mode):
+        with self.mutex:
+            entry = self.entries.get(path)
+
+            # chmod follows the links, so the mode of the link doesn't change.
+            if entry is not None and entry['type'] != 'link':
+                entry['mode'] = stat.S_IMODE(mode)
+
+    def invalidate(self):
+        with self.mutex:
+            self.scanned = False
+            self.entries = {}
+            self.children = {}
+            self.dirty = set()
+
+    def entry(self, path):
+        self.sync()
+
+        with self.mutex:
+            return self.entries.get(path)
+
+    def listDir(self, path):
+        # Returns the sorted names of the directory, and the entry of each
+        # one.
+        self.sync()
+
+        with self.mutex:
+            return [(name, self.entries[os.path.join(path, name)])
+                    for name in sorted(self.children.get(path, set()))
+                    if os.path.join(path, name) in self.entries]
+
+def register(path):
+    # Indexes the tree, it's walked the first time it's queried. The other
+    # trees are read from the file system on each query.
+    path = os.path.abspath(path)
+
+    with INDEXES_MUTEX:
+        for fileIndex in INDEXES.values():
+            if fileIndex.contains(path):
+                return fileIndex
+
+        # The indexes of the subdirectories are replaced by this one.
+        for root in [root for root in INDEXES if isSubPath(root, path)]:
+            del INDEXES[root]
+
+        fileIndex = FileIndex(path)
+        INDEXES[path] = fileIndex
+
+    return fileIndex
+
+def findIndex(path):
+    with INDEXES_MUTEX:
+        for fileIndex in INDEXES.values():
+            if fileIndex.contains(path):
+                return fileIndex
+
+    return None
+
+def entry(path):
+    # Returns the type, size, permissions and link target of the file, or
+    # None if it doesn't exist.
+    absPath = os.path.abspath(path)
+    fileIndex = findIndex(absPath)
+
+    if fileIndex is not None:
+        return fileIndex.entry(absPath)
+
+    try:
+        return readEntry(path)
+    except:
+        return None
+
+def listDir(path):
+    # Returns the sorted names and the entries of the files in the directory.
+    absPath = os.path.abspath(path)
+    fileIndex = findIndex(absPath)
+
+    if fileIndex is not None:
+        return fileIndex.listDir(absPath)
+
+    entries = []
+
+    try:
+        with os.scandir(path) as dirEntries:
+            for dirEntry in dirEntries:
+                try:
+                    entries.append((dirEntry.name,
+                                    readEntry(dirEntry.path,
+                                              dirEntry.stat(follow_symlinks=False))))
+                except:
+                    pass
+    except:
+        pass
+
+    return sorted(entries, key=lambda entry: entry[0])
+
+def walk(top, topdown=True):
+    # Same as os.walk, with followlinks disabled, but in the indexed trees
+    # the listing comes from the index and the names are sorted.
+    absTop = os.path.abspath(top)
+    fileIndex = findIndex(absTop)
+
+    if fileIndex is None:
+        yield from os.walk(top, topdown)
+
+        return
+
+    topEntry = fileIndex.entry(absTop)
+
+    if topEntry is None:
+        return
+
+    # The contents of the links are not indexed, but os.walk follows the
+    # top directory.
+    if topEntry['type'] == 'link':
+        if os.path.isdir(top):
+            yield from os.walk(top, topdown)
+
+        return
+
+    if topEntry['type'] != 'dir':
+        return
+
+    stack = [(top, absTop, None)]
+
+    while len(stack) > 0:
+        root, absRoot, listing = stack.pop()
+
+        if listing is not None:
+            yield listing
+
+            continue
+
+        dirs = []
+        files = []
+        subdirs = set()
+
+        for name, info in fileIndex.listDir(absRoot):
+            if info['type'] == 'dir':
+                dirs.append(name)
+                subdirs.add(name)
+            elif info['type'] == 'link' \
+                and os.path.isdir(os.path.join(absRoot, name)):
+                # os.walk lists the links to directories along with the
+                # directories.
+                dirs.append(name)
+            else:
+                files.append(name)
+
+        if topdown:
+            yield root, dirs, files
+        else:
+            stack.append((root, absRoot, (root, dirs, files)))
+
+        # The caller can remove directories from dirs to skip them.
+        for d in reversed(dirs):
+            if d in subdirs:
+                stack.append((os.path.join(root, d), os.path.join(absRoot, d), None))
+
+def files(path):
+    # Returns the path and the entry of all the files in the tree, links
+    # included.
+    for root, dirs, fs in walk(path):
+        for f in dirs + fs:
+            filePath = os.path.join(root, f)
+            info = entry(filePath)
+
+            if info is not None and info['type'] != 'dir':
+                yield filePath, info
+
+def update(path):
+    # Must be called after adding or modifying a file in an indexed tree.
+    path = os.path.abspath(path)
+    fileIndex = findIndex(path)
+
+    if fileIndex is not None:
+        fileIndex.update(path)
+
+def remove(path):
+    # Must be called after removing a file from an indexed tree.
+    path = os.path.abspath(path)
+    fileIndex = findIndex(path)
+
+    if fileIndex is not None:
+        fileIndex.remove(path)
+
+def setMode(path, mode):
+    path = os.path.abspath(path)
+    fileIndex = findIndex(path)
+
+    if fileIndex is not None:
+        fileIndex.setMode(path, mode)
+
+def invalidate(path=None):
+    # Discards the listings, the trees are walked again in the next query.
+    with INDEXES_MUTEX:
+        indexes = list(INDEXES.values())
+
+    for fileIndex in indexes:
+        if path is None or fileIndex.contains(os.path.abspath(path)):
+            fileIndex.invalidate()
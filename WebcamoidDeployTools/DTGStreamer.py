@@ -24,6 +24,7 @@ import subprocess
 import sys
 
 from . import DTBinary
+from . import DTFileIndex
 from . import DTUtils
 
 
@@ -202,6 +203,7 @@ def preRun(globs, configs, dataDir):
 
         try:
             os.chmod(outPluginScanner, 0o755)
+            DTFileIndex.setMode(outPluginScanner, 0o755)
         except:
             pass
 
@@ -142,3 +142,20 @@ def commitCountSinceLastTag(path):
         return 1;
 
     return commitCountSince(tag)
+
+def commitTime(path):
+    # Returns the time of the last commit as a Unix timestamp, or -1 if it
+    # can't be read.
+    try:
+        process = subprocess.Popen(['git', 'log', '-1', '--format=%ct'], # nosec
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE,
+                                    cwd=path)
+        stdout, _ = process.communicate()
+
+        if process.returncode != 0:
+            return -1
+
+        return int(stdout.decode(sys.getdefaultencoding()).strip())
+    except:
+        return -1
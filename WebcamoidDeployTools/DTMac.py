@@ -23,10 +23,11 @@ import os
 import subprocess
 import sys
 import threading
-import time
 
 from . import DTBinary
+from . import DTFileIndex
 from . import DTGit
+from . import DTProfile
 from . import DTSystemPackages
 from . import DTUtils
 
@@ -58,6 +59,7 @@ def copyBundle(frameworkSrcDir, frameworkDstDir):
 
     try:
         os.symlink(relCurVersionSrcPath, curVersionDstPath)
+        DTFileIndex.update(curVersionDstPath)
     except:
         pass
 
@@ -72,6 +74,7 @@ def copyBundle(frameworkSrcDir, frameworkDstDir):
 
     try:
         os.symlink(relResourcesSrcPath, resourcesDstPath)
+        DTFileIndex.update(resourcesDstPath)
     except:
         pass
 
@@ -87,7 +90,7 @@ def removeUnneededFiles(path):
     adirs = set()
     afiles = set()
 
-    for root, dirs, files in os.walk(path):
+    for root, dirs, files in DTFileIndex.walk(path):
         for d in dirs:
             if d == 'Headers':
                 adirs.add(os.path.join(root, d))
@@ -102,6 +105,8 @@ def removeUnneededFiles(path):
         except:
             pass
 
+        DTFileIndex.update(adir)
+
     for afile in afiles:
         try:
             if os.path.islink(afile):
@@ -111,9 +116,15 @@ def removeUnneededFiles(path):
         except:
             pass
 
+        DTFileIndex.update(afile)
+
 def fixLibRpath(solver, mutex, mach, binDir, libDir):
     log = '\tFixing {}\n\n'.format(mach)
     machInfo = solver.dump(mach)
+
+    if not machInfo:
+        return
+
     machDir = os.path.dirname(mach)
     machId = ''
     rpaths = []
@@ -148,15 +159,17 @@ def fixLibRpath(solver, mutex, mach, binDir, libDir):
             rpaths = [os.path.join('@executable_path',
                                    os.path.relpath(libDir, binDir))]
 
-    # Change ID
+    # Change ID, only the dylibs have one, the bundles don't.
 
-    if machId != machInfo['id']:
+    if machInfo['id'] != '' and machId != machInfo['id']:
         log += '\t\tChanging ID from {} to {}\n'.format(machInfo['id'], machId)
 
-        process = subprocess.Popen(['install_name_tool', # nosec
-                                    '-id', machId, mach],
-                                    stdout=subprocess.PIPE)
-        process.communicate()
+        params = ['install_name_tool', '-id', machId, mach]
+
+        with DTProfile.tool(params):
+            process = subprocess.Popen(params, # nosec
+                                       stdout=subprocess.PIPE)
+            process.communicate()
 
     # Change rpath
 
@@ -164,18 +177,22 @@ def fixLibRpath(solver, mutex, mach, binDir, libDir):
         log += '\t\tChanging rpaths from {} to {}\n'.format(machInfo['rpaths'], rpaths)
 
         for rpath in machInfo['rpaths']:
-            process = subprocess.Popen(['install_name_tool', # nosec
-                                        '-delete_rpath', rpath, mach],
-                                        stdout=subprocess.PIPE)
-            process.communicate()
+            params = ['install_name_tool', '-delete_rpath', rpath, mach]
+
+            with DTProfile.tool(params):
+                process = subprocess.Popen(params, # nosec
+                                           stdout=subprocess.PIPE)
+                process.communicate()
 
         for rpath in rpaths:
-            process = subprocess.Popen(['install_name_tool', # nosec
-                                        '-add_rpath', rpath, mach],
-                                        stdout=subprocess.PIPE)
-            process.communicate()
+            params = ['install_name_tool', '-add_rpath', rpath, mach]
+
+            with DTProfile.tool(params):
+                process = subprocess.Popen(params, # nosec
+                                           stdout=subprocess.PIPE)
+                process.communicate()
 
-    # Change library links
+    # Change library links, including the weak and the reexported ones.
 
     for dep in machInfo['imports']:
         ignore = False
@@ -206,10 +223,14 @@ def fixLibRpath(solver, mutex, mach, binDir, libDir):
 
         if dep != newDepPath:
             log += '\t\t{} -> {}\n'.format(dep, newDepPath)
-            process = subprocess.Popen(['install_name_tool', # nosec
-                                        '-change', dep, newDepPath, mach],
-                                        stdout=subprocess.PIPE)
-            process.communicate()
+            params = ['install_name_tool', '-change', dep, newDepPath, mach]
+
+            with DTProfile.tool(params):
+                process = subprocess.Popen(params, # nosec
+                                           stdout=subprocess.PIPE)
+                process.communicate()
+
+    DTFileIndex.update(mach)
 
     mutex.acquire()
     print(log)
@@ -217,24 +238,17 @@ def fixLibRpath(solver, mutex, mach, binDir, libDir):
 
 def fixRpaths(solver, dataDir, binDir, libDir):
     mutex = threading.Lock()
-    threads = []
+    jobs = []
 
     for mach in solver.find(dataDir):
-        thread = threading.Thread(target=fixLibRpath,
-                                  args=(solver,
-                                        mutex,
-                                        mach,
-                                        binDir,
-                                        libDir,))
-        threads.append(thread)
-
-        while threading.active_count() >= DTUtils.numThreads():
-            time.sleep(0.25)
-
-        thread.start()
+        jobs.append(DTUtils.submitJob(fixLibRpath,
+                                      solver,
+                                      mutex,
+                                      mach,
+                                      binDir,
+                                      libDir))
 
-    for thread in threads:
-        thread.join()
+    DTUtils.waitJobs(jobs)
 
 def sysInfo():
     process = subprocess.Popen(['sw_vers'], # nosec
@@ -285,9 +299,9 @@ def writeBuildInfo(globs, buildInfoFile, sourcesDir):
         packages = set()
 
         if 'dependencies' in globs:
-            for dep in globs['dependencies']:
-                packageInfo = DTSystemPackages.searchPackageFor(dep)
+            depsPackages = DTSystemPackages.searchPackagesFor(globs['dependencies'])
 
+            for packageInfo in depsPackages.values():
                 if len(packageInfo) > 0:
                     packages.add(packageInfo)
 
@@ -313,6 +327,7 @@ def signPackage(package, verbose):
                                    stderr=subprocess.PIPE)
 
     process.communicate()
+    DTFileIndex.update(package)
 
 def preRun(globs, configs, dataDir):
     targetPlatform = configs.get('Package', 'targetPlatform', fallback='').strip()
@@ -404,6 +419,7 @@ def postRun(globs, configs, dataDir):
     if writeInfo:
         print('\nWritting build system information\n')
         writeBuildInfo(globs, buildInfoFile, sourcesDir)
+        DTFileIndex.update(buildInfoFile)
 
     if signBinaries:
         print('\nSigning bundle\n')
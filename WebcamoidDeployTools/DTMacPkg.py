@@ -44,13 +44,13 @@ def createPkg(globs,
               installScripts,
               uninstallScript,
               verbose):
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with DTUtils.stagingDirectory(dataDir) as tmpdir:
         installDestDir = tmpdir
 
         if subFolder != '':
             installDestDir = os.path.join(tmpdir, subFolder)
 
-        DTUtils.copy(dataDir, installDestDir)
+        DTUtils.stage(dataDir, installDestDir)
 
         if uninstallScript != '':
             DTUtils.copy(uninstallScript, installDestDir)
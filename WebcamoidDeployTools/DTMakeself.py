@@ -22,7 +22,6 @@
 import os
 import subprocess
 import sys
-import tempfile
 
 from . import DTUtils
 
@@ -49,8 +48,8 @@ def createInstaller(globs,
                     installScriptArgs,
                     uninstallScript,
                     verbose):
-    with tempfile.TemporaryDirectory() as tmpdir:
-        DTUtils.copy(dataDir, tmpdir)
+    with DTUtils.stagingDirectory(dataDir) as tmpdir:
+        DTUtils.stage(dataDir, tmpdir)
         startupScript = ''
         params = [makeself(),
                   '--xz',
@@ -69,6 +68,10 @@ def createInstaller(globs,
             charReplacement = {'"': '\\"',
                                '`': '\\`'}
 
+            # The staged file can be a hard link to the data directory.
+            if os.path.exists(licenseOutFile):
+                os.remove(licenseOutFile)
+
             with open(licenseFile) as ifile:
                 with open(licenseOutFile, 'w') as ofile:
                     for line in ifile:
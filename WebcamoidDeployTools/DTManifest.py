@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from . import DTFileIndex
+from . import DTStore
+from . import DTUtils
+
+
+# Bump this when the layout of the manifest changes, so old manifests get
+# discarded.
+MANIFEST_VERSION = 1
+
+# The manifest of the previous run, 'copies' maps the copied paths, relative
+# to the data directory, to the source they were copied from, and 'files'
+# maps every file in the data directory to its signature at the end of the
+# deploy.
+MANIFEST = {'copies': {}, 'files': {}}
+
+# Copies requested in this run.
+COPIES = {}
+MANIFEST_FILE = ''
+DATA_DIR = ''
+MANIFEST_MUTEX = threading.Lock()
+
+# Size of the chunks read when hashing files.
+HASH_CHUNK_SIZE = 1 << 20
+
+def enabled():
+    return MANIFEST_FILE != ''
+
+def configHash(configs):
+    sha = hashlib.sha256()
+
+    for section in sorted(configs.sections()):
+        for key, value in sorted(configs.items(section, raw=True)):
+            sha.update('{}\0{}\0{}\0'.format(section, key, value).encode('utf-8'))
+
+    return sha.hexdigest()
+
+def init(configs, dataDir):
+    global MANIFEST
+    global MANIFEST_FILE
+    global DATA_DIR
+
+    incremental = configs.get('Package', 'incremental', fallback='false').strip()
+
+    if not DTUtils.toBool(incremental):
+        return
+
+    dataDir = os.path.abspath(dataDir)
+    defaultManifestFile = \
+        os.path.join(os.path.dirname(dataDir),
+                     '.{}.manifest.json'.format(os.path.basename(dataDir)))
+    manifestFile = configs.get('Package', 'manifestFile', fallback=defaultManifestFile).strip()
+    manifestFile = os.path.abspath(os.path.expanduser(manifestFile))
+
+    with MANIFEST_MUTEX:
+        MANIFEST_FILE = manifestFile
+        DATA_DIR = dataDir
+        MANIFEST = {'copies': {}, 'files': {}}
+        COPIES.clear()
+
+        try:
+            with open(manifestFile) as f:
+                manifest = json.load(f)
+        except:
+            return
+
+        # Any change in the settings can change the result of the deploy, so
+        # start from scratch.
+        if manifest.get('version', 0) != MANIFEST_VERSION \
+            or manifest.get('configs', '') != configHash(configs):
+            return
+
+        MANIFEST = {'copies': manifest.get('copies', {}),
+                    'files': manifest.get('files', {})}
+
+def relativePath(path):
+    return os.path.relpath(os.path.abspath(path), DATA_DIR)
+
+def fileSignature(path, followSymlinks=True):
+    try:
+        st = os.stat(path, follow_symlinks=followSymlinks)
+    except:
+        return None
+
+    return [st.st_size, st.st_mtime_ns]
+
+def fileHash(path):
+    sha = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(HASH_CHUNK_SIZE)
+
+            if not data:
+                break
+
+            sha.update(data)
+
+    return sha.hexdigest()
+
+def treeHash(path):
+    # Hash of the listing of the directory, any added, removed or modified
+    # file changes it.
+    sha = hashlib.sha256()
+
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+
+        for f in sorted(files + [d for d in dirs if os.path.islink(os.path.join(root, d))]):
+            filePath = os.path.join(root, f)
+            signature = fileSignature(filePath, False)
+            sha.update('{}\0{}\0'.format(os.path.relpath(filePath, path),
+                                         signature).encode('utf-8'))
+
+    return sha.hexdigest()
+
+def sourceRecord(src):
+    if os.path.isdir(src):
+        return {'source': src, 'signature': None, 'hash': treeHash(src)}
+
+    return {'source': src,
+            'signature': fileSignature(src),
+            'hash': fileHash(src)}
+
+def isSourceUnchanged(src, record):
+    if record.get('source') != src:
+        return False
+
+    if os.path.isdir(src):
+        return treeHash(src) == record.get('hash')
+
+    signature = fileSignature(src)
+
+    if signature is None or record.get('signature') is None:
+        return False
+
+    if signature == record['signature']:
+        return True
+
+    # The file was touched, check if the contents changed.
+    return signature[0] == record['signature'][0] \
+        and fileHash(src) == record.get('hash')
+
+def isOutputUnchanged(dst):
+    # Check that the copied files are in the same state they were at the end
+    # of the previous run.
+    files = MANIFEST['files']
+
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        prefix = relativePath(dst) + os.sep
+        recorded = {f for f in files if f.startswith(prefix)}
+        found = set()
+
+        for root, dirs, fs in os.walk(dst):
+            for f in fs + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+                filePath = os.path.join(root, f)
+                relPath = relativePath(filePath)
+
+                if files.get(relPath) != fileSignature(filePath, False):
+                    return False
+
+                found.add(relPath)
+
+        return found == recorded
+
+    return os.path.exists(dst) \
+        and files.get(relativePath(dst)) == fileSignature(dst, False)
+
+def removePath(path):
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        elif os.path.lexists(path):
+            os.remove(path)
+    except:
+        pass
+
+    DTFileIndex.update(path)
+
+def copy(src, dst, copyReals=False, overwrite=True, rootPath=''):
+    # Same as DTStore.copy, but in incremental mode the copy is skipped if
+    # neither the source nor the copied files changed since the last run.
+    if not enabled():
+        return DTStore.copy(src, dst, copyReals, overwrite, rootPath)
+
+    dstPath = dst
+
+    if os.path.isdir(dst) and os.path.isfile(DTUtils.realPath(src)):
+        dstPath = os.path.join(dst, os.path.basename(src))
+
+    key = relativePath(dstPath)
+    previous = MANIFEST['copies'].get(key)
+
+    if previous is not None:
+        if isSourceUnchanged(src, previous) and isOutputUnchanged(dstPath):
+            with MANIFEST_MUTEX:
+                COPIES[key] = previous
+
+            return True
+
+        # Remove the old copy, so no stale files are left behind.
+        removePath(dstPath)
+
+    record = sourceRecord(src)
+
+    if not DTStore.copy(src, dst, copyReals, overwrite, rootPath):
+        return False
+
+    with MANIFEST_MUTEX:
+        COPIES[key] = record
+
+    return True
+
+def isChanged(path):
+    # Returns True if the file was modified since the end of the last run,
+    # all files are considered modified if not in incremental mode.
+    if not enabled() or len(MANIFEST['files']) < 1:
+        return True
+
+    return MANIFEST['files'].get(relativePath(path)) != fileSignature(path, False)
+
+def changedFiles(paths):
+    return [path for path in paths if isChanged(path)]
+
+def save(configs):
+    # Removes the files copied in the previous run that were not needed in
+    # this run, and writes the current state of the data directory.
+    if not enabled():
+        return
+
+    with MANIFEST_MUTEX:
+        for key in MANIFEST['copies']:
+            if not key in COPIES \
+                and not os.path.isabs(key) \
+                and not key.startswith(os.pardir):
+                print('    Removing stale {}'.format(key))
+                removePath(os.path.join(DATA_DIR, key))
+
+        files = {}
+
+        for filePath, info in DTFileIndex.files(DATA_DIR):
+            files[relativePath(filePath)] = [info['size'],
+                                             info['stat'].st_mtime_ns]
+
+        manifestDir = os.path.dirname(MANIFEST_FILE)
+
+        try:
+            if not os.path.exists(manifestDir):
+                os.makedirs(manifestDir)
+
+            tmpFile = MANIFEST_FILE + '.tmp'
+
+            with open(tmpFile, 'w') as f:
+                json.dump({'version': MANIFEST_VERSION,
+                           'configs': configHash(configs),
+                           'copies': COPIES,
+                           'files': files}, f)
+
+            os.replace(tmpFile, MANIFEST_FILE)
+            DTFileIndex.update(MANIFEST_FILE)
+        except:
+            pass
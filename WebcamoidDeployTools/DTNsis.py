@@ -26,6 +26,8 @@ import subprocess
 import tempfile
 import time
 
+from . import DTFileIndex
+from . import DTProfile
 from . import DTUtils
 
 
@@ -381,7 +383,7 @@ def createInstaller(globs,
             f.write('!insertmacro INSTALL_SCRIPT_BEFORE_INSTALL\n')
             f.write('!endif\n')
 
-            for root, dirs, files in os.walk(dataDir):
+            for root, dirs, files in DTFileIndex.walk(dataDir):
                 outPath = ''
 
                 if root == dataDir:
@@ -521,7 +523,7 @@ def createInstaller(globs,
             f.write('!insertmacro INSTALL_SCRIPT_UNINSTALL\n')
             f.write('!endif\n')
 
-            for root, dirs, files in os.walk(dataDir, topdown=False):
+            for root, dirs, files in DTFileIndex.walk(dataDir, topdown=False):
                 for fil in files:
                     filpath = os.path.join(root, fil)
                     relpath = os.path.relpath(filpath, dataDir)
@@ -590,14 +592,15 @@ def createInstaller(globs,
 
         process = None
 
-        if verbose:
-            process = subprocess.Popen(params) # nosec
-        else:
-            process = subprocess.Popen(params, # nosec
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE)
+        with DTProfile.tool(params):
+            if verbose:
+                process = subprocess.Popen(params) # nosec
+            else:
+                process = subprocess.Popen(params, # nosec
+                                           stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE)
 
-        process.communicate()
+            process.communicate()
 
         if not os.path.exists(outPackage):
             return
@@ -21,14 +21,14 @@
 
 import glob
 import os
-import subprocess
 
 from . import DTBinary
+from . import DTPatchElf
 from . import DTUtils
 
 
 def patchelf():
-    return DTUtils.whereBin('patchelf')
+    return DTPatchElf.patchelf()
 
 def dependsOnOpenSSL(solver, dataDir):
     for dep in solver.scanDependencies(dataDir):
@@ -55,21 +55,7 @@ def renameLibraries(solver, mainExecutable, packageLibDir, androidOpensslSuffix,
 
         print('    {} -> {}'.format(libPath, dst))
         DTUtils.copy(libPath, dst)
-
-        if len(patchelfCmd) > 0:
-            params = [patchelfCmd,
-                      '--set-soname', dstbn,
-                      dst]
-
-            if verbose:
-                process = subprocess.Popen(params) # nosec
-            else:
-                process = subprocess.Popen(params, # nosec
-                                            stdout=subprocess.PIPE,
-                                            stderr=subprocess.PIPE)
-
-            process.communicate()
-
+        DTPatchElf.patch(dst, soname=dstbn, verbose=verbose)
         solver.strip(dst)
 
 def fixDependencies(solver, packageLibDir, androidOpensslSuffix, verbose):
@@ -82,25 +68,21 @@ def fixDependencies(solver, packageLibDir, androidOpensslSuffix, verbose):
 
     for lib in glob.glob('*.so', root_dir=packageLibDir):
         libPath = os.path.join(packageLibDir, lib)
+        replaceNeeded = {}
 
         for dep in solver.dependencies(libPath):
             for sslDep in sslLibs:
                 fullSslDep = 'lib{}.so'.format(sslDep)
 
                 if os.path.basename(dep) == fullSslDep:
-                    print('    Patching {}'.format(libPath))
-                    params = [patchelfCmd,
-                              '--replace-needed', fullSslDep, 'lib{}{}.so'.format(sslDep, androidOpensslSuffix),
-                              libPath]
-
-                    if verbose:
-                        process = subprocess.Popen(params) # nosec
-                    else:
-                        process = subprocess.Popen(params, # nosec
-                                                stdout=subprocess.PIPE,
-                                                stderr=subprocess.PIPE)
-
-                    process.communicate()
+                    replaceNeeded[fullSslDep] = 'lib{}{}.so'.format(sslDep, androidOpensslSuffix)
+
+        # Replace all the dependencies at once.
+        if len(replaceNeeded) > 0:
+            print('    Patching {}'.format(libPath))
+            DTPatchElf.patch(libPath,
+                             replaceNeeded=replaceNeeded,
+                             verbose=verbose)
 
 def preRun(globs, configs, dataDir):
     pass
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import concurrent.futures
+import importlib
+import sys
+import threading
+import time
+import traceback
+
+from . import DTCompression
+from . import DTProfile
+from . import DTUtils
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def formatModule(format):
+    return importlib.import_module('WebcamoidDeployTools.DT' + format)
+
+def isCpuBound(mod):
+    # Formats that compress the data in Python are serialized by the GIL, so
+    # they are run in their own process.
+    return mod.cpuBound() if hasattr(mod, 'cpuBound') else False
+
+def isArchive(mod):
+    # Archive formats can be created with a single pass over the data.
+    return hasattr(mod, 'archive')
+
+def estimateCost(mod, dataSize):
+    weight = mod.packagingCost() if hasattr(mod, 'packagingCost') else 1
+
+    return dataSize * weight
+
+def coresBudget(configs):
+    cores = configs.get('Package', 'packagingCores', fallback='0').strip()
+
+    try:
+        cores = int(cores)
+    except:
+        cores = 0
+
+    return cores if cores > 0 else DTUtils.numThreads()
+
+def splitBudget(costs, budget):
+    # Divide the cores among the formats proportionally to their cost, every
+    # format gets at least one core. The cores left after giving one to each
+    # format are shared with the largest remainder method, so the total only
+    # goes over the budget if there are more formats than cores.
+    totalCost = sum(costs.values())
+
+    if totalCost < 1:
+        costs = {format: 1 for format in costs}
+        totalCost = len(costs)
+
+    cores = {format: 1 for format in costs}
+    spare = budget - len(costs)
+
+    if spare < 1:
+        return cores
+
+    remainders = {}
+
+    for format, cost in costs.items():
+        share = spare * cost / totalCost
+        cores[format] += int(share)
+        remainders[format] = share - int(share)
+
+    left = budget - sum(cores.values())
+
+    for format in sorted(remainders, key=lambda f: remainders[f], reverse=True)[: left]:
+        cores[format] += 1
+
+    return cores
+
+def peakMemory():
+    # Returns the peak resident memory of the process and its children in
+    # bytes, or -1 if it can't be known.
+    if resource is None:
+        return -1
+
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    # ru_maxrss is given in KiB in Linux and in bytes in Mac.
+    if sys.platform.startswith('darwin'):
+        return peak
+
+    return 1024 * peak
+
+def runFormat(format, globs, configs, dataDir, outputDir, nthreads, profile):
+    # Runs the format in a worker process and returns the created packages
+    # and the stats of the job.
+    DTUtils.setNumThreads(nthreads)
+
+    if profile:
+        DTProfile.enable()
+
+    start = time.monotonic()
+    formatGlobs = dict(globs)
+    formatGlobs['outputPackages'] = []
+
+    with DTProfile.span(format, 'package', cores=nthreads):
+        formatModule(format).run(formatGlobs,
+                                 configs,
+                                 dataDir,
+                                 outputDir,
+                                 threading.Lock())
+
+    return {format: {'packages': formatGlobs['outputPackages'],
+                     'time': time.monotonic() - start,
+                     'memory': peakMemory(),
+                     'spans': DTProfile.collect()}}
+
+def runArchives(formats, configs, dataDir, outputDir, cores, profile):
+    # Creates all the archive formats in a worker process reading the data
+    # once, and returns the created packages and the stats of the job.
+    if profile:
+        DTProfile.enable()
+
+    start = time.monotonic()
+    outputs = {}
+
+    # Each archive takes the cores of its format as the default number of
+    # threads of its sink, and the shared pass gets the cores of all of them.
+    for format in formats:
+        DTUtils.setNumThreads(cores[format])
+        outputs[format] = formatModule(format).archive(configs, outputDir)
+
+    totalCores = sum(cores[format] for format in formats)
+    DTUtils.setNumThreads(totalCores)
+
+    with DTProfile.span(', '.join(formats), 'package', cores=totalCores):
+        created = DTCompression.writeArchives(dataDir, list(outputs.values()))
+
+    elapsed = time.monotonic() - start
+    memory = peakMemory()
+    stats = {format: {'packages': [output['path']] if output['path'] in created else [],
+                      'time': elapsed,
+                      'memory': memory,
+                      'spans': []} for format, output in outputs.items()}
+
+    # The job is shared by all the formats, report the spans just once.
+    stats[formats[0]]['spans'] = DTProfile.collect()
+
+    return stats
+
+def processPool(workers):
+    try:
+        # Use a fresh process for each format, so the peak memory is not
+        # shared between formats.
+        return concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                      max_tasks_per_child=1)
+    except TypeError:
+        return concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+def run(globs, configs, formats, dataDir, outputDir):
+    # Run the packaging formats in parallel. Returns the stats of each
+    # format.
+    dataSize = DTUtils.pathSize(dataDir)
+    budget = coresBudget(configs)
+    modules = {format: formatModule(format) for format in formats}
+    costs = {format: estimateCost(mod, dataSize)
+             for format, mod in modules.items()}
+    cores = splitBudget(costs, budget)
+    cpuFormats = sorted([format for format in formats if isCpuBound(modules[format])],
+                        key=lambda format: costs[format],
+                        reverse=True)
+    stats = {format: {'packages': [],
+                      'time': 0.0,
+                      'memory': -1,
+                      'cores': cores[format]} for format in formats}
+    mutex = threading.Lock()
+    futures = {}
+    pool = None
+
+    if len(cpuFormats) > 0:
+        # All the archive formats are created in the same job.
+        archives = [format for format in cpuFormats if isArchive(modules[format])]
+        jobs = [[format] for format in cpuFormats if not format in archives]
+
+        if len(archives) > 0:
+            jobs.insert(0, archives)
+
+        try:
+            pool = processPool(min(len(jobs), budget))
+
+            for job in jobs:
+                if len(job) > 1 or isArchive(modules[job[0]]):
+                    future = pool.submit(runArchives,
+                                         job,
+                                         configs,
+                                         dataDir,
+                                         outputDir,
+                                         cores,
+                                         DTProfile.enabled())
+                else:
+                    future = pool.submit(runFormat,
+                                         job[0],
+                                         globs,
+                                         configs,
+                                         dataDir,
+                                         outputDir,
+                                         cores[job[0]],
+                                         DTProfile.enabled())
+
+                for format in job:
+                    futures[format] = future
+        except Exception as e:
+            print('Can\'t start the packaging processes: {}'.format(e),
+                  file=sys.stderr)
+            futures = {}
+
+    def runThread(format):
+        start = time.monotonic()
+
+        try:
+            with DTProfile.span(format, 'package', cores=cores[format]):
+                modules[format].run(globs, configs, dataDir, outputDir, mutex)
+        except:
+            traceback.print_exc()
+
+        stats[format]['time'] = time.monotonic() - start
+
+    threads = []
+
+    for format in formats:
+        if format in futures:
+            continue
+
+        threads.append(threading.Thread(target=runThread, args=(format,)))
+
+    for thread in threads:
+        thread.start()
+
+    for format, future in futures.items():
+        try:
+            result = future.result()[format]
+            DTProfile.merge(result.pop('spans', []))
+            stats[format].update(result)
+        except Exception as e:
+            print('{} packaging failed: {}'.format(format, e), file=sys.stderr)
+
+    if pool is not None:
+        pool.shutdown()
+
+    for thread in threads:
+        thread.join()
+
+    for format in futures:
+        if len(stats[format]['packages']) > 0:
+            if not 'outputPackages' in globs:
+                globs['outputPackages'] = []
+
+            globs['outputPackages'] += stats[format]['packages']
+
+    return stats
+
+def printStats(stats):
+    print('Packaging stats:')
+
+    for format in sorted(stats, key=lambda format: stats[format]['time'], reverse=True):
+        formatStats = stats[format]
+        memory = formatStats['memory']
+        memory = DTUtils.hrSize(memory) if memory >= 0 else 'shared'
+        print('    {}: {:.2f} s, peak memory: {}, cores: {}'.format(format,
+                                                                    formatStats['time'],
+                                                                    memory,
+                                                                    formatStats['cores']))
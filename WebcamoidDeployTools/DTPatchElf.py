@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import subprocess # nosec
+
+from . import DTBinaryElf
+from . import DTFileIndex
+from . import DTProfile
+from . import DTUtils
+
+
+def patchelf():
+    return DTUtils.whereBin('patchelf')
+
+def hasRpath(elfInfo, rpath):
+    # patchelf --set-rpath writes a DT_RUNPATH entry, so an already patched
+    # file has the rpath there, older binaries may still have it as DT_RPATH.
+    if len(elfInfo['runpath']) > 0:
+        return elfInfo['runpath'] == {rpath}
+
+    return elfInfo['rpath'] == {rpath}
+
+def pendingEdits(elf, rpath=None, soname=None, replaceNeeded=None):
+    # Returns the edits that are not applied yet to the file, as a list of
+    # patchelf parameters.
+    elfInfo = DTBinaryElf.dump(elf)
+
+    if not elfInfo:
+        return []
+
+    edits = []
+
+    if rpath is not None and not hasRpath(elfInfo, rpath):
+        edits += ['--set-rpath', rpath]
+
+    if soname is not None and elfInfo.get('soname', '') != soname:
+        edits += ['--set-soname', soname]
+
+    if replaceNeeded:
+        for lib in sorted(replaceNeeded):
+            if lib in elfInfo['imports'] and replaceNeeded[lib] != lib:
+                edits += ['--replace-needed', lib, replaceNeeded[lib]]
+
+    return edits
+
+def patch(elf, rpath=None, soname=None, replaceNeeded=None, verbose=False):
+    # Apply all the requested edits to the file with a single patchelf call.
+    # Returns the list of applied edits.
+    edits = pendingEdits(elf, rpath, soname, replaceNeeded)
+
+    if len(edits) < 1:
+        return []
+
+    applied = []
+
+    # Try rewriting the rpath in place first, patchelf is only needed when
+    # the new rpath doesn't fit in the string table.
+    if edits[0] == '--set-rpath' and DTBinaryElf.setRpath(elf, edits[1]):
+        applied = edits[: 2]
+        edits = edits[2:]
+        DTFileIndex.update(elf)
+
+        if len(edits) < 1:
+            return applied
+
+    patchelfCmd = patchelf()
+
+    if len(patchelfCmd) < 1:
+        return applied
+
+    params = [patchelfCmd] + edits + [elf]
+
+    with DTProfile.tool(params):
+        if verbose:
+            process = subprocess.Popen(params) # nosec
+        else:
+            process = subprocess.Popen(params, # nosec
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+
+        process.communicate()
+
+    DTFileIndex.update(elf)
+
+    if process.returncode != 0:
+        return applied
+
+    return applied + edits
@@ -21,12 +21,14 @@
 
 import os
 import platform
-import subprocess
 import threading
-import time
 
 from . import DTBinary
+from . import DTFileIndex
 from . import DTGit
+from . import DTPatchElf
+from . import DTProfile
+from . import DTStore
 from . import DTSystemPackages
 from . import DTUtils
 
@@ -34,6 +36,10 @@ from . import DTUtils
 def fixLibRpath(solver, mutex, elf, dataDir, libDir):
     log = '\tFixing {}\n\n'.format(elf)
     elfInfo = solver.dump(elf)
+
+    if not elfInfo:
+        return
+
     elfDir = os.path.dirname(elf)
     rpath = ''
 
@@ -45,44 +51,37 @@ def fixLibRpath(solver, mutex, elf, dataDir, libDir):
 
     # Change rpath
 
-    if rpath != '' and not rpath in elfInfo['rpath']:
-        log += '\t\tChanging rpaths from {} to {}\n'.format(elfInfo['rpath'], rpath)
+    if rpath != '' and not DTPatchElf.hasRpath(elfInfo, rpath):
+        oldRpaths = elfInfo['runpath'] if len(elfInfo['runpath']) > 0 else elfInfo['rpath']
 
         # Set our rpath
-        process = subprocess.Popen(['patchelf', # nosec
-                                    '--set-rpath', rpath, elf],
-                                    stdout=subprocess.PIPE)
-        process.communicate()
+        if len(DTPatchElf.patch(elf, rpath=rpath)) > 0:
+            log += '\t\tChanging rpaths from {} to {}\n'.format(oldRpaths, rpath)
+        else:
+            log += '\t\tCan\'t change rpaths from {} to {}\n'.format(oldRpaths, rpath)
+            DTStore.discard(elf)
 
     mutex.acquire()
     print(log)
     mutex.release()
 
 def fixRpaths(solver, dataDir, libDir):
-    if DTUtils.whereBin('patchelf') == '':
-        print('patchelf not found')
-
-        return
+    if DTPatchElf.patchelf() == '':
+        print('patchelf not found, only rpaths that fit in place will be fixed')
 
     mutex = threading.Lock()
-    threads = []
-
-    for elf in solver.find(dataDir):
-        thread = threading.Thread(target=fixLibRpath,
-                                  args=(solver,
-                                        mutex,
-                                        elf,
-                                        dataDir,
-                                        libDir,))
-        threads.append(thread)
+    jobs = []
 
-        while threading.active_count() >= DTUtils.numThreads():
-            time.sleep(0.25)
+    with DTProfile.span('Fix rpaths', path=dataDir):
+        for elf in solver.pendingBinaries(dataDir):
+            jobs.append(DTUtils.submitJob(fixLibRpath,
+                                          solver,
+                                          mutex,
+                                          elf,
+                                          dataDir,
+                                          libDir))
 
-        thread.start()
-
-    for thread in threads:
-        thread.join()
+        DTUtils.waitJobs(jobs)
 
 def sysInfo():
     info = ''
@@ -140,9 +139,9 @@ def writeBuildInfo(globs, buildInfoFile, sourcesDir):
         packages = set()
 
         if 'dependencies' in globs:
-            for dep in globs['dependencies']:
-                packageInfo = DTSystemPackages.searchPackageFor(dep)
+            depsPackages = DTSystemPackages.searchPackagesFor(globs['dependencies'])
 
+            for packageInfo in depsPackages.values():
                 if len(packageInfo) > 0:
                     packages.add(packageInfo)
 
@@ -180,8 +179,11 @@ def createLauncher(globs, mainExecutable, dataDir, libDir, runFixRpaths):
 
         launcher.write('{} "$@"\n'.format(programName))
 
+    DTFileIndex.update(launcherScript)
     os.chmod(mainExecutable, 0o755)
+    DTFileIndex.setMode(mainExecutable, 0o755)
     os.chmod(launcherScript, 0o755)
+    DTFileIndex.setMode(launcherScript, 0o755)
 
 def preRun(globs, configs, dataDir):
     targetPlatform = configs.get('Package', 'targetPlatform', fallback='').strip()
@@ -256,6 +258,8 @@ def preRun(globs, configs, dataDir):
         fixRpaths(solver, dataDir, libDir)
         print()
 
+    DTStore.commit()
+
 def postRun(globs, configs, dataDir):
     sourcesDir = configs.get('Package', 'sourcesDir', fallback='.').strip()
     mainExecutable = configs.get('Package', 'mainExecutable', fallback='').strip()
@@ -283,3 +287,4 @@ def postRun(globs, configs, dataDir):
         print('Writting build system information')
         print()
         writeBuildInfo(globs, buildInfoFile, sourcesDir)
+        DTFileIndex.update(buildInfoFile)
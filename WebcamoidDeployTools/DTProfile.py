@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+PROFILE_VERSION = 1
+ENABLED = False
+AUDIT_HOOK_INSTALLED = False
+SPANS = []
+SPANS_MUTEX = threading.Lock()
+SPAN_IDS = itertools.count()
+SUBPROCESSES = 0
+SUBPROCESSES_MUTEX = threading.Lock()
+
+# Spans open in the current context, the jobs sent to the thread pool run in
+# a copy of the context of the caller, so their spans are nested inside the
+# caller's span.
+SPAN_STACK = contextvars.ContextVar('SPAN_STACK', default=())
+
+# Audit events raised when starting an external program.
+SUBPROCESS_EVENTS = {'subprocess.Popen', 'os.system', 'os.posix_spawn', 'os.spawn'}
+
+def enabled():
+    return ENABLED
+
+def enable():
+    global ENABLED
+    global AUDIT_HOOK_INSTALLED
+
+    ENABLED = True
+
+    # Count the programs started from any module, the hooks can't be removed,
+    # so it's only installed when profiling.
+    if not AUDIT_HOOK_INSTALLED and hasattr(sys, 'addaudithook'):
+        sys.addaudithook(auditHook)
+        AUDIT_HOOK_INSTALLED = True
+
+def auditHook(event, args):
+    global SUBPROCESSES
+
+    if ENABLED and event in SUBPROCESS_EVENTS:
+        with SUBPROCESSES_MUTEX:
+            SUBPROCESSES += 1
+
+def subprocesses():
+    with SUBPROCESSES_MUTEX:
+        return SUBPROCESSES
+
+def ioCounters():
+    # Bytes read and written by the process, including pipes and the page
+    # cache. Only available in Linux.
+    read = 0
+    written = 0
+
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+
+                if key == 'rchar':
+                    read = int(value)
+                elif key == 'wchar':
+                    written = int(value)
+    except:
+        pass
+
+    return read, written
+
+def childrenCpuTime():
+    if resource is None:
+        return 0.0
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return usage.ru_utime + usage.ru_stime
+
+def spanStack():
+    return SPAN_STACK.get()
+
+class Span:
+    def __init__(self, name, category, args):
+        super().__init__()
+        self.name = name
+        self.category = category
+        self.args = args
+        self.active = False
+
+    def __enter__(self):
+        if not ENABLED:
+            return self
+
+        stack = spanStack()
+        self.active = True
+        self.id = '{}:{}'.format(os.getpid(), next(SPAN_IDS))
+        self.parent = stack[-1].id if len(stack) > 0 else ''
+        self.depth = len(stack)
+        self.timestamp = time.time_ns() // 1000
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        self.processCpu = time.process_time()
+        self.childrenCpu = childrenCpuTime()
+        self.subprocesses = subprocesses()
+        self.read, self.written = ioCounters()
+        SPAN_STACK.set(stack + (self,))
+
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if not self.active:
+            return False
+
+        read, written = ioCounters()
+        stack = spanStack()
+
+        if len(stack) > 0 and stack[-1] is self:
+            SPAN_STACK.set(stack[: -1])
+
+        span = {'id': self.id,
+                'parent': self.parent,
+                'depth': self.depth,
+                'name': self.name,
+                'category': self.category,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'thread': threading.current_thread().name,
+                'start': self.timestamp,
+                'wall': time.perf_counter() - self.wall,
+                'cpu': time.thread_time() - self.cpu,
+                'processCpu': time.process_time() - self.processCpu,
+                'childrenCpu': childrenCpuTime() - self.childrenCpu,
+                'subprocesses': subprocesses() - self.subprocesses,
+                'readBytes': read - self.read,
+                'writtenBytes': written - self.written,
+                'failed': excType is not None,
+                'args': {key: str(value) for key, value in self.args.items()}}
+
+        with SPANS_MUTEX:
+            SPANS.append(span)
+
+        return False
+
+def span(name, category='phase', **args):
+    # Measures the block inside a 'with' statement. The CPU time is the one
+    # used by the current thread, while the subprocesses, the CPU time of the
+    # subprocesses and the I/O are counted for the whole process.
+    return Span(name, category, args)
+
+def tool(params, **args):
+    # Span for an external program.
+    name = os.path.basename(params[0]) if len(params) > 0 else ''
+
+    return Span(name, 'tool', dict(args, command=' '.join(params)))
+
+def collect():
+    with SPANS_MUTEX:
+        return list(SPANS)
+
+def merge(spans):
+    # Adds the spans collected in a worker process.
+    with SPANS_MUTEX:
+        SPANS.extend(spans)
+
+def writeReport(path):
+    spans = sorted(collect(), key=lambda span: span['start'])
+    report = {'version': PROFILE_VERSION,
+              'pid': os.getpid(),
+              'spans': spans}
+
+    try:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=4)
+    except:
+        return False
+
+    return True
+
+def writeTrace(path):
+    # Writes the spans in the Chrome trace event format, which can be opened
+    # with chrome://tracing or Perfetto.
+    spans = sorted(collect(), key=lambda span: span['start'])
+    events = []
+    threads = set()
+
+    for span in spans:
+        if not (span['pid'], span['tid']) in threads:
+            threads.add((span['pid'], span['tid']))
+            events.append({'name': 'thread_name',
+                           'ph': 'M',
+                           'pid': span['pid'],
+                           'tid': span['tid'],
+                           'args': {'name': span['thread']}})
+
+        args = dict(span['args'])
+
+        for key in ['cpu',
+                    'processCpu',
+                    'childrenCpu',
+                    'subprocesses',
+                    'readBytes',
+                    'writtenBytes',
+                    'failed']:
+            args[key] = span[key]
+
+        events.append({'name': span['name'],
+                       'cat': span['category'],
+                       'ph': 'X',
+                       'ts': span['start'],
+                       'dur': round(1e6 * span['wall']),
+                       'pid': span['pid'],
+                       'tid': span['tid'],
+                       'args': args})
+
+    try:
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    except:
+        return False
+
+    return True
@@ -32,6 +32,8 @@ import xml.etree.ElementTree as ET
 
 from . import DTAndroid
 from . import DTBinary
+from . import DTFileIndex
+from . import DTManifest
 from . import DTMac
 from . import DTUtils
 
@@ -171,8 +173,9 @@ def fixLibsXml(globs, targetArch, dataDir, qtVersion):
                 outFile.write(line)
 
     os.remove(libsXml)
+    DTFileIndex.remove(libsXml)
     libsXml = os.path.join(dataDir, 'res', 'values', 'libs-{}.xml'.format(targetArch))
-    shutil.move(libsXmlTemp, libsXml)
+    DTUtils.move(libsXmlTemp, libsXml)
 
 def readXmlLibs(libsXml):
     tree = ET.parse(libsXml)
@@ -252,9 +255,12 @@ def mergeXmlLibs(libsXmlDir, qtVersion, keep=False):
 
         outFile.write('</resources>\n')
 
+    DTFileIndex.update(os.path.join(libsXmlDir, 'libs.xml'))
+
     for f in deleteFiles:
         try:
             os.remove(f)
+            DTFileIndex.remove(f)
         except:
             pass
 
@@ -329,6 +335,7 @@ def copyAndroidTemplates(dataDir,
         f.write('qtAndroidDir={}\n'.format(javaDir))
         f.write('legacyPackaging=true\n')
 
+    DTFileIndex.update(properties)
     buildGradle = os.path.join(dataDir, 'build.gradle')
 
     if os.path.exists(buildGradle):
@@ -477,6 +484,8 @@ def copyAndroidTemplates(dataDir,
                     f.write('    }\n')
                     f.write('\n')
 
+        DTFileIndex.update(buildGradle)
+
 def solvedepsAndroid(globs,
                      dataDir,
                      libDir,
@@ -623,7 +632,7 @@ def solvedepsAndroid(globs,
                     permissionsWritten = True
 
     os.remove(manifest)
-    shutil.move(manifestTemp, manifest)
+    DTUtils.move(manifestTemp, manifest)
 
     if minSdkVersion >= 30:
         tree = ET.parse(manifest)
@@ -636,6 +645,7 @@ def solvedepsAndroid(globs,
             application.set('requestLegacyExternalStorage', 'true')
             application.set('allowNativeHeapPointerTagging', 'false')
             tree.write(manifest)
+            DTFileIndex.update(manifest)
 
 def createRccBundle(outputAssetsDir, verbose):
     outputAssetsDir = os.path.join(outputAssetsDir, 'android_rcc_bundle')
@@ -682,6 +692,8 @@ def createRccBundle(outputAssetsDir, verbose):
     process.communicate()
 
     shutil.rmtree(outputAssetsDir, True)
+    DTFileIndex.update(outputAssetsDir)
+    DTFileIndex.update(outputAssetsDir + '.rcc')
 
 def fixQtLibs(globs, libDir, outputQtPluginsDir, outputAssetsDir):
     if not 'bundledInLib' in globs:
@@ -712,6 +724,8 @@ def fixQtLibs(globs, libDir, outputQtPluginsDir, outputAssetsDir):
     except:
         pass
 
+    DTFileIndex.update(outputQtPluginsDir)
+
 def qmakeQuery(var='', qmakeExecutable='qmake'):
     try:
         args = [qmakeExecutable, '-query']
@@ -781,7 +795,7 @@ def listQmlFiles(path):
         if baseName == 'qmldir' or path.endswith('.qml'):
             qmlFiles.add(path)
     else:
-        for root, _, files in os.walk(path):
+        for root, _, files in DTFileIndex.walk(path):
             for f in files:
                 if f == 'qmldir' or f.endswith('.qml'):
                     qmlFiles.add(os.path.join(root, f))
@@ -815,7 +829,7 @@ def solvedepsQml(globs,
 
         if os.path.exists(sysModulePath):
             print('    {} -> {}'.format(sysModulePath, installModulePath))
-            DTUtils.copy(sysModulePath, installModulePath)
+            DTManifest.copy(sysModulePath, installModulePath)
             solvedImports.add(imp)
             globs['dependencies'].add(os.path.join(sysModulePath, 'qmldir'))
 
@@ -835,7 +849,7 @@ def solvedepsQml(globs,
 
             if os.path.exists(sysModulePath):
                 print('    {} -> {}'.format(sysModulePath, installModulePath))
-                DTUtils.copy(sysModulePath, installModulePath)
+                DTManifest.copy(sysModulePath, installModulePath)
                 solvedImports.add(imp)
                 globs['dependencies'].add(os.path.join(sysModulePath, 'qmldir'))
 
@@ -961,7 +975,7 @@ def solvedepsPlugins(globs,
                         dst = os.path.join(libDir, os.path.basename(multimediaQuickLib))
 
                     print('    {} -> {}'.format(multimediaQuickLib, dst))
-                    DTUtils.copy(multimediaQuickLib, dst)
+                    DTManifest.copy(multimediaQuickLib, dst)
 
         for plugin in pluginsMap[libName]:
             if not plugin in plugins:
@@ -972,7 +986,7 @@ def solvedepsPlugins(globs,
                     continue
 
                 print('    {} -> {}'.format(sysPluginPath, pluginPath))
-                DTUtils.copy(sysPluginPath, pluginPath)
+                DTManifest.copy(sysPluginPath, pluginPath)
                 plugins.append(plugin)
                 globs['dependencies'].add(sysPluginPath)
 
@@ -985,7 +999,7 @@ def solvedepsPlugins(globs,
                 continue
 
             print('    {} -> {}'.format(sysPluginPath, pluginPath))
-            DTUtils.copy(sysPluginPath, pluginPath)
+            DTManifest.copy(sysPluginPath, pluginPath)
             plugins.append(plugin)
             globs['dependencies'].add(sysPluginPath)
 
@@ -1006,6 +1020,7 @@ def removeDebugs(dataDir, qmakeExecutable):
 
     for f in dbgFiles:
         os.remove(f)
+        DTFileIndex.remove(f)
 
 def removeInvalidAndroidArchs(targetArch, assetsDir):
     suffix = '_{}.so'.format(targetArch)
@@ -1014,6 +1029,7 @@ def removeInvalidAndroidArchs(targetArch, assetsDir):
         for f in files:
             if f.endswith('.so') and not f.endswith(suffix):
                 os.remove(os.path.join(root, f))
+                DTFileIndex.remove(os.path.join(root, f))
 
 def writeQtConf(qtConfFile,
                 mainExecutable,
@@ -1041,6 +1057,8 @@ def writeQtConf(qtConfFile,
             qtconf.write('{} = {}\n'.format(path, paths[path]))
             print('{} = {}'.format(path, paths[path]))
 
+    DTFileIndex.update(qtConfFile)
+
 def preRun(globs, configs, dataDir):
     sourcesDir = configs.get('Package', 'sourcesDir', fallback='.').strip()
     name = configs.get('Package', 'name', fallback='app').strip()
@@ -22,7 +22,6 @@
 import os
 import re
 import subprocess
-import tempfile
 import time
 
 from . import DTUtils
@@ -114,7 +113,7 @@ def createInstaller(globs,
                     changeLog,
                     requiresAdminRights,
                     verbose):
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with DTUtils.stagingDirectory(dataDir) as tmpdir:
         # Create layout
         componentName = '{}.{}'.format(organization, name)
         installerConfig = os.path.join(tmpdir, 'config')
@@ -146,7 +145,7 @@ def createInstaller(globs,
             licenseOutFile += '.txt'
 
         DTUtils.copy(licenseFile, os.path.join(installerMetaDir, licenseOutFile))
-        DTUtils.copy(dataDir, installerDataDir)
+        DTUtils.stage(dataDir, installerDataDir)
 
         configXml = os.path.join(installerConfig, 'config.xml')
 
@@ -25,8 +25,8 @@ import re
 import shutil
 import subprocess
 import tarfile
-import tempfile
 
+from . import DTProfile
 from . import DTUtils
 
 
@@ -55,7 +55,7 @@ def createRpmFile(globs,
                   installPrefix,
                   links,
                   verbose):
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with DTUtils.stagingDirectory(dataDir) as tmpdir:
         rpmbuildDir = os.path.join(os.path.expanduser("~"), 'rpmbuild')
 
         # Delete old rpmbuild directory
@@ -87,7 +87,7 @@ def createRpmFile(globs,
         if not os.path.exists(prefixDir):
             os.makedirs(prefixDir)
 
-        DTUtils.copy(dataDir, prefixDir)
+        DTUtils.stage(dataDir, prefixDir)
 
         # Write the files links
 
@@ -193,14 +193,15 @@ def createRpmFile(globs,
         if len(lint) > 0:
             params = [lint, specFile]
 
-            if verbose:
-                process = subprocess.Popen(params) # nosec
-            else:
-                process = subprocess.Popen(params, # nosec
-                                        stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE)
+            with DTProfile.tool(params):
+                if verbose:
+                    process = subprocess.Popen(params) # nosec
+                else:
+                    process = subprocess.Popen(params, # nosec
+                                            stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE)
 
-            process.communicate()
+                process.communicate()
 
         # Build the package
 
@@ -209,14 +210,15 @@ def createRpmFile(globs,
                   '-bb',
                   specFile]
 
-        if verbose:
-            process = subprocess.Popen(params) # nosec
-        else:
-            process = subprocess.Popen(params, # nosec
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE)
+        with DTProfile.tool(params):
+            if verbose:
+                process = subprocess.Popen(params) # nosec
+            else:
+                process = subprocess.Popen(params, # nosec
+                                           stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE)
 
-        process.communicate()
+            process.communicate()
 
         outRpm = os.path.join(rpmbuildDir,
                               'RPMS',
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import hashlib
+import os
+import threading
+
+from . import DTManifest
+from . import DTUtils
+
+
+# Bump this when the processing of the dependencies changes, so old
+# artifacts are not used anymore.
+STORE_VERSION = 1
+
+# Settings that change the result of stripping and patching a dependency.
+STORE_FLAGS = [('Package', 'targetPlatform', ''),
+               ('Package', 'targetArch', ''),
+               ('Package', 'debug', 'false'),
+               ('Package', 'buildType', 'Debug'),
+               ('Package', 'libDir', ''),
+               ('System', 'strip', 'true'),
+               ('System', 'stripCmd', 'strip'),
+               ('Posix', 'fixRpaths', 'true')]
+
+STORE_DIR = ''
+STORE_FLAGS_HASH = ''
+DATA_DIR = ''
+
+# Files copied in this run that must be added to the store once processed,
+# and files that were linked from the store and are already processed.
+PENDING = {}
+LINKED = set()
+STORE_MUTEX = threading.Lock()
+
+def enabled():
+    return STORE_DIR != ''
+
+def init(configs, dataDir):
+    global STORE_DIR
+    global STORE_FLAGS_HASH
+    global DATA_DIR
+
+    storeDir = configs.get('System', 'dependencyStore', fallback='').strip()
+
+    if storeDir == '':
+        return
+
+    sha = hashlib.sha256()
+    sha.update('{}\0'.format(STORE_VERSION).encode('utf-8'))
+
+    for section, key, default in STORE_FLAGS:
+        value = configs.get(section, key, fallback=default).strip()
+        sha.update('{}\0{}\0{}\0'.format(section, key, value).encode('utf-8'))
+
+    with STORE_MUTEX:
+        STORE_DIR = os.path.abspath(os.path.expanduser(storeDir))
+        STORE_FLAGS_HASH = sha.hexdigest()
+        DATA_DIR = os.path.abspath(dataDir)
+        PENDING.clear()
+        LINKED.clear()
+
+def storeKey(src, dst):
+    # The artifact depends on the contents of the source, the settings, and
+    # the place where it's deployed, since the rpath is relative to it.
+    sha = hashlib.sha256()
+    sha.update('{}\0{}\0{}\0'.format(STORE_FLAGS_HASH,
+                                     DTManifest.fileHash(src),
+                                     os.path.relpath(dst, DATA_DIR)).encode('utf-8'))
+
+    return sha.hexdigest()
+
+def storePath(key):
+    return os.path.join(STORE_DIR, key[: 2], key)
+
+def payloadPath(src, dst, copyReals, rootPath):
+    # Returns the file where DTUtils.copy will write the contents of src.
+    dstfile = dst
+
+    if os.path.isdir(dst):
+        dstfile = os.path.join(dst, os.path.basename(src))
+
+    if copyReals or not os.path.islink(src):
+        return os.path.abspath(dstfile)
+
+    realsrc = DTUtils.realPath(src)
+    relsrcdir = os.path.relpath(os.path.dirname(realsrc), os.path.dirname(src))
+    payload = os.path.join(os.path.dirname(dstfile),
+                           relsrcdir,
+                           os.path.basename(realsrc))
+
+    if rootPath != '':
+        payload = DTUtils.repositionPath(payload, rootPath)
+
+    return os.path.abspath(payload)
+
+def copy(src, dst, copyReals=False, overwrite=True, rootPath=''):
+    # Same as DTUtils.copy, but the contents of the dependency are linked
+    # from the store if it was already processed in a previous deploy.
+    if not enabled() or not os.path.isfile(src):
+        return DTUtils.copy(src, dst, copyReals, overwrite, rootPath)
+
+    payload = payloadPath(src, dst, copyReals, rootPath)
+
+    try:
+        key = storeKey(DTUtils.realPath(src), payload)
+    except:
+        return DTUtils.copy(src, dst, copyReals, overwrite, rootPath)
+
+    artifact = storePath(key)
+
+    if not os.path.isfile(artifact):
+        if not DTUtils.copy(src, dst, copyReals, overwrite, rootPath):
+            return False
+
+        with STORE_MUTEX:
+            PENDING[payload] = key
+
+        return True
+
+    if not overwrite and os.path.exists(payload):
+        return True
+
+    try:
+        payloadDir = os.path.dirname(payload)
+
+        if not os.path.exists(payloadDir):
+            os.makedirs(payloadDir)
+
+        if os.path.lexists(payload):
+            os.remove(payload)
+    except:
+        return DTUtils.copy(src, dst, copyReals, overwrite, rootPath)
+
+    if not DTUtils.stageFile(artifact, payload):
+        return DTUtils.copy(src, dst, copyReals, overwrite, rootPath)
+
+    with STORE_MUTEX:
+        LINKED.add(payload)
+
+    if payload != os.path.abspath(dst) and os.path.islink(src):
+        # Create the links pointing to the artifact, the contents are already
+        # in place so they are not overwritten.
+        dstfile = dst
+
+        if os.path.isdir(dst):
+            dstfile = os.path.join(dst, os.path.basename(src))
+
+        if os.path.lexists(dstfile):
+            if not overwrite:
+                return True
+
+            os.remove(dstfile)
+
+        return DTUtils.copy(src, dst, copyReals, False, rootPath)
+
+    return True
+
+def discard(path):
+    # Must be called when a dependency couldn't be processed, so it's not
+    # added to the store.
+    with STORE_MUTEX:
+        PENDING.pop(os.path.abspath(path), None)
+
+def isProcessed(path):
+    return os.path.abspath(path) in LINKED
+
+def unprocessedFiles(paths):
+    # Removes the files linked from the store, they are already stripped and
+    # patched.
+    if not enabled():
+        return list(paths)
+
+    return [path for path in paths if not isProcessed(path)]
+
+def commit():
+    # Adds the dependencies processed in this run to the store.
+    if not enabled():
+        return
+
+    with STORE_MUTEX:
+        pending = dict(PENDING)
+        PENDING.clear()
+
+    def store(payload, key):
+        if not os.path.isfile(payload) or os.path.islink(payload):
+            return
+
+        artifact = storePath(key)
+
+        if os.path.exists(artifact):
+            return
+
+        artifactDir = os.path.dirname(artifact)
+        tmpFile = '{}.{}.tmp'.format(artifact, os.getpid())
+
+        try:
+            if not os.path.exists(artifactDir):
+                os.makedirs(artifactDir, exist_ok=True)
+
+            if os.path.lexists(tmpFile):
+                os.remove(tmpFile)
+
+            if DTUtils.stageFile(payload, tmpFile):
+                os.replace(tmpFile, artifact)
+        except:
+            pass
+
+    DTUtils.waitJobs([DTUtils.submitJob(store, payload, key)
+                      for payload, key in pending.items()])
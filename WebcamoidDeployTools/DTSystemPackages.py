@@ -19,131 +19,419 @@
 #
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
+import glob
+import json
 import os
 import subprocess
 import sys
+import threading
 
 from . import DTUtils
 
 
-def searchBrew(path):
-    brew = DTUtils.whereBin('brew')
+# Maximum number of paths passed to a single package manager call.
+QUERY_CHUNK_SIZE = 256
+DPKG_INFO_DIR = '/var/lib/dpkg/info'
+DPKG_STATUS_FILE = '/var/lib/dpkg/status'
 
-    if len(brew) > 0:
-        process = subprocess.Popen([brew, '--cellar'], # nosec
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-        stdout, _ = process.communicate()
-        cellarPath = stdout.decode(sys.getdefaultencoding()).strip()
+# Bump this when the layout of the dpkg index cache changes.
+DPKG_INDEX_VERSION = 1
 
+# Index of the files installed by dpkg, maps each path to the package and
+# it's version. It's built once per run.
+DPKG_INDEX = None
+DPKG_INDEX_CACHE_FILE = ''
+DPKG_INDEX_MUTEX = threading.Lock()
+
+# Directories that are symlinks to their /usr counterparts in merged-/usr
+# systems.
+USR_MERGE_DIRS = ['bin', 'sbin', 'lib', 'lib32', 'lib64', 'libx32']
+
+# The package manager detected in the system and it's path.
+PACKAGE_MANAGER = None
+PACKAGE_MANAGER_MUTEX = threading.Lock()
+
+def init(configs):
+    global DPKG_INDEX_CACHE_FILE
+
+    cacheFile = configs.get('System', 'packagesIndexCache', fallback='').strip()
+
+    if len(cacheFile) > 0:
+        cacheFile = os.path.abspath(os.path.expanduser(cacheFile))
+
+    with DPKG_INDEX_MUTEX:
+        DPKG_INDEX_CACHE_FILE = cacheFile
+
+def runQuery(params):
+    process = subprocess.Popen(params, # nosec
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    stdout, _ = process.communicate()
+
+    return process.returncode, stdout.decode(sys.getdefaultencoding())
+
+def chunks(paths):
+    for i in range(0, len(paths), QUERY_CHUNK_SIZE):
+        yield paths[i: i + QUERY_CHUNK_SIZE]
+
+def searchBrew(brew, paths):
+    _, stdout = runQuery([brew, '--cellar'])
+    cellarPath = stdout.strip()
+    packages = {}
+
+    for path in paths:
         if not path.startswith(cellarPath):
-            return ''
+            packages[path] = ''
+        else:
+            packages[path] = ' '.join(path.replace(cellarPath + os.sep, '').split(os.sep)[0: 2])
 
-        return ' '.join(path.replace(cellarPath + os.sep, '').split(os.sep)[0: 2])
+    return packages
 
-    return ''
+def searchPacmanPath(pacman, path):
+    returncode, stdout = runQuery([pacman, '-Qo', path])
 
-def searchPacman(path):
-    path = path.replace('\\', '/')
-    pacman = DTUtils.whereBin('pacman')
+    if returncode != 0:
+        return ''
 
-    if len(pacman) > 0:
-        process = subprocess.Popen([pacman, '-Qo', path], # nosec
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-        stdout, _ = process.communicate()
+    info = stdout.split(' ')
 
-        if process.returncode != 0:
-            return ''
+    if len(info) < 2:
+        return ''
 
-        info = stdout.decode(sys.getdefaultencoding()).split(' ')
+    package, version = info[-2:]
 
-        if len(info) < 2:
-            return ''
+    return ' '.join([package.strip(), version.strip()])
 
-        package, version = info[-2:]
+def searchPacman(pacman, paths):
+    paths = {path: path.replace('\\', '/') for path in paths}
+    owners = {}
 
-        return ' '.join([package.strip(), version.strip()])
+    for chunk in chunks(sorted(set(paths.values()))):
+        # Unowned paths are reported in stderr.
+        _, stdout = runQuery([pacman, '-Qo'] + chunk)
 
-    return ''
+        for line in stdout.split('\n'):
+            path, sep, info = line.partition(' is owned by ')
 
-def searchDpkg(path):
-    dpkg = DTUtils.whereBin('dpkg')
+            if len(sep) < 1:
+                continue
 
-    if len(dpkg) > 0:
-        process = subprocess.Popen([dpkg, '-S', path], # nosec
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-        stdout, _ = process.communicate()
+            info = info.split(' ')
 
-        if process.returncode != 0:
-            return ''
+            if len(info) >= 2:
+                owners[path.strip()] = ' '.join([info[-2].strip(), info[-1].strip()])
 
-        package = stdout.split(b':')[0].decode(sys.getdefaultencoding()).strip()
-        process = subprocess.Popen([dpkg, '-s', package], # nosec
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-        stdout, _ = process.communicate()
+    packages = {}
 
-        if process.returncode != 0:
-            return ''
+    for path, query in paths.items():
+        if query in owners:
+            packages[path] = owners[query]
+        else:
+            # pacman may report the path in a different form, ask for it alone.
+            packages[path] = searchPacmanPath(pacman, query)
 
-        for line in stdout.decode(sys.getdefaultencoding()).split('\n'):
-            line = line.strip()
+    return packages
 
-            if line.startswith('Version:'):
-                return ' '.join([package, line.split()[1].strip()])
+def readDpkgLists(infoDir=DPKG_INFO_DIR):
+    # Index of the files installed by each package, read from the dpkg
+    # database.
+    index = {}
 
-        return ''
+    for listFile in glob.glob(os.path.join(infoDir, '*.list')):
+        # The file name is 'package.list' or 'package:arch.list'.
+        package = os.path.basename(listFile)[: -len('.list')].split(':')[0]
 
-    return ''
+        try:
+            with open(listFile, 'rb') as f:
+                for line in f:
+                    path = line.rstrip(b'\n').decode(sys.getdefaultencoding(), 'replace')
 
-def searchRpm(path):
-    rpm = DTUtils.whereBin('rpm')
+                    if len(path) > 0:
+                        index[path] = package
+        except:
+            pass
 
-    if len(rpm) > 0:
-        process = subprocess.Popen([rpm, '-qf', path], # nosec
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-        stdout, _ = process.communicate()
+    return index
 
-        if process.returncode != 0:
-            return ''
+def readDpkgStatus(statusFile=DPKG_STATUS_FILE):
+    # Returns the version of each installed package.
+    versions = {}
+    package = ''
+    version = ''
+    installed = False
 
-        return stdout.decode(sys.getdefaultencoding()).strip()
+    with open(statusFile, 'rb') as f:
+        for line in f:
+            line = line.decode(sys.getdefaultencoding(), 'replace').rstrip('\n')
 
-    return ''
+            if len(line) < 1:
+                # End of the package paragraph.
+                if installed and len(package) > 0 and not package in versions:
+                    versions[package] = version
 
-def searchPkg(path):
-    pkg = DTUtils.whereBin('pkg')
+                package = ''
+                version = ''
+                installed = False
+            elif line.startswith('Package:'):
+                package = line[len('Package:'):].strip()
+            elif line.startswith('Version:'):
+                version = line[len('Version:'):].strip()
+            elif line.startswith('Status:'):
+                installed = line.split()[-1] == 'installed'
 
-    if len(pkg) > 0:
-        process = subprocess.Popen([pkg, 'which', '-q', path], # nosec
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-        stdout, _ = process.communicate()
+    if installed and len(package) > 0 and not package in versions:
+        versions[package] = version
 
-        if process.returncode != 0:
-            return ''
+    return versions
 
-        return stdout.decode(sys.getdefaultencoding()).strip()
+def dpkgStatusSignature():
+    try:
+        st = os.stat(DPKG_STATUS_FILE)
+    except:
+        return None
 
-    return ''
+    return [st.st_size, st.st_mtime_ns]
 
-def searchPackageFor(path):
+def loadDpkgIndex(signature):
+    if len(DPKG_INDEX_CACHE_FILE) < 1:
+        return None
+
+    try:
+        with open(DPKG_INDEX_CACHE_FILE) as f:
+            cache = json.load(f)
+    except:
+        return None
+
+    if cache.get('version', 0) != DPKG_INDEX_VERSION \
+        or cache.get('status', None) != signature:
+        return None
+
+    packages = [tuple(package) for package in cache['packages']]
+
+    return {path: packages[i] for path, i in cache['files'].items()}
+
+def saveDpkgIndex(signature, index):
+    if len(DPKG_INDEX_CACHE_FILE) < 1:
+        return
+
+    packages = sorted(set(index.values()))
+    packageIndex = {package: i for i, package in enumerate(packages)}
+    cacheDir = os.path.dirname(DPKG_INDEX_CACHE_FILE)
+    tmpFile = '{}.{}.tmp'.format(DPKG_INDEX_CACHE_FILE, os.getpid())
+
+    try:
+        if not os.path.exists(cacheDir):
+            os.makedirs(cacheDir)
+
+        with open(tmpFile, 'w') as f:
+            json.dump({'version': DPKG_INDEX_VERSION,
+                       'status': signature,
+                       'packages': packages,
+                       'files': {path: packageIndex[package]
+                                 for path, package in index.items()}}, f)
+
+        os.replace(tmpFile, DPKG_INDEX_CACHE_FILE)
+    except:
+        pass
+
+def dpkgIndex():
+    # Returns the index of the files installed by dpkg, read directly from
+    # the database, or None if the database can't be read.
+    global DPKG_INDEX
+
+    with DPKG_INDEX_MUTEX:
+        if DPKG_INDEX is not None:
+            return DPKG_INDEX if len(DPKG_INDEX) > 0 else None
+
+        DPKG_INDEX = {}
+        signature = dpkgStatusSignature()
+
+        if signature is None:
+            return None
+
+        index = loadDpkgIndex(signature)
+
+        if index is None:
+            try:
+                versions = readDpkgStatus()
+            except:
+                return None
+
+            index = {path: (package, versions[package])
+                     for path, package in readDpkgLists().items()
+                     if package in versions}
+            saveDpkgIndex(signature, index)
+
+        DPKG_INDEX = index
+
+        return DPKG_INDEX if len(DPKG_INDEX) > 0 else None
+
+def pathAliases(path):
+    # In merged-/usr systems a file can be reached from /lib and /usr/lib,
+    # but dpkg only knows the path used by the package.
+    aliases = [path]
+    parts = path.split('/')
+
+    if len(parts) > 2 and parts[0] == '':
+        if parts[1] == 'usr' and len(parts) > 3 and parts[2] in USR_MERGE_DIRS:
+            aliases.append('/'.join([''] + parts[2:]))
+        elif parts[1] in USR_MERGE_DIRS:
+            aliases.append('/usr' + path)
+
+    return aliases
+
+def searchDpkgOwners(dpkg, paths):
+    # Fallback when the dpkg database can't be read.
+    owners = {}
+
+    for chunk in chunks(paths):
+        # Paths not found are reported in stderr.
+        _, stdout = runQuery([dpkg, '-S'] + chunk)
+
+        for line in stdout.split('\n'):
+            if line.startswith('diversion by'):
+                continue
+
+            i = line.find(': ')
+
+            if i < 0:
+                continue
+
+            package = line[: i].split(',')[0].split(':')[0].strip()
+            owners[line[i + 2:].strip()] = package
+
+    return owners
+
+def searchDpkg(dpkg, paths):
+    index = dpkgIndex()
+
+    if index is not None:
+        packages = {}
+
+        for path in paths:
+            packages[path] = ''
+
+            for alias in pathAliases(path) + pathAliases(os.path.realpath(path)):
+                if alias in index:
+                    packages[path] = ' '.join(index[alias])
+
+                    break
+
+        return packages
+
+    return searchDpkgQuery(dpkg, paths)
+
+def searchDpkgQuery(dpkg, paths):
+    # Fallback when the dpkg database can't be read directly.
+    index = readDpkgLists()
+
+    if len(index) > 0:
+        owners = {path: index[path] for path in paths if path in index}
+    else:
+        owners = searchDpkgOwners(dpkg, paths)
+
+    versions = {}
+    dpkgQuery = DTUtils.whereBin('dpkg-query')
+
+    for chunk in chunks(sorted(set(owners.values()))):
+        if len(dpkgQuery) > 0:
+            _, stdout = runQuery([dpkgQuery, '-W', '-f=${Package} ${Version}\n'] + chunk)
+
+            for line in stdout.split('\n'):
+                info = line.split()
+
+                if len(info) == 2 and not info[0] in versions:
+                    versions[info[0]] = info[1]
+        else:
+            for package in chunk:
+                _, stdout = runQuery([dpkg, '-s', package])
+
+                for line in stdout.split('\n'):
+                    line = line.strip()
+
+                    if line.startswith('Version:'):
+                        versions[package] = line.split()[1].strip()
+
+                        break
+
+    packages = {}
+
+    for path in paths:
+        package = owners.get(path, '')
+
+        if package in versions:
+            packages[path] = ' '.join([package, versions[package]])
+        else:
+            packages[path] = ''
+
+    return packages
+
+def searchRpm(rpm, paths):
+    packages = {}
+
+    for chunk in chunks(paths):
+        # rpm prints a line for each path, including the not owned ones.
+        returncode, stdout = runQuery([rpm, '-qf'] + chunk)
+        lines = [line.strip() for line in stdout.strip().split('\n')]
+
+        if len(lines) == len(chunk):
+            for path, line in zip(chunk, lines):
+                packages[path] = '' if ' ' in line else line
+        else:
+            # Some paths are owned by many packages, or don't exist.
+            for path in chunk:
+                returncode, stdout = runQuery([rpm, '-qf', path])
+                packages[path] = stdout.strip() if returncode == 0 else ''
+
+    return packages
+
+def searchPkg(pkg, paths):
+    packages = {}
+
+    for path in paths:
+        returncode, stdout = runQuery([pkg, 'which', '-q', path])
+        packages[path] = stdout.strip() if returncode == 0 else ''
+
+    return packages
+
+PACKAGE_MANAGERS = {
+    'brew': searchBrew,
+    'pacman': searchPacman,
+    'dpkg': searchDpkg,
+    'rpm': searchRpm,
+    'pkg': searchPkg
+}
+
+def packageManager():
+    # Returns the name and the path of the package manager of the system, the
+    # result is cached.
+    global PACKAGE_MANAGER
+
+    with PACKAGE_MANAGER_MUTEX:
+        if PACKAGE_MANAGER is None:
+            PACKAGE_MANAGER = ('', '')
+
+            for manager in PACKAGE_MANAGERS:
+                mgr = DTUtils.whereBin(manager)
+
+                if len(mgr) > 0:
+                    PACKAGE_MANAGER = (manager, mgr)
+
+                    break
+
+        return PACKAGE_MANAGER
+
+def searchPackagesFor(paths):
+    # Returns a dictionary with the package that provides each path, the
+    # package manager is called once for all the paths.
     os.environ['LC_ALL'] = 'C'
-    packageManagers = {
-        'brew': searchBrew,
-        'pacman': searchPacman,
-        'dpkg': searchDpkg,
-        'rpm': searchRpm,
-        'pkg': searchPkg
-    }
+    paths = sorted(set(paths))
+    manager, mgr = packageManager()
 
-    for manager in packageManagers:
-        mgr = DTUtils.whereBin(manager)
+    if len(manager) < 1 or len(paths) < 1:
+        return {path: '' for path in paths}
 
-        if len(mgr) > 0:
-            return packageManagers[manager](path)
+    return PACKAGE_MANAGERS[manager](mgr, paths)
 
-    return ''
+def searchPackageFor(path):
+    return searchPackagesFor([path]).get(path, '')
@@ -19,19 +19,51 @@
 #
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
+import concurrent.futures
 import configparser
+import contextvars
 import hashlib
 import math
 import multiprocessing
 import os
 import shutil
 import sys
+import tempfile
+import threading
+import time
 
+from . import DTFileIndex
 from . import DTGit
 from . import DTBinary
+from . import DTManifest
 from . import DTMac
 from . import DTUtils
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Cached directory listings used for resolving libraries, maps the path of
+# a directory to the names of the files it contains.
+DIR_INDEX = {}
+DIR_INDEX_MUTEX = threading.Lock()
+
+# Shared pool of workers for running jobs in parallel.
+NUM_THREADS = 0
+THREAD_POOL = None
+THREAD_POOL_MUTEX = threading.Lock()
+THREAD_POOL_WORKER = threading.local()
+
+# ioctl for creating copy-on-write clones of files in Linux.
+FICLONE = 0x40049409
+
+# Trees with at least this number of files are copied in parallel.
+PARALLEL_COPY_MIN_FILES = 64
+
+# Size of the chunks used when the file can't be copied by the kernel.
+COPY_CHUNK_SIZE = 1 << 20
 
 def hostPlatform():
     if os.name == 'posix' and sys.platform.startswith('darwin'):
@@ -77,6 +109,50 @@ def whereBin(binary, extraPaths=[]):
 
     return ''
 
+def dirIndex(path):
+    with DIR_INDEX_MUTEX:
+        entries = DIR_INDEX.get(path)
+
+    if entries is not None:
+        return entries
+
+    entries = {}
+    caseInsensitive = hostPlatform() == 'windows'
+
+    try:
+        with os.scandir(path) as dirEntries:
+            for entry in dirEntries:
+                if caseInsensitive:
+                    entries[entry.name.lower()] = entry.name
+                else:
+                    entries[entry.name] = entry.name
+    except:
+        pass
+
+    with DIR_INDEX_MUTEX:
+        DIR_INDEX[path] = entries
+
+    return entries
+
+def invalidateDirIndex(path=None):
+    with DIR_INDEX_MUTEX:
+        if path is None:
+            DIR_INDEX.clear()
+        elif path in DIR_INDEX:
+            del DIR_INDEX[path]
+
+def findInPaths(fileName, paths):
+    key = fileName.lower() if hostPlatform() == 'windows' else fileName
+
+    for path in paths:
+        if key in dirIndex(path):
+            filePath = os.path.join(path, fileName)
+
+            if os.path.exists(filePath):
+                return filePath
+
+    return ''
+
 def isPathHiger(path, start=os.curdir):
     rel = os.path.relpath(os.path.normpath(path), start)
 
@@ -90,120 +166,328 @@ def repositionPath(path, start=os.curdir):
 
     return path
 
-def copy(src, dst='.', copyReals=False, overwrite=True, rootPath=''):
-    if not os.path.exists(src):
-        return False
+def copyFileData(src, dst):
+    # Copy the contents of the file inside the kernel when possible.
+    with open(src, 'rb') as srcFile:
+        with open(dst, 'wb') as dstFile:
+            size = os.fstat(srcFile.fileno()).st_size
+            copied = 0
 
-    if hostPlatform() == 'windows':
-        copyReals = True
+            if hasattr(os, 'copy_file_range'):
+                try:
+                    while copied < size:
+                        n = os.copy_file_range(srcFile.fileno(),
+                                               dstFile.fileno(),
+                                               size - copied,
+                                               copied,
+                                               copied)
 
-    realsrc = realPath(src)
+                        if n < 1:
+                            break
 
-    if os.path.isfile(realsrc):
-        dstdir = os.path.normpath(os.path.dirname(dst))
-        dstfile = dst
+                        copied += n
+                except OSError:
+                    copied = 0
 
-        if os.path.isdir(dst):
-            dstdirs = dst
-            dstfile = os.path.join(dst, os.path.basename(src))
+            if copied < 1 and size > 0 and sys.platform.startswith('linux'):
+                try:
+                    dstFile.seek(0)
+
+                    while copied < size:
+                        n = os.sendfile(dstFile.fileno(),
+                                        srcFile.fileno(),
+                                        copied,
+                                        size - copied)
+
+                        if n < 1:
+                            break
+
+                        copied += n
+                except OSError:
+                    copied = 0
+
+            # The file could have changed while copying, so copy whatever is
+            # left.
+            dstFile.seek(copied)
+            dstFile.truncate()
+            srcFile.seek(copied)
+            shutil.copyfileobj(srcFile, dstFile, COPY_CHUNK_SIZE)
+
+def copyRegularFile(src, dst):
+    copyFileData(src, dst)
+    shutil.copymode(src, dst)
+
+def copyFile(src, dst, copyReals, overwrite, rootPath, linkFiles, realsrc):
+    dstdir = os.path.normpath(os.path.dirname(dst))
+    dstfile = dst
+
+    if os.path.isdir(dst):
+        dstdirs = dst
+        dstfile = os.path.join(dst, os.path.basename(src))
+
+    if not os.path.exists(dstdir):
+        try:
+            os.makedirs(dstdir)
+        except:
+            return False
 
-        if not os.path.exists(dstdir):
-            try:
-                os.makedirs(dstdir)
-            except:
-                return False
+    if not overwrite and os.path.exists(dstfile):
+        return True
 
-        if overwrite or not os.path.exists(dstfile):
-            if os.path.exists(dstfile) or os.path.islink(dstfile):
-                os.remove(dstfile)
+    if os.path.exists(dstfile) or os.path.islink(dstfile):
+        os.remove(dstfile)
+        DTFileIndex.update(dstfile)
+
+    isLink = os.path.islink(src)
+    realsrcdir = os.path.dirname(realsrc)
+    srcdir = os.path.dirname(src)
+    relsrcdir = os.path.relpath(realsrcdir, srcdir)
+    srclink = os.path.join(relsrcdir, os.path.basename(realsrc))
+    dstlink = os.path.normpath(os.path.join(dstdir, srclink))
+
+    if rootPath != '' \
+        and not copyReals \
+        and isLink \
+        and isPathHiger(dstlink, rootPath):
+        rep = os.path.dirname(repositionPath(dstlink, rootPath))
+        reldstdir = os.path.relpath(rep, dstdir)
+        dstlink = os.path.join(reldstdir, os.path.basename(dstlink))
+
+        try:
+            os.symlink(dstlink, dstfile)
+        except:
+            return False
+    elif linkFiles and not isLink:
+        if not stageFile(src, dstfile):
+            return False
+    elif isLink and not copyReals:
+        try:
+            shutil.copy(src, dstfile, follow_symlinks=False)
+        except:
+            return False
+    else:
+        try:
+            copyRegularFile(src, dstfile)
+        except:
+            return False
 
-            realsrcdir = os.path.dirname(realsrc)
-            srcdir = os.path.dirname(src)
-            relsrcdir = os.path.relpath(realsrcdir, srcdir)
-            srclink = os.path.join(relsrcdir, os.path.basename(realsrc))
-            dstlink = os.path.normpath(os.path.join(dstdir, srclink))
+    DTFileIndex.update(dstfile)
 
-            if rootPath != '' \
-                and not copyReals \
-                and os.path.islink(src) \
-                and isPathHiger(dstlink, rootPath):
-                rep = os.path.dirname(repositionPath(dstlink, rootPath))
-                reldstdir = os.path.relpath(rep, dstdir)
-                dstlink = os.path.join(reldstdir, os.path.basename(dstlink))
+    if isLink and not copyReals:
+        # realsrc is already resolved, so it's never a link.
+        dstfile = os.path.join(dstdir, relsrcdir, os.path.basename(realsrc))
 
-                try:
-                    os.symlink(dstlink, dstfile)
-                except:
-                    return False
-            else:
-                try:
-                    shutil.copy(src, dstfile, follow_symlinks=copyReals)
-                except:
-                    return False
+        if rootPath != '':
+            dstfile = repositionPath(dstfile, rootPath)
+
+        if not copyFile(realsrc, dstfile, copyReals, overwrite, rootPath, linkFiles, realsrc):
+            return False
 
-            if os.path.islink(src) and not copyReals:
-                dstfile = os.path.join(dstdir, relsrcdir, os.path.basename(realsrc))
+    return True
 
-                if rootPath != '':
-                    dstfile = repositionPath(dstfile, rootPath)
+def copyTreeFile(entry, dstfile, overwrite, linkFiles):
+    # Fast path for regular files, the parent directory already exists.
+    try:
+        if os.path.lexists(dstfile):
+            if not overwrite:
+                return True
 
-                if not copy(realsrc, dstfile, copyReals, overwrite, rootPath):
-                    return False
+            os.remove(dstfile)
 
-        return True
+        if linkFiles:
+            return stageFile(entry.path, dstfile)
 
-    if os.path.isfile(dst):
+        copyRegularFile(entry.path, dstfile)
+    except:
         return False
 
-    for root, dirs, files in os.walk(src):
-        for f in files:
-            srcfile = os.path.join(root, f)
-            relsrcfile = os.path.relpath(srcfile, src)
-            dstfile = os.path.join(dst, relsrcfile)
-            copy(srcfile, dstfile, copyReals, overwrite, rootPath)
+    return True
 
-        for d in dirs:
-            srcdir = os.path.join(root, d)
-            relsrcdir = os.path.relpath(srcdir, src)
-            dstdir = os.path.join(dst, relsrcdir)
+def copyTree(src, dst, copyReals, overwrite, rootPath, linkFiles):
+    # Walk the tree with a single scandir per directory, the directories are
+    # created while walking and the files are copied at the end.
+    stack = [(src, dst)]
+    files = []
+    links = []
 
-            if os.path.exists(dstdir):
-                if os.path.islink(dstdir):
+    while len(stack) > 0:
+        srcdir, dstdir = stack.pop()
+
+        try:
+            with os.scandir(srcdir) as dirEntries:
+                entries = list(dirEntries)
+        except:
+            continue
+
+        if len(entries) > 0 and not os.path.isdir(dstdir):
+            try:
+                os.makedirs(dstdir)
+            except:
+                pass
+
+        for entry in entries:
+            dstpath = os.path.join(dstdir, entry.name)
+
+            if not entry.is_dir():
+                if entry.is_symlink():
+                    links.append((entry.path, dstpath))
+                else:
+                    files.append((entry, dstpath))
+
+                continue
+
+            isLink = entry.is_symlink()
+
+            if os.path.exists(dstpath):
+                if os.path.islink(dstpath):
                     try:
-                        os.unlink(dstdir)
+                        os.unlink(dstpath)
                     except:
                         return False
-                elif os.path.isfile(dstdir):
+                elif os.path.isfile(dstpath):
                     try:
-                        os.remove(dstdir)
+                        os.remove(dstpath)
                     except:
                         return False
-                elif os.path.islink(srcdir):
+                elif isLink:
                     try:
-                        shutil.rmtree(dstdir)
+                        shutil.rmtree(dstpath)
                     except:
                         return False
 
-            if os.path.islink(srcdir):
+            if isLink:
                 if copyReals:
-                    copy(srcdir, dstdir, copyReals, overwrite, rootPath)
+                    stack.append((entry.path, dstpath))
                 else:
-                    realsrcdir = realPath(srcdir)
-                    relsrcdir = os.path.relpath(realsrcdir,
-                                                os.path.dirname(srcdir))
+                    realsrcdir = realPath(entry.path)
+                    relsrcdir = os.path.relpath(realsrcdir, srcdir)
 
                     try:
-                        os.symlink(relsrcdir, dstdir)
+                        os.symlink(relsrcdir, dstpath)
                     except:
                         pass
             else:
                 try:
-                    os.makedirs(dstdir)
+                    os.makedirs(dstpath)
                 except:
                     pass
 
+                stack.append((entry.path, dstpath))
+
+    if len(files) < PARALLEL_COPY_MIN_FILES:
+        for entry, dstfile in files:
+            copyTreeFile(entry, dstfile, overwrite, linkFiles)
+    else:
+        waitJobs([submitJob(copyTreeFile, entry, dstfile, overwrite, linkFiles)
+                  for entry, dstfile in files])
+
+    # Links can point to the files copied above, so copy them at the end.
+    for srcfile, dstfile in links:
+        if os.path.exists(srcfile):
+            copyFile(srcfile,
+                     dstfile,
+                     copyReals,
+                     overwrite,
+                     rootPath,
+                     linkFiles,
+                     realPath(srcfile))
+
+    DTFileIndex.update(dst)
+
+    return True
+
+def copy(src, dst='.', copyReals=False, overwrite=True, rootPath='', linkFiles=False):
+    if not os.path.exists(src):
+        return False
+
+    if hostPlatform() == 'windows':
+        copyReals = True
+
+    realsrc = realPath(src)
+
+    if os.path.isfile(realsrc):
+        return copyFile(src, dst, copyReals, overwrite, rootPath, linkFiles, realsrc)
+
+    if os.path.isfile(dst):
+        return False
+
+    return copyTree(src, dst, copyReals, overwrite, rootPath, linkFiles)
+
+def cloneFile(src, dst):
+    # Creates a copy-on-write clone of the file, returns False if the file
+    # system doesn't support it.
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+
+    try:
+        with open(src, 'rb') as srcFile:
+            with open(dst, 'wb') as dstFile:
+                fcntl.ioctl(dstFile.fileno(), FICLONE, srcFile.fileno())
+
+        shutil.copymode(src, dst)
+    except:
+        if os.path.exists(dst):
+            os.remove(dst)
+
+        return False
+
+    return True
+
+def stageFile(src, dst):
+    # Use a reflink if possible, so writing to the file doesn't modify the
+    # original, otherwise use a hard link. The file is only copied if it's in
+    # a different device.
+    try:
+        sameDevice = os.stat(src).st_dev == os.stat(os.path.dirname(dst)).st_dev
+    except:
+        sameDevice = False
+
+    if sameDevice:
+        if cloneFile(src, dst):
+            DTFileIndex.update(dst)
+
+            return True
+
+        try:
+            os.link(src, dst)
+            DTFileIndex.update(dst)
+
+            return True
+        except:
+            pass
+
+    try:
+        copyRegularFile(src, dst)
+    except:
+        return False
+
+    DTFileIndex.update(dst)
+
     return True
 
+def stage(src, dst):
+    # Populates dst with the contents of src, as copy does, but regular files
+    # are reflinked or hard linked instead of copied whenever possible. Hard
+    # linked files share the data with src, so they must be replaced instead
+    # of written in place.
+    return copy(src, dst, linkFiles=True)
+
+def stagingDirectory(dataDir):
+    # Returns a temporary directory in the same device as the data directory,
+    # so the files can be staged as links.
+    tmpdir = tempfile.gettempdir()
+    parentDir = os.path.dirname(realPath(dataDir))
+
+    try:
+        if os.stat(tmpdir).st_dev != os.stat(parentDir).st_dev \
+            and os.access(parentDir, os.W_OK):
+            return tempfile.TemporaryDirectory(prefix='.dt-staging-',
+                                               dir=parentDir)
+    except:
+        pass
+
+    return tempfile.TemporaryDirectory()
+
 def move(src, dst='.', moveReals=False):
     if not os.path.exists(src):
         return False
@@ -227,6 +511,7 @@ def move(src, dst='.', moveReals=False):
 
                 try:
                     os.makedirs(os.path.normpath(toD))
+                    DTFileIndex.update(os.path.normpath(toD))
                 except:
                     pass
     elif os.path.isfile(src):
@@ -262,6 +547,9 @@ def move(src, dst='.', moveReals=False):
             except:
                 return False
 
+        DTFileIndex.update(src)
+        DTFileIndex.update(dst)
+
     return True
 
 def sha256sum(fileName):
@@ -317,7 +605,15 @@ def readConfigs(configFile):
 
     return configs
 
+def setNumThreads(nthreads):
+    global NUM_THREADS
+
+    NUM_THREADS = max(nthreads, 0)
+
 def numThreads():
+    if NUM_THREADS > 0:
+        return NUM_THREADS
+
     nthreads = multiprocessing.cpu_count()
 
     if nthreads < 4:
@@ -325,6 +621,80 @@ def numThreads():
 
     return nthreads
 
+def threadPool():
+    global THREAD_POOL
+
+    with THREAD_POOL_MUTEX:
+        if THREAD_POOL is None:
+            THREAD_POOL = \
+                concurrent.futures.ThreadPoolExecutor(max_workers=numThreads(),
+                                                      thread_name_prefix='DTWorker')
+
+        return THREAD_POOL
+
+def runJob(timing, function, args, kwargs):
+    THREAD_POOL_WORKER.active = True
+    timing['start'] = time.monotonic()
+
+    try:
+        return function(*args, **kwargs)
+    finally:
+        timing['elapsed'] = time.monotonic() - timing['start']
+        THREAD_POOL_WORKER.active = False
+
+def submitJob(function, *args, **kwargs):
+    # Returns a future for the job, the start time and the duration of the
+    # job are stored in the 'timing' attribute of the future.
+    timing = {'start': 0.0, 'elapsed': 0.0}
+
+    if getattr(THREAD_POOL_WORKER, 'active', False):
+        # Jobs submitted from a worker are run in place, waiting for them
+        # from the worker could exhaust the pool.
+        future = concurrent.futures.Future()
+
+        try:
+            future.set_result(runJob(timing, function, args, kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            THREAD_POOL_WORKER.active = True
+    else:
+        # Run the job in a copy of the caller's context, so the profiling
+        # spans of the job are nested inside the caller's span.
+        context = contextvars.copy_context()
+        future = threadPool().submit(context.run,
+                                     runJob,
+                                     timing,
+                                     function,
+                                     args,
+                                     kwargs)
+
+    future.timing = timing
+
+    return future
+
+def waitJobs(futures):
+    # Wait for all jobs to finish and raise the first error, if any.
+    results = []
+    error = None
+
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(None)
+
+            if error is None:
+                error = e
+
+    if error is not None:
+        raise error
+
+    return results
+
+def mapJobs(function, items):
+    return waitJobs([submitJob(function, item) for item in items])
+
 def programVersion(configs, sourcesDir):
     hideCommitCount = configs.get('Git', 'hideCommitCount', fallback='false').strip()
     hideCommitCount = DTUtils.toBool(hideCommitCount)
@@ -428,10 +798,11 @@ def solvedepsLibs(globs,
                 DTMac.copyBundle(dep, depPath)
             else:
                 copyReals = targetPlatform == 'windows'
-                copy(dep, depPath, copyReals, True, dataDir)
+                DTManifest.copy(dep, depPath, copyReals, True, dataDir)
 
             globs['dependencies'].add(dep)
 
+    invalidateDirIndex()
     globs['libs'] = set(deps)
 
 def pathSize(path):
@@ -440,11 +811,8 @@ def pathSize(path):
 
     size = 0
 
-    for root, _, files in os.walk(path):
-        for f in files:
-            fpath = os.path.join(root, f)
-
-            if not os.path.islink(fpath):
-                size += os.path.getsize(fpath)
+    for _, info in DTFileIndex.files(path):
+        if info['type'] == 'file':
+            size += info['size']
 
     return size
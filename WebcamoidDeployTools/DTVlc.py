@@ -24,6 +24,7 @@ import subprocess
 import sys
 
 from . import DTBinary
+from . import DTFileIndex
 from . import DTUtils
 
 
@@ -164,6 +165,7 @@ def regenerateCache(targetPlatform, outputVlcPluginsDir, verbose):
                                 stdout=subprocess.PIPE,
                                 stderr=subprocess.PIPE)
     process.communicate()
+    DTFileIndex.update(outputVlcPluginsDir)
 
 def preRun(globs, configs, dataDir):
     targetPlatform = configs.get('Package', 'targetPlatform', fallback='').strip()
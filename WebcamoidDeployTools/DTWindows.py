@@ -24,8 +24,10 @@ import subprocess
 import sys
 
 from . import DTBinary
+from . import DTFileIndex
 from . import DTGit
 from . import DTSystemPackages
+from . import DTStore
 from . import DTUtils
 
 
@@ -122,9 +124,9 @@ def writeBuildInfo(globs, buildInfoFile, sourcesDir):
         packages = set()
 
         if 'dependencies' in globs:
-            for dep in globs['dependencies']:
-                packageInfo = DTSystemPackages.searchPackageFor(dep)
+            depsPackages = DTSystemPackages.searchPackagesFor(globs['dependencies'])
 
+            for packageInfo in depsPackages.values():
                 if len(packageInfo) > 0:
                     packages.add(packageInfo)
 
@@ -137,7 +139,7 @@ def writeBuildInfo(globs, buildInfoFile, sourcesDir):
 def removeUnneededFiles(path):
     afiles = set()
 
-    for root, _, files in os.walk(path):
+    for root, _, files in DTFileIndex.walk(path):
         for f in files:
             if f.endswith('.a') \
                 or f.endswith('.static.prl') \
@@ -147,6 +149,7 @@ def removeUnneededFiles(path):
 
     for afile in afiles:
         os.remove(afile)
+        DTFileIndex.remove(afile)
 
 def createLauncher(globs, mainExecutable, programArgs, dataDir):
     programName = os.path.basename(mainExecutable)
@@ -174,6 +177,8 @@ def createLauncher(globs, mainExecutable, programArgs, dataDir):
 
         launcher.write('\n')
 
+    DTFileIndex.update(launcherScript)
+
 def preRun(globs, configs, dataDir):
     targetPlatform = configs.get('Package', 'targetPlatform', fallback='').strip()
     targetArch = configs.get('Package', 'targetArch', fallback='').strip()
@@ -238,6 +243,7 @@ def preRun(globs, configs, dataDir):
 
     print('Removing unnecessary files')
     removeUnneededFiles(dataDir)
+    DTStore.commit()
 
 def postRun(globs, configs, dataDir):
     sourcesDir = configs.get('Package', 'sourcesDir', fallback='.').strip()
@@ -262,3 +268,4 @@ def postRun(globs, configs, dataDir):
         print('Writting build system information')
         print()
         writeBuildInfo(globs, buildInfoFile, sourcesDir)
+        DTFileIndex.update(buildInfoFile)
@@ -0,0 +1,697 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid, webcam capture application.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# Webcamoid is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Webcamoid is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Webcamoid. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://webcamoid.github.io/
+
+import configparser
+import json
+import optparse
+import os
+import platform
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+from WebcamoidDeployTools import DTBinary
+from WebcamoidDeployTools import DTBinaryCache
+from WebcamoidDeployTools import DTBinaryElf
+from WebcamoidDeployTools import DTBinaryMach
+from WebcamoidDeployTools import DTBinaryPecoff
+from WebcamoidDeployTools import DTCompression
+from WebcamoidDeployTools import DTUtils
+
+
+# ELF constants.
+ELF_MACHINE_X86_64 = 62
+ELF_SHT_PROGBITS = 1
+ELF_SHT_STRTAB = 3
+ELF_SHT_DYNAMIC = 6
+ELF_DT_NEEDED = 1
+ELF_DT_STRTAB = 5
+ELF_DT_SONAME = 14
+ELF_DT_RUNPATH = 0x1d
+
+# PE constants.
+PE_MACHINE_AMD64 = 0x8664
+PE_CHARACTERISTICS_DLL = 0x2022
+PE_CHARACTERISTICS_EXE = 0x0022
+
+# Mach-O constants.
+MACH_MAGIC_64 = 0xfeedfacf
+MACH_FAT_MAGIC = 0xcafebabe
+MACH_CPU_X86_64 = 0x01000007
+MACH_CPU_ARM64 = 0x0100000c
+MACH_EXECUTE = 0x2
+MACH_DYLIB = 0x6
+MACH_LC_SEGMENT_64 = 0x19
+MACH_LC_LOAD_DYLIB = 0xc
+MACH_LC_ID_DYLIB = 0xd
+MACH_LC_RPATH = 0x8000001c
+
+def align(size, alignment):
+    return (size + alignment - 1) // alignment * alignment
+
+def symbolName(i):
+    return '_ZN9Benchmark{}Symbol{}Ev'.format(len(str(i)), i)
+
+def writeElf(path, soname, needed, runpaths=[], nSections=32, nSymbols=1000, executable=False):
+    # Writes a 64 bits little endian ELF with a dynamic section, a long
+    # '.dynstr' and many empty sections. There are no program headers, the
+    # dynamic section is found through the sections table.
+    dynstr = bytearray(b'\x00')
+
+    def addString(s):
+        offset = len(dynstr)
+        dynstr.extend(s.encode() + b'\x00')
+
+        return offset
+
+    dynamic = []
+
+    if len(soname) > 0:
+        dynamic.append((ELF_DT_SONAME, addString(soname)))
+
+    for lib in needed:
+        dynamic.append((ELF_DT_NEEDED, addString(lib)))
+
+    if len(runpaths) > 0:
+        dynamic.append((ELF_DT_RUNPATH, addString(':'.join(runpaths))))
+
+    for i in range(nSymbols):
+        addString(symbolName(i))
+
+    dynstrOffset = 64
+    dynamic.append((ELF_DT_STRTAB, dynstrOffset))
+    dynamic.append((0, 0))
+    dynamicData = b''.join(struct.pack('<qQ', tag, value) for tag, value in dynamic)
+    dynamicOffset = align(dynstrOffset + len(dynstr), 8)
+
+    sectionNames = [''] \
+                 + ['.dynstr', '.dynamic'] \
+                 + ['.bench{}'.format(i) for i in range(nSections)] \
+                 + ['.shstrtab']
+    shstrtab = bytearray(b'\x00')
+    nameOffsets = []
+
+    for name in sectionNames:
+        if len(name) < 1:
+            nameOffsets.append(0)
+        else:
+            nameOffsets.append(len(shstrtab))
+            shstrtab.extend(name.encode() + b'\x00')
+
+    shstrtabOffset = dynamicOffset + len(dynamicData)
+    shoff = align(shstrtabOffset + len(shstrtab), 8)
+    shnum = len(sectionNames)
+    sections = [struct.pack('<IIQQQQIIQQ', 0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+                struct.pack('<IIQQQQIIQQ',
+                            nameOffsets[1], ELF_SHT_STRTAB, 2, 0,
+                            dynstrOffset, len(dynstr), 0, 0, 1, 0),
+                struct.pack('<IIQQQQIIQQ',
+                            nameOffsets[2], ELF_SHT_DYNAMIC, 3, 0,
+                            dynamicOffset, len(dynamicData), 1, 0, 8, 16)]
+
+    for i in range(nSections):
+        sections.append(struct.pack('<IIQQQQIIQQ',
+                                    nameOffsets[3 + i], ELF_SHT_PROGBITS, 2, 0,
+                                    shoff, 0, 0, 0, 1, 0))
+
+    sections.append(struct.pack('<IIQQQQIIQQ',
+                                nameOffsets[-1], ELF_SHT_STRTAB, 0, 0,
+                                shstrtabOffset, len(shstrtab), 0, 0, 1, 0))
+    header = b'\x7fELF' + bytes([2, 1, 1, 0]) + bytes(8)
+    header += struct.pack('<HHIQQQIHHHHHH',
+                          2 if executable else 3,
+                          ELF_MACHINE_X86_64,
+                          1,
+                          0,
+                          0,
+                          shoff,
+                          0,
+                          64,
+                          56,
+                          0,
+                          64,
+                          shnum,
+                          shnum - 1)
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(dynstr)
+        f.write(bytes(dynamicOffset - f.tell()))
+        f.write(dynamicData)
+        f.write(shstrtab)
+        f.write(bytes(shoff - f.tell()))
+
+        for section in sections:
+            f.write(section)
+
+def writePe(path, imports, nSections=16, executable=False):
+    # Writes a PE32+ image with an import directory table in the '.idata'
+    # section, the other sections are empty.
+    fileAlignment = 0x200
+    sectionAlignment = 0x1000
+    nSections = max(nSections, 1)
+    peOffset = 0x80
+    optionalHeaderSize = 240
+    headersSize = align(peOffset + 4 + 20 + optionalHeaderSize + 40 * nSections,
+                        fileAlignment)
+
+    # Build the '.idata' contents: directory table, then the names.
+    idataRva = sectionAlignment * nSections
+    directorySize = 20 * (len(imports) + 1)
+    names = bytearray()
+    entries = bytearray()
+
+    for lib in imports:
+        entries += struct.pack('<IIIII', 0, 0, 0, idataRva + directorySize + len(names), 0)
+        names += lib.encode() + b'\x00'
+
+    entries += bytes(20)
+    idata = bytes(entries + names)
+    idataRawSize = align(len(idata), fileAlignment)
+    idataOffset = headersSize
+
+    header = bytearray(peOffset)
+    header[: 2] = b'MZ'
+    struct.pack_into('<I', header, 0x3c, peOffset)
+    header += b'PE\x00\x00'
+    header += struct.pack('<HHIIIHH',
+                          PE_MACHINE_AMD64,
+                          nSections,
+                          0,
+                          0,
+                          0,
+                          optionalHeaderSize,
+                          PE_CHARACTERISTICS_EXE if executable else PE_CHARACTERISTICS_DLL)
+    optionalHeader = bytearray(optionalHeaderSize)
+    struct.pack_into('<H', optionalHeader, 0, 0x20b)
+    struct.pack_into('<I', optionalHeader, 32, sectionAlignment)
+    struct.pack_into('<I', optionalHeader, 36, fileAlignment)
+    struct.pack_into('<I', optionalHeader, 108, 16)
+    struct.pack_into('<II', optionalHeader, 120, idataRva, directorySize)
+    header += optionalHeader
+
+    for i in range(nSections - 1):
+        name = '.data{}'.format(i).encode()[: 8].ljust(8, b'\x00')
+        header += name + struct.pack('<IIIIIIHHI',
+                                     sectionAlignment,
+                                     sectionAlignment * (i + 1),
+                                     0,
+                                     0,
+                                     0,
+                                     0,
+                                     0,
+                                     0,
+                                     0x40000040)
+
+    header += b'.idata\x00\x00' + struct.pack('<IIIIIIHHI',
+                                              len(idata),
+                                              idataRva,
+                                              idataRawSize,
+                                              idataOffset,
+                                              0,
+                                              0,
+                                              0,
+                                              0,
+                                              0xc0000040)
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(bytes(headersSize - len(header)))
+        f.write(idata)
+        f.write(bytes(idataRawSize - len(idata)))
+
+def machLoadCommand(cmd, payload, string=b''):
+    # Load command with a trailing string, padded to 8 bytes.
+    size = align(8 + len(payload) + len(string) + 1, 8)
+    data = struct.pack('<II', cmd, size) + payload + string + b'\x00'
+
+    return data + bytes(size - len(data))
+
+def machSlice(cputype, fileType, dylibId, imports, rpaths, nCommands):
+    commands = []
+
+    if len(dylibId) > 0:
+        commands.append(machLoadCommand(MACH_LC_ID_DYLIB,
+                                        struct.pack('<IIII', 24, 2, 0x10000, 0x10000),
+                                        dylibId.encode()))
+
+    for i in range(nCommands):
+        segname = '__BENCH{}'.format(i).encode()[: 16].ljust(16, b'\x00')
+        commands.append(struct.pack('<II16sQQQQiiII',
+                                    MACH_LC_SEGMENT_64,
+                                    72,
+                                    segname,
+                                    0, 0, 0, 0, 0, 0, 0, 0))
+
+    for lib in imports:
+        commands.append(machLoadCommand(MACH_LC_LOAD_DYLIB,
+                                        struct.pack('<IIII', 24, 2, 0x10000, 0x10000),
+                                        lib.encode()))
+
+    for rpath in rpaths:
+        commands.append(machLoadCommand(MACH_LC_RPATH,
+                                        struct.pack('<I', 12),
+                                        rpath.encode()))
+
+    commandsData = b''.join(commands)
+    header = struct.pack('<IiiIIIII',
+                         MACH_MAGIC_64,
+                         cputype,
+                         3,
+                         fileType,
+                         len(commands),
+                         len(commandsData),
+                         0,
+                         0)
+
+    return header + commandsData
+
+def writeMach(path, dylibId, imports, rpaths=[], nCommands=32, executable=False, fat=False):
+    # Writes a thin 64 bits Mach-O, or a fat binary with a x86_64 and an arm64
+    # slice.
+    fileType = MACH_EXECUTE if executable else MACH_DYLIB
+
+    if not fat:
+        with open(path, 'wb') as f:
+            f.write(machSlice(MACH_CPU_X86_64, fileType, dylibId, imports, rpaths, nCommands))
+
+        return
+
+    slices = [(cputype, machSlice(cputype, fileType, dylibId, imports, rpaths, nCommands))
+              for cputype in [MACH_CPU_X86_64, MACH_CPU_ARM64]]
+    sliceAlignment = 12
+    offset = align(8 + 20 * len(slices), 1 << sliceAlignment)
+    header = struct.pack('>II', MACH_FAT_MAGIC, len(slices))
+    body = b''
+
+    for cputype, data in slices:
+        header += struct.pack('>iiIII', cputype, 0, offset + len(body), len(data), sliceAlignment)
+        body += data
+        body += bytes(align(len(body), 1 << sliceAlignment) - len(body))
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(bytes(offset - len(header)))
+        f.write(body)
+
+def makeLibraryTree(path, nLibs, fanout, nSections, nSymbols):
+    # Creates a chain of libraries where each one depends on the next one and
+    # on 'fanout' random libraries after it, the executable depends on the
+    # first one. Returns the path to the executable.
+    rng = random.Random(nLibs)
+    libDir = os.path.join(path, 'lib')
+    os.makedirs(libDir, exist_ok=True)
+    libs = ['libbench{}.so.1'.format(i) for i in range(nLibs)]
+
+    for i, lib in enumerate(libs):
+        needed = libs[i + 1: i + 2]
+        after = libs[i + 2:]
+
+        if len(after) > 0:
+            needed += rng.sample(after, min(fanout, len(after)))
+
+        writeElf(os.path.join(libDir, lib), lib, needed, [], nSections, nSymbols)
+
+    executable = os.path.join(path, 'app')
+    writeElf(executable, '', libs[: 1], [], nSections, nSymbols, executable=True)
+
+    return executable
+
+def makeDataDir(path, size, fanout, depth, filesPerDir):
+    # Creates a directory tree with 'fanout' subdirectories per level, up to
+    # 'depth' levels, the files are filled with incompressible and
+    # compressible data up to 'size' bytes. Returns the number of files.
+    rng = random.Random(size)
+    dirs = [path]
+    level = [path]
+
+    for _ in range(depth):
+        nextLevel = []
+
+        for d in level:
+            for i in range(fanout):
+                subdir = os.path.join(d, 'dir{}'.format(i))
+                nextLevel.append(subdir)
+
+        dirs += nextLevel
+        level = nextLevel
+
+    nFiles = max(len(dirs) * filesPerDir, 1)
+    fileSize = max(size // nFiles, 1)
+    text = b'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 64
+    n = 0
+
+    for d in dirs:
+        os.makedirs(d, exist_ok=True)
+
+        for i in range(filesPerDir):
+            filePath = os.path.join(d, 'file{}.bin'.format(i))
+
+            with open(filePath, 'wb') as f:
+                half = fileSize // 2
+                f.write(rng.randbytes(half) if hasattr(rng, 'randbytes') else os.urandom(half))
+                f.write((text * (1 + (fileSize - half) // len(text)))[: fileSize - half])
+
+            n += 1
+
+        os.symlink('file0.bin', os.path.join(d, 'link.bin'))
+
+    return n
+
+def best(function, repeat):
+    # Returns the best wall time of the function.
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+def benchmarkParsers(workDir, options):
+    results = {}
+    corpusDir = os.path.join(workDir, 'corpus')
+    os.makedirs(corpusDir, exist_ok=True)
+    imports = ['libbench{}.so.1'.format(i) for i in range(options.imports)]
+    dlls = ['bench{}.dll'.format(i) for i in range(options.imports)]
+    dylibs = ['@rpath/libbench{}.dylib'.format(i) for i in range(options.imports)]
+    corpora = {'elf': (DTBinaryElf, []),
+               'pecoff': (DTBinaryPecoff, []),
+               'mach': (DTBinaryMach, []),
+               'mach-fat': (DTBinaryMach, [])}
+
+    for i in range(options.files):
+        path = os.path.join(corpusDir, 'libelf{}.so'.format(i))
+        writeElf(path, 'libelf{}.so'.format(i), imports, ['$ORIGIN/../lib'], options.sections, options.symbols)
+        corpora['elf'][1].append(path)
+        path = os.path.join(corpusDir, 'pe{}.dll'.format(i))
+        writePe(path, dlls, options.sections)
+        corpora['pecoff'][1].append(path)
+        path = os.path.join(corpusDir, 'libmach{}.dylib'.format(i))
+        writeMach(path, '@rpath/libmach{}.dylib'.format(i), dylibs, ['@loader_path/../lib'], options.sections)
+        corpora['mach'][1].append(path)
+        path = os.path.join(corpusDir, 'libfat{}.dylib'.format(i))
+        writeMach(path, '@rpath/libfat{}.dylib'.format(i), dylibs, ['@loader_path/../lib'], options.sections, fat=True)
+        corpora['mach-fat'][1].append(path)
+
+    for corpus, (solver, files) in corpora.items():
+        size = sum(os.path.getsize(f) for f in files)
+
+        def parseAll():
+            for f in files:
+                solver.parse(f)
+
+        elapsed = best(parseAll, options.repeat)
+        results['parse.' + corpus] = {'files/s': len(files) / elapsed,
+                                      'MiB/s': size / elapsed / (1 << 20),
+                                      'seconds': elapsed}
+
+    return results
+
+def benchmarkResolver(workDir, options):
+    results = {}
+    configs = configparser.ConfigParser()
+
+    for nLibs in options.libs:
+        treeDir = os.path.join(workDir, 'tree{}'.format(nLibs))
+        executable = makeLibraryTree(treeDir, nLibs, options.fanout, options.sections, options.symbols)
+
+        def resolve():
+            DTBinaryCache.CACHE.clear()
+            tools = DTBinary.BinaryTools(configs,
+                                         DTUtils.hostPlatform(),
+                                         'posix',
+                                         'x86_64',
+                                         False,
+                                         [os.path.join(treeDir, 'lib')])
+            deps = tools.allDependencies(executable)
+
+            if len(deps) != nLibs:
+                raise Exception('Expected {} dependencies, got {}'.format(nLibs, len(deps)))
+
+        elapsed = best(resolve, options.repeat)
+        results['resolve.{}'.format(nLibs)] = {'libs/s': nLibs / elapsed,
+                                               'seconds': elapsed}
+
+    return results
+
+def benchmarkCopy(workDir, options):
+    results = {}
+    dataDir = os.path.join(workDir, 'data')
+    nFiles = makeDataDir(dataDir,
+                         options.data_size << 20,
+                         options.fanout,
+                         options.depth,
+                         options.files_per_dir)
+    size = DTUtils.pathSize(dataDir)
+    copyDir = os.path.join(workDir, 'copy')
+
+    def copyData():
+        if os.path.exists(copyDir):
+            shutil.rmtree(copyDir)
+
+        DTUtils.copy(dataDir, copyDir)
+
+    elapsed = best(copyData, options.repeat)
+    results['copy'] = {'MiB/s': size / elapsed / (1 << 20),
+                       'files/s': nFiles / elapsed,
+                       'seconds': elapsed}
+    outputDir = os.path.join(workDir, 'archives')
+    os.makedirs(outputDir, exist_ok=True)
+
+    for codec in options.codecs:
+        extension = 'zip' if codec == 'zip' else 'tar.' + codec
+
+        if codec != 'zip' and not DTCompression.isAvailable(codec):
+            continue
+
+        output = {'path': os.path.join(outputDir, 'bench.' + extension),
+                  'name': 'bench',
+                  'codec': codec,
+                  'level': DTCompression.CODECS[codec]['defaultLevel'],
+                  'threads': DTUtils.numThreads(),
+                  'program': '',
+                  'epoch': -1}
+
+        elapsed = best(lambda: DTCompression.writeArchives(dataDir, [output]),
+                       options.repeat)
+        results['archive.' + codec] = {'MiB/s': size / elapsed / (1 << 20),
+                                       'seconds': elapsed}
+
+    return results
+
+def compareResults(results, baseline):
+    # Compares the times with the baseline, a positive change is a slowdown.
+    print('Comparison with the baseline:')
+    print()
+
+    for name in sorted(results):
+        if not name in baseline:
+            continue
+
+        current = results[name]['seconds']
+        previous = baseline[name]['seconds']
+
+        if previous <= 0:
+            continue
+
+        change = 100 * (current - previous) / previous
+        print('    {}: {:.4f} s -> {:.4f} s ({:+.1f}%)'.format(name, previous, current, change))
+
+    print()
+
+def intList(value):
+    return [int(v.strip()) for v in value.split(',') if len(v.strip()) > 0]
+
+if __name__ =='__main__':
+    usage = """%prog [options]"""
+    description = 'Benchmarks for the deploy tools hot paths.'
+    epilog =  'For more info go here: <https://github.com/webcamoid/DeployTools>'
+    parser = optparse.OptionParser(usage=usage, version='1.0.0', description=description, epilog=epilog)
+    parser.add_option('-w',
+                      '--work-dir',
+                      action='store',
+                      type='string',
+                      dest='work_dir',
+                      help='Directory for the generated corpora, a temporary directory is used by default.',
+                      metavar='WORK_DIR',
+                      default='')
+    parser.add_option('-b',
+                      '--benchmarks',
+                      action='store',
+                      type='string',
+                      dest='benchmarks',
+                      help='Comma separated list of benchmarks to run (parse, resolve, copy).',
+                      metavar='BENCHMARKS',
+                      default='parse,resolve,copy')
+    parser.add_option('-n',
+                      '--repeat',
+                      action='store',
+                      type='int',
+                      dest='repeat',
+                      help='Number of runs of each benchmark, the best time is taken.',
+                      default=3)
+    parser.add_option('--files',
+                      action='store',
+                      type='int',
+                      dest='files',
+                      help='Number of binaries per parser corpus.',
+                      default=200)
+    parser.add_option('--imports',
+                      action='store',
+                      type='int',
+                      dest='imports',
+                      help='Number of imported libraries per binary.',
+                      default=64)
+    parser.add_option('--sections',
+                      action='store',
+                      type='int',
+                      dest='sections',
+                      help='Number of sections or load commands per binary.',
+                      default=64)
+    parser.add_option('--symbols',
+                      action='store',
+                      type='int',
+                      dest='symbols',
+                      help='Number of symbol names in the ELF string table.',
+                      default=5000)
+    parser.add_option('--libs',
+                      action='store',
+                      type='string',
+                      dest='libs',
+                      help='Comma separated list of library counts for the resolver.',
+                      default='50,100,200,400')
+    parser.add_option('--fanout',
+                      action='store',
+                      type='int',
+                      dest='fanout',
+                      help='Dependencies per library and subdirectories per directory.',
+                      default=4)
+    parser.add_option('--depth',
+                      action='store',
+                      type='int',
+                      dest='depth',
+                      help='Depth of the data directory tree.',
+                      default=3)
+    parser.add_option('--files-per-dir',
+                      action='store',
+                      type='int',
+                      dest='files_per_dir',
+                      help='Number of files per directory in the data tree.',
+                      default=8)
+    parser.add_option('--data-size',
+                      action='store',
+                      type='int',
+                      dest='data_size',
+                      help='Size of the data directory in MiB.',
+                      default=64)
+    parser.add_option('--codecs',
+                      action='store',
+                      type='string',
+                      dest='codecs',
+                      help='Comma separated list of archive codecs to measure.',
+                      default='gz,xz,zip')
+    parser.add_option('-s',
+                      '--save-baseline',
+                      action='store',
+                      type='string',
+                      dest='save_baseline',
+                      help='Save the results as a baseline.',
+                      metavar='BASELINE_FILE',
+                      default='')
+    parser.add_option('-c',
+                      '--compare',
+                      action='store',
+                      type='string',
+                      dest='compare',
+                      help='Compare the results with a saved baseline.',
+                      metavar='BASELINE_FILE',
+                      default='')
+    options, args = parser.parse_args()
+    options.libs = intList(options.libs)
+    options.codecs = [codec.strip() for codec in options.codecs.split(',') if len(codec.strip()) > 0]
+    benchmarks = [b.strip() for b in options.benchmarks.split(',') if len(b.strip()) > 0]
+
+    tmpDir = None
+
+    if len(options.work_dir) > 0:
+        workDir = options.work_dir
+
+        if os.path.exists(workDir):
+            print('The work directory already exists', file=sys.stderr)
+            exit(-1)
+
+        os.makedirs(workDir)
+    else:
+        tmpDir = tempfile.TemporaryDirectory()
+        workDir = tmpDir.name
+
+    print('Python version:', platform.python_version())
+    print('Number of threads:', DTUtils.numThreads())
+    print('Work directory:', workDir)
+    print()
+    results = {}
+
+    try:
+        if 'parse' in benchmarks:
+            results.update(benchmarkParsers(workDir, options))
+
+        if 'resolve' in benchmarks:
+            results.update(benchmarkResolver(workDir, options))
+
+        if 'copy' in benchmarks:
+            results.update(benchmarkCopy(workDir, options))
+    finally:
+        if tmpDir is not None:
+            tmpDir.cleanup()
+
+    print('Results:')
+    print()
+
+    for name in sorted(results):
+        values = ', '.join('{:.2f} {}'.format(value, unit)
+                           for unit, value in results[name].items()
+                           if unit != 'seconds')
+        print('    {}: {:.4f} s, {}'.format(name, results[name]['seconds'], values))
+
+    print()
+
+    if len(options.compare) > 0:
+        try:
+            with open(options.compare) as f:
+                compareResults(results, json.load(f)['results'])
+        except Exception as e:
+            print("Can't read the baseline: {}".format(e), file=sys.stderr)
+
+    if len(options.save_baseline) > 0:
+        with open(options.save_baseline, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'threads': DTUtils.numThreads(),
+                       'options': {key: value for key, value in vars(options).items()
+                                   if not key in ['save_baseline', 'compare', 'work_dir']},
+                       'results': results}, f, indent=4)
+
+        print('Baseline written to', options.save_baseline)
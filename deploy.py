@@ -24,10 +24,15 @@ import optparse
 import os
 import platform
 import sys
-import threading
 
 from WebcamoidDeployTools import DTUtils
 from WebcamoidDeployTools import DTBinary
+from WebcamoidDeployTools import DTFileIndex
+from WebcamoidDeployTools import DTManifest
+from WebcamoidDeployTools import DTPackaging
+from WebcamoidDeployTools import DTProfile
+from WebcamoidDeployTools import DTStore
+from WebcamoidDeployTools import DTSystemPackages
 
 
 if __name__ =='__main__':
@@ -68,6 +73,22 @@ if __name__ =='__main__':
                       action='store_true',
                       dest='package_only',
                       help='Just package the data.')
+    parser.add_option('-p',
+                      '--profile',
+                      action='store',
+                      type='string',
+                      dest='profile_file',
+                      help='Write the timings of each phase as JSON.',
+                      metavar='PROFILE_FILE',
+                      default='')
+    parser.add_option('-t',
+                      '--trace',
+                      action='store',
+                      type='string',
+                      dest='trace_file',
+                      help='Write the timings of each phase as a Chrome trace.',
+                      metavar='TRACE_FILE',
+                      default='')
     options, args = parser.parse_args()
 
     if len(options.data_dir) < 1 or len(options.config_file) < 1:
@@ -96,7 +117,18 @@ if __name__ =='__main__':
     targetPlatform = configs.get('Package', 'targetPlatform', fallback='').strip()
     targetArch = configs.get('Package', 'targetArch', fallback='').strip()
     sourcesDir = configs.get('Package', 'sourcesDir', fallback='.').strip()
-    globs = {}
+    numThreads = configs.get('Package', 'numThreads', fallback='0').strip()
+
+    try:
+        DTUtils.setNumThreads(int(numThreads))
+    except:
+        pass
+
+    if len(options.profile_file) > 0 or len(options.trace_file) > 0:
+        DTProfile.enable()
+
+    # Listing of the data directory shared by all modules.
+    globs = {'fileIndex': DTFileIndex.register(options.data_dir)}
 
     print('Build info')
     print()
@@ -122,43 +154,42 @@ if __name__ =='__main__':
             modules = [module.strip() for module in modules.split(',')]
 
         modules.append(targetPlatform.capitalize())
+        DTManifest.init(configs, options.data_dir)
+        DTStore.init(configs, options.data_dir)
+        DTSystemPackages.init(configs)
 
         for module in modules:
             print('Running {} module pre-processing'.format(module))
             print()
             mod = importlib.import_module('WebcamoidDeployTools.DT' + module)
-            mod.preRun(globs, configs, options.data_dir)
+
+            with DTProfile.span('{} pre-processing'.format(module), 'module'):
+                mod.preRun(globs, configs, options.data_dir)
 
         for module in modules:
             print('Running {} module post-processing'.format(module))
             print()
             mod = importlib.import_module('WebcamoidDeployTools.DT' + module)
-            mod.postRun(globs, configs, options.data_dir)
 
+            with DTProfile.span('{} post-processing'.format(module), 'module'):
+                mod.postRun(globs, configs, options.data_dir)
+
+        DTManifest.save(configs)
         print()
 
     if options.package_only or \
         (not options.prepare_only and not options.package_only):
         print('Packaged data:')
         print()
-        packagedFiles = []
-
-        for root, dirs, files in os.walk(options.data_dir):
-            for d in dirs:
-                dirpath = os.path.join(root, d)
+        packagedFiles = sorted(DTFileIndex.files(options.data_dir),
+                               key=lambda f: f[0])
 
-                if os.path.islink(dirpath):
-                    packagedFiles.append(dirpath)
-
-            for f in files:
-                packagedFiles.append(os.path.join(root, f))
-
-        packagedFiles = sorted(packagedFiles)
-
-        for f in packagedFiles:
+        for f, info in packagedFiles:
             path = os.path.relpath(f, options.data_dir)
 
-            if os.path.exists(f):
+            if info['type'] == 'file':
+                print('    {} {}'.format(path, DTUtils.hrSize(info['size'])))
+            elif os.path.exists(f):
                 fileSize = DTUtils.hrSize(os.path.getsize(f))
                 print('    {} {}'.format(path, fileSize))
             else:
@@ -193,23 +224,12 @@ if __name__ =='__main__':
             if not os.path.exists(options.output_dir):
                 os.makedirs(options.output_dir)
 
-            mutex = threading.Lock()
-            threads = []
-
-            for format in packagingTools:
-                mod = importlib.import_module('WebcamoidDeployTools.DT' + format)
-                threads.append(threading.Thread(target=mod.run,
-                                                args=(globs,
-                                                      configs,
-                                                      options.data_dir,
-                                                      options.output_dir,
-                                                      mutex,)))
-
-            for thread in threads:
-                thread.start()
-
-            for thread in threads:
-                thread.join()
+            with DTProfile.span('Packaging', 'packaging'):
+                stats = DTPackaging.run(globs,
+                                        configs,
+                                        packagingTools,
+                                        options.data_dir,
+                                        options.output_dir)
 
             if 'outputPackages' in globs and len(globs['outputPackages']) > 0:
                 print('Packages created:')
@@ -220,7 +240,22 @@ if __name__ =='__main__':
                     print('    {} {}'.format(path, fileSize))
                     print('        md5sum:', DTUtils.md5sum(package))
 
+                print()
+                DTPackaging.printStats(stats)
+
             else:
                 print('No packages were created')
         else:
             print('Packaging formats not detected')
+
+    if len(options.profile_file) > 0:
+        if DTProfile.writeReport(options.profile_file):
+            print('Profile written to', options.profile_file)
+        else:
+            print("Can't write the profile", file=sys.stderr)
+
+    if len(options.trace_file) > 0:
+        if DTProfile.writeTrace(options.trace_file):
+            print('Trace written to', options.trace_file)
+        else:
+            print("Can't write the trace", file=sys.stderr)
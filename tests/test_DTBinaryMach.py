@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2026  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WebcamoidDeployTools import DTBinaryMach
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Sample dylibs, the thin ones are an x86_64 library (little endian) and a
+# PowerPC library (big endian) with the same load commands, the fat one has
+# an x86_64 slice and an arm64 slice.
+THIN_X86_64 = os.path.join(DATA_DIR, 'thin-x86_64.dylib')
+THIN_PPC = os.path.join(DATA_DIR, 'thin-ppc.dylib')
+FAT = os.path.join(DATA_DIR, 'fat-x86_64-arm64.dylib')
+
+THIN_INFO = {'imports': ['/usr/lib/libSystem.B.dylib',
+                         '@rpath/libCore.dylib',
+                         '@rpath/libOptional.dylib',
+                         '@rpath/libBase.dylib'],
+             'weakImports': ['@rpath/libOptional.dylib'],
+             'reexports': ['@rpath/libBase.dylib'],
+             'rpaths': ['@loader_path', '@executable_path/../Frameworks'],
+             'id': '@rpath/libSample.1.dylib',
+             'type': 'library'}
+
+FAT_ARM64_INFO = {'imports': ['/usr/lib/libSystem.B.dylib',
+                              '@rpath/libCoreArm.dylib',
+                              '@rpath/libOptionalArm.dylib',
+                              '@rpath/libBaseArm.dylib'],
+                  'weakImports': ['@rpath/libOptionalArm.dylib'],
+                  'reexports': ['@rpath/libBaseArm.dylib'],
+                  'rpaths': ['@loader_path/../lib'],
+                  'id': '@rpath/libSample.1.dylib',
+                  'type': 'library'}
+
+class TestDTBinaryMach(unittest.TestCase):
+    def setUp(self):
+        DTBinaryMach.init(None, 'mac', '', [])
+
+    def tearDown(self):
+        DTBinaryMach.init(None, 'mac', '', [])
+
+    def assertInfo(self, info, expected, cpuType, fat):
+        self.assertEqual({key: info[key] for key in expected}, expected)
+        self.assertEqual(info['cpuType'], cpuType)
+        self.assertEqual(info['fat'], fat)
+
+    def testIsValid(self):
+        for binary in [THIN_X86_64, THIN_PPC, FAT]:
+            self.assertTrue(DTBinaryMach.isValid(binary))
+
+        self.assertFalse(DTBinaryMach.isValid(os.path.abspath(__file__)))
+
+    def testThinLittleEndian(self):
+        self.assertInfo(DTBinaryMach.parse(THIN_X86_64),
+                        THIN_INFO,
+                        DTBinaryMach.CPU_TYPE_X86_64,
+                        False)
+
+    def testThinBigEndian(self):
+        self.assertInfo(DTBinaryMach.parse(THIN_PPC),
+                        THIN_INFO,
+                        DTBinaryMach.CPU_TYPE_POWERPC,
+                        False)
+
+    def testFatFirstSlice(self):
+        # Without a target architecture the first slice is used.
+        self.assertInfo(DTBinaryMach.parse(FAT),
+                        THIN_INFO,
+                        DTBinaryMach.CPU_TYPE_X86_64,
+                        True)
+
+    def testFatTargetSlice(self):
+        DTBinaryMach.init(None, 'mac', 'arm64', [])
+        self.assertInfo(DTBinaryMach.parse(FAT),
+                        FAT_ARM64_INFO,
+                        DTBinaryMach.CPU_TYPE_ARM64,
+                        True)
+
+        # The target is not in the binary.
+        DTBinaryMach.init(None, 'mac', 'ppc', [])
+        self.assertInfo(DTBinaryMach.parse(FAT),
+                        THIN_INFO,
+                        DTBinaryMach.CPU_TYPE_X86_64,
+                        True)
+
+    def testDump(self):
+        # The cached info is kept apart for each target architecture.
+        for binary in [THIN_X86_64, THIN_PPC]:
+            self.assertEqual(DTBinaryMach.dump(binary),
+                             DTBinaryMach.parse(binary))
+
+        self.assertEqual(DTBinaryMach.dump(FAT)['cpuType'],
+                         DTBinaryMach.CPU_TYPE_X86_64)
+        DTBinaryMach.init(None, 'mac', 'arm64', [])
+        self.assertInfo(DTBinaryMach.dump(FAT),
+                        FAT_ARM64_INFO,
+                        DTBinaryMach.CPU_TYPE_ARM64,
+                        True)
+
+if __name__ == '__main__':
+    unittest.main()